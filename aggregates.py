@@ -0,0 +1,157 @@
+import threading
+
+import numpy as np
+
+import engine
+from caching import LRUCache, derived
+from columnar import spot_columns
+from query import CATEGORY_CODES, CROWD_CODES
+
+# --- MATERIALIZED VIEWS (computed by fetch_data, stored in the snapshot) ---
+TOP_K = 5
+AGGREGATES_CACHE_SIZE = 8  # Spot sequences (snapshots, forecast hours) with aggregates kept
+COMFORT_BUCKETS = 11  # floor(comfort_score): 0..10, matches the integer sidebar slider
+
+# Cell columns: one row per non-empty (type, crowd, comfort floor, amenity mask)
+CELL_FIELDS = ["type", "crowd", "comfort_floor", "amenities", "count", "sum_comfort", "sum_temp_diff", "sum_local_temp"]
+
+def _columns(spots):
+    columns = spot_columns(spots)
+    return (
+        columns["type"].astype(np.int64),
+        columns["crowd_level"].astype(np.int64),
+        columns["comfort_score"],
+        columns["amenities"].astype(np.int64),
+        columns["temp_diff"],
+        columns["local_temp"]
+    )
+
+def _top_rows(groups, keys, top_k):
+    """First `top_k` rows of each group ordered by `keys` (ties: row order)."""
+    rows = np.arange(len(groups))
+    order = np.lexsort((rows, keys, groups))
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    ends = np.r_[starts[1:], len(order)]
+    return {
+        int(sorted_groups[start]): order[start:min(end, start + top_k)].tolist()
+        for start, end in zip(starts.tolist(), ends.tolist())
+    }
+
+def materialize(spots, top_k=TOP_K):
+    """
+    Publish-time aggregates of cool_islands: counts and sums per
+    (type, crowd, comfort floor, amenity mask) cell, and per (type, comfort
+    floor) the top-K row indices by temp_diff (coolest first) and by comfort.
+    Any sidebar selection is answered by merging these partials.
+    """
+    if not len(spots):
+        return {"top_k": top_k, "cells": [], "top": []}
+    codes, crowd, comfort, masks, temp_diff, local_temp = _columns(spots)
+    floors = np.clip(np.floor(comfort).astype(np.int64), 0, COMFORT_BUCKETS - 1)
+
+    masks_count, crowds_count = 1 << len(engine.AMENITIES), len(engine.CROWD_LABELS)
+    keys = ((codes * crowds_count + crowd) * COMFORT_BUCKETS + floors) * masks_count + masks
+    cell_keys, inverse = np.unique(keys, return_inverse=True)
+    buckets = cell_keys // masks_count
+    cells = np.column_stack([
+        buckets // COMFORT_BUCKETS // crowds_count,
+        buckets // COMFORT_BUCKETS % crowds_count,
+        buckets % COMFORT_BUCKETS,
+        cell_keys % masks_count,
+        np.bincount(inverse)
+    ]).tolist()
+    sums = np.column_stack([
+        np.bincount(inverse, weights=comfort),
+        np.bincount(inverse, weights=temp_diff),
+        np.bincount(inverse, weights=local_temp)
+    ]).tolist()
+
+    groups = codes * COMFORT_BUCKETS + floors
+    coolest = _top_rows(groups, temp_diff, top_k)
+    most_comfortable = _top_rows(groups, -comfort, top_k)
+    return {
+        "top_k": top_k,
+        "cells": [cell + total for cell, total in zip(cells, sums)],
+        "top": [
+            [group // COMFORT_BUCKETS, group % COMFORT_BUCKETS, coolest[group], most_comfortable[group]]
+            for group in sorted(coolest)
+        ]
+    }
+
+class SnapshotAggregates:
+    """
+    Reader over the materialized views of one snapshot. Selections cost
+    O(cells) and O(categories x buckets x K), whatever the number of spots.
+    """
+
+    def __init__(self, views, spots):
+        self.spots = spots
+        columns = spot_columns(spots)
+        self.temp_diff, self.comfort = columns["temp_diff"], columns["comfort_score"]
+        self.top_k = views["top_k"]
+        cells = np.array(views["cells"], dtype=np.float64).reshape(-1, len(CELL_FIELDS))
+        self.cell_type, self.cell_crowd, self.cell_floor, self.cell_amenities = cells[:, :4].astype(np.int64).T
+        self.cell_count = cells[:, 4].astype(np.int64)
+        self.cell_sums = cells[:, 5:]
+        self.top = [
+            (int(code), int(floor), list(coolest), list(comfortable))
+            for code, floor, coolest, comfortable in views["top"]
+        ]
+
+    def _cells(self, types, min_comfort, amenities=(), crowds=None):
+        type_codes = [CATEGORY_CODES[t] for t in types if t in CATEGORY_CODES]
+        keep = np.isin(self.cell_type, type_codes) & (self.cell_floor >= min_comfort)
+        required = engine.amenity_mask(amenities)
+        if required:
+            keep &= (self.cell_amenities & required) == required
+        if crowds is not None:
+            keep &= np.isin(self.cell_crowd, [CROWD_CODES[c] for c in crowds if c in CROWD_CODES])
+        return keep
+
+    def stats(self, types, min_comfort, amenities=(), crowds=None):
+        """
+        Count, means (comfort, temp_diff, local_temp) and crowd distribution of
+        the selection. `min_comfort` must be an integer (bucket boundary).
+        """
+        keep = self._cells(types, min_comfort, amenities, crowds)
+        count = int(self.cell_count[keep].sum())
+        sums = self.cell_sums[keep].sum(axis=0)
+        distribution = np.bincount(self.cell_crowd[keep], weights=self.cell_count[keep], minlength=len(engine.CROWD_LABELS))
+        return {
+            "count": count,
+            "mean_comfort": sums[0] / count if count else 0.0,
+            "mean_temp_diff": sums[1] / count if count else 0.0,
+            "mean_local_temp": sums[2] / count if count else 0.0,
+            "crowd": dict(zip(engine.CROWD_LABELS, distribution.astype(int).tolist()))
+        }
+
+    def top_spots(self, types, min_comfort, by="temp_diff", k=TOP_K):
+        """
+        Top `k` spots (k <= top_k) of a type / minimum comfort selection,
+        coolest first (by="temp_diff") or most comfortable first (by="comfort").
+        """
+        wanted = {CATEGORY_CODES[t] for t in types if t in CATEGORY_CODES}
+        rows = [
+            row
+            for code, floor, coolest, comfortable in self.top
+            if code in wanted and floor >= min_comfort
+            for row in (coolest if by == "temp_diff" else comfortable)
+        ]
+        if by == "temp_diff":
+            rows.sort(key=lambda row: (self.temp_diff[row], row))
+        else:
+            rows.sort(key=lambda row: (-self.comfort[row], row))
+        return [self.spots[row] for row in rows[:k]]
+
+_aggregates_cache = LRUCache("agrégats", maxsize=AGGREGATES_CACHE_SIZE)
+_aggregates_lock = threading.Lock()
+
+def get_aggregates(spots, views=None):
+    """
+    SnapshotAggregates of a cool_islands sequence, from the snapshot's stored
+    `views` or materialized here (snapshots published before they existed,
+    forecast hours). Built once per sequence.
+    """
+    with _aggregates_lock:
+        return derived(_aggregates_cache, spots, lambda: SnapshotAggregates(views or materialize(spots), spots))
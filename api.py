@@ -0,0 +1,302 @@
+import asyncio
+import base64
+import gzip
+import json
+import os
+
+from aiohttp import web
+
+import engine
+from caching import LRUCache
+from fetch_data import JSON_EXPORT_FILE, OUTPUT_FILE
+from forecast import get_forecast
+from metrics import API_REQUESTS, CONTENT_TYPE, register_collector, render, snapshot_collector, timed
+from query import get_query_engine
+from snapshot import load_snapshot, snapshot_version
+from spatial import get_index
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# --- API CONFIGURATION ---
+API_HOST = os.environ.get("API_HOST") or "0.0.0.0"
+API_PORT = int(os.environ.get("API_PORT") or 8080)
+# Clients may reuse a response this long, then revalidate it (If-None-Match)
+API_MAX_AGE = int(os.environ.get("API_MAX_AGE") or 30)
+API_POLL_INTERVAL = 1.0   # Seconds between checks for a newly published snapshot
+PAGE_SIZE = 50            # Spots per page by default
+MAX_PAGE_SIZE = 500
+MIN_COMPRESS_SIZE = 512   # Smaller bodies are not worth compressing
+
+CACHE_CONTROL = f"public, max-age={API_MAX_AGE}"
+
+# Encoded (and compressed) bodies: a repeated request is a dict lookup
+RESPONSE_CACHE = LRUCache("réponses API", maxsize=2048, max_weight=64 * 1024 * 1024, weigher=lambda item: len(item[0]))
+
+class SnapshotState:
+    """Snapshot served by the API, swapped by the watcher task when a new one is published."""
+
+    def __init__(self):
+        self.data = None
+
+STATE = web.AppKey("state", SnapshotState)
+
+def load_data():
+    # Same source as the dashboard: binary snapshot, or the JSON export before the first one
+    return load_snapshot(OUTPUT_FILE) or (load_snapshot(JSON_EXPORT_FILE) if JSON_EXPORT_FILE else None)
+
+def snapshot_tag(data):
+    """Validator of a snapshot: its version, or its content hash for legacy files."""
+    version = snapshot_version(data)
+    if version:
+        return str(version)
+    return (data.get("metadata", {}).get("content_hash") or "sha256:0")[7:23]
+
+def _warm(data):
+    # Indices of a new snapshot are built here, in a worker thread, not by the first request
+    spots = data.get("cool_islands", ())
+    get_query_engine(spots)
+    get_index(spots)
+    get_forecast(data)
+
+async def watch_snapshot(state):
+    """Reload the snapshot in a worker thread whenever fetch_data publishes a new one."""
+    loop = asyncio.get_running_loop()
+    while True:
+        data = await loop.run_in_executor(None, load_data)
+        if data is not state.data:
+            if data:
+                await loop.run_in_executor(None, _warm, data)
+            state.data = data
+        await asyncio.sleep(API_POLL_INTERVAL)
+
+async def snapshot_context(app):
+    state = app[STATE]
+    state.data = load_data()
+    if state.data:
+        _warm(state.data)
+    task = asyncio.create_task(watch_snapshot(state))
+    yield
+    task.cancel()
+
+# --- ENCODING ---
+def _error(status, message):
+    return status(text=json.dumps({"error": message}, ensure_ascii=False), content_type="application/json")
+
+def encode_json(payload):
+    # Snapshots are frozen (MappingProxyType): serialized as plain objects
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=dict).encode("utf-8")
+
+def accepted_encoding(header):
+    """Best content coding the client accepts: br (if available), gzip, else identity."""
+    accepted = set()
+    for part in header.lower().split(","):
+        coding, _, params = part.partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return "identity"
+
+def compress(body, encoding):
+    """(body, coding actually applied)."""
+    if len(body) < MIN_COMPRESS_SIZE or encoding == "identity":
+        return body, "identity"
+    if encoding == "br":
+        return brotli.compress(body, quality=5), "br"
+    return gzip.compress(body, compresslevel=6), "gzip"
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    # Weak comparison (RFC 9110): W/"x" and "x" designate the same version
+    def opaque(tag):
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+    return any(tag.strip() == "*" or opaque(tag) == opaque(etag) for tag in header.split(","))
+
+async def respond(request, data, key, build):
+    """
+    JSON response for `key` on snapshot `data`. The ETag is the snapshot
+    version (each URL has one representation per snapshot), so revalidating
+    clients get 304 without any work; otherwise the encoded and compressed
+    body comes from RESPONSE_CACHE, built in a worker thread on a miss.
+    """
+    tag = snapshot_tag(data)
+    headers = {"ETag": f'W/"{tag}"', "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("If-None-Match"), headers["ETag"]):
+        return web.Response(status=304, headers=headers)
+
+    encoding = accepted_encoding(request.headers.get("Accept-Encoding", ""))
+    cache_key = (tag, key, encoding)
+    cached = RESPONSE_CACHE.get(cache_key)
+    if cached is None:
+        def render_body():
+            with timed("api_render", route=request.path):
+                return compress(encode_json(build()), encoding)
+        cached = await asyncio.get_running_loop().run_in_executor(None, render_body)
+        RESPONSE_CACHE.put(cache_key, cached)
+    body, applied = cached
+    if applied != "identity":
+        headers["Content-Encoding"] = applied
+    return web.Response(body=body, content_type="application/json", charset="utf-8", headers=headers)
+
+def current(request):
+    data = request.app[STATE].data
+    if not data:
+        raise _error(web.HTTPServiceUnavailable, "Aucun snapshot publié pour le moment.")
+    return data
+
+def envelope(data):
+    metadata = data.get("metadata", {})
+    return {"snapshot_version": snapshot_version(data), "timestamp": metadata.get("timestamp")}
+
+# --- PARAMETERS ---
+def _number(query, name, kind=float, low=None, high=None):
+    value = query.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        value = kind(value)
+    except ValueError:
+        raise _error(web.HTTPBadRequest, f"{name} : valeur invalide ({value!r}).")
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise _error(web.HTTPBadRequest, f"{name} : hors limites [{low}, {high}].")
+    return value
+
+def _choices(query, name, allowed):
+    values = query.getall(name, [])
+    unknown = [v for v in values if v not in allowed]
+    if unknown:
+        raise _error(web.HTTPBadRequest, f"{name} inconnu : {', '.join(unknown)} (valeurs : {', '.join(allowed)}).")
+    return tuple(sorted(set(values)))
+
+def encode_cursor(tag, offset):
+    return base64.urlsafe_b64encode(f"{tag}:{offset}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor, tag):
+    """Offset stored in a cursor. Cursors only hold within the snapshot that issued them."""
+    try:
+        cursor_tag, offset = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().rsplit(":", 1)
+        offset = int(offset)
+        if offset < 0:
+            raise ValueError(offset)
+    except ValueError:
+        raise _error(web.HTTPBadRequest, "cursor invalide.")
+    if cursor_tag != tag:
+        raise _error(web.HTTPGone, "cursor expiré : un nouveau snapshot a été publié, reprendre sans cursor.")
+    return offset
+
+def spot_params(query, data):
+    """Validated /spots parameters, as a hashable tuple of (name, value)."""
+    forecast = get_forecast(data)
+    params = {
+        "types": _choices(query, "type", engine.CATEGORIES) or None,
+        "amenities": _choices(query, "amenity", engine.AMENITIES),
+        "crowds": _choices(query, "crowd", engine.CROWD_LABELS) or None,
+        "min_comfort": _number(query, "min_comfort", float, 0, 10),
+        "hour": _number(query, "hour", int, 0, len(forecast) if forecast else 0) or 0,
+        "lat": _number(query, "lat", float, -90, 90),
+        "lon": _number(query, "lon", float, -180, 180),
+        "radius": _number(query, "radius", float, 1, 50000),
+        "limit": _number(query, "limit", int, 1, MAX_PAGE_SIZE) or PAGE_SIZE,
+        "offset": decode_cursor(query["cursor"], snapshot_tag(data)) if query.get("cursor") else 0
+    }
+    if (params["lat"] is None) != (params["lon"] is None):
+        raise _error(web.HTTPBadRequest, "lat et lon vont ensemble.")
+    if params["radius"] is not None and params["lat"] is None:
+        raise _error(web.HTTPBadRequest, "radius demande lat et lon.")
+    return tuple(params.items())
+
+def spots_page(data, params):
+    """
+    One page of /spots: spots matching the filters in snapshot order, or
+    nearest first around (lat, lon), within `radius` metres if given.
+    """
+    params = dict(params)
+    spots = data.get("cool_islands", ())
+    if params["hour"]:
+        spots = get_forecast(data).spots_at(params["hour"] - 1)
+    spot_query = get_query_engine(spots)
+    rows = spot_query.select(
+        types=params["types"], amenities=params["amenities"], crowds=params["crowds"],
+        min_comfort=params["min_comfort"]
+    )
+    offset, limit = params["offset"], params["limit"]
+    end = offset + limit
+    total = len(rows)
+
+    if params["lat"] is None:
+        page = [dict(spots[i]) for i in rows[offset:end].tolist()]
+    else:
+        index, mask = get_index(spots), spot_query.mask(rows)
+        if params["radius"] is None:
+            ranked = index.nearest(params["lat"], params["lon"], end, mask=mask)
+        else:
+            # Only the spots inside the circle are paged through
+            total = index.count_within(params["lat"], params["lon"], params["radius"], mask=mask)
+            ranked = index.within(params["lat"], params["lon"], params["radius"], mask=mask, limit=end)
+        page = [{**spots[i], "distance_m": round(meters, 1)} for i, meters in ranked[offset:end]]
+    more = total > end
+
+    return {
+        **envelope(data),
+        "hour": get_forecast(data).times[params["hour"] - 1].isoformat() if params["hour"] else None,
+        "total": total,
+        "count": len(page),
+        "next_cursor": encode_cursor(snapshot_tag(data), end) if more else None,
+        "spots": page
+    }
+
+# --- ROUTES ---
+@web.middleware
+async def count_requests(request, handler):
+    route = request.match_info.route.resource
+    route = route.canonical if route is not None else "unmatched"
+    try:
+        response = await handler(request)
+    except web.HTTPException as e:
+        API_REQUESTS.inc(route=route, status=e.status)
+        raise
+    API_REQUESTS.inc(route=route, status=response.status)
+    return response
+
+async def metrics(request):
+    return web.Response(text=render(), headers={"Content-Type": CONTENT_TYPE})
+
+async def weather(request):
+    data = current(request)
+    return await respond(request, data, "weather", lambda: {**envelope(data), "weather": data.get("weather", {})})
+
+async def air_quality(request):
+    data = current(request)
+    return await respond(request, data, "air_quality", lambda: {**envelope(data), "air_quality": data.get("air_quality", {})})
+
+async def spots(request):
+    data = current(request)
+    params = spot_params(request.query, data)
+    return await respond(request, data, ("spots", params), lambda: spots_page(data, params))
+
+def create_app():
+    app = web.Application(middlewares=[count_requests])
+    app[STATE] = SnapshotState()
+    register_collector("snapshot", snapshot_collector(lambda: app[STATE].data))
+    app.cleanup_ctx.append(snapshot_context)
+    app.router.add_get("/weather", weather)
+    app.router.add_get("/air-quality", air_quality)
+    app.router.add_get("/spots", spots)
+    app.router.add_get("/metrics", metrics)
+    return app
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host=API_HOST, port=API_PORT)
@@ -1,12 +1,24 @@
 import streamlit as st
-import json
-import folium
-from streamlit_folium import st_folium
-from folium.plugins import MarkerCluster, HeatMap
-import os
-import subprocess
 import datetime
+import os
+import time
+import numpy as np
 import pandas as pd
+from aggregates import get_aggregates
+from caching import CACHES
+from columnar import spot_columns
+from engine import AMENITIES, CITY_CENTER, CROWD_LABELS
+from fetch_data import JSON_EXPORT_FILE, OUTPUT_FILE
+from forecast import get_forecast
+from history import get_history, to_epoch
+from map_view import show_map, show_viewport_map
+from metrics import STAGE_SECONDS, register_collector, snapshot_collector, start_http_server, timed
+import profiling
+from query import get_query_engine
+from raster import FIELDS as HEAT_FIELDS, value_range
+from refresher import get_refresher
+from spatial import get_index
+from snapshot import load_snapshot, snapshot_version
 
 # --- CONFIGURATION DE LA PAGE ---
 st.set_page_config(
@@ -16,7 +28,12 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-DATA_FILE = "current_status.json"
+DATA_FILE = OUTPUT_FILE
+REFRESH_TIMEOUT = 30 # Seconds before giving up on an in-process refresh
+VIEWPORT_THRESHOLD = 2000 # Above this many spots, only the visible ones are sent to the map
+TREND_PERIODS = {"24 h": (1, "hour"), "7 jours": (7, "hour"), "30 jours": (30, "day")}
+# Seconds between checks for a newly published snapshot (0 disables the push update)
+SNAPSHOT_POLL_INTERVAL = float(os.environ.get("SNAPSHOT_POLL_INTERVAL") or 15)
 
 # --- CSS PERSONNALISÉ & ASSETS ---
 def local_css():
@@ -301,175 +318,105 @@ def local_css():
     </style>
     """, unsafe_allow_html=True)
 
+@timed("load_data")
 def load_data():
-    if not os.path.exists(DATA_FILE):
-        return None
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    # Shared, read-only snapshot; only re-parsed when fetch_data rewrites the file.
+    # Before the first binary snapshot is published, read the JSON export.
+    return load_snapshot(DATA_FILE) or (load_snapshot(JSON_EXPORT_FILE) if JSON_EXPORT_FILE else None)
+
+def profiling_enabled():
+    # PROFILE=1 for every session, or the hidden ?profile=1 for this one
+    return profiling.PROFILE or st.query_params.get("profile") == "1"
 
 def refresh_data():
     with st.spinner('📡 Récupération des données satellites & capteurs...'):
         try:
-            result = subprocess.run(["python3", "fetch_data.py"], capture_output=True, text=True)
-            if result.returncode == 0:
-                st.toast("Données mises à jour.", icon="🔄")
-            else:
-                st.error(f"Erreur: {result.stderr}")
+            data = get_refresher().refresh(timeout=REFRESH_TIMEOUT)
+            st.toast("Données mises à jour.", icon="🔄")
+            return data
         except Exception as e:
-            st.error(f"Erreur script: {e}")
-
-local_css()
-
-# --- SIDEBAR ---
-with st.sidebar:
-    st.title("🏙️ Oasis Clermont Pro")
-    st.caption("Outil d'Aide à la Décision - Canicule")
-    st.markdown("---")
-    
-    # 1. Controls
-    if st.button("🔄 Actualiser Temps Réel", use_container_width=True):
-        refresh_data()
+            st.error(f"Erreur actualisation: {e}")
+
+# Each part of the page is a fragment: a change to one of its widgets
+# reruns that fragment only. Its arguments are all the data it depends on.
+
+@st.fragment(run_every=SNAPSHOT_POLL_INTERVAL or None)
+@timed("header")
+@profiling.profiled("header", enabled=profiling_enabled)
+def header(data):
+    """
+    Alert header. Also polls for a newly published snapshot: when there is
+    one, the whole page reruns on it (push update to every open session).
+    """
+    if load_data() is not data:
         st.rerun()
 
-    st.markdown("### 🎛️ Filtres")
-    
-    # Load data for filters
-    data = load_data()
-    if data:
-        all_spots = data.get("cool_islands", [])
-        categories = sorted(list(set([s["type"] for s in all_spots])))
-        
-        selected_types = st.multiselect("Type de Lieu", categories, default=categories)
-        min_comfort = st.slider("Score Confort Min.", 1, 10, 5)
-        show_heatmap = st.checkbox("Afficher Carte de Chaleur", value=True)
-    else:
-        selected_types = []
-        min_comfort = 0
-        show_heatmap = False
+    weather = data.get("weather", {})
+    air = data.get("air_quality", {})
+    metadata = data.get("metadata", {})
+    update_time = metadata.get("timestamp", "")[:16].replace("T", " à ")
+    # Upstream down: agents served their last good reading instead
+    stale_age = max(weather.get("age_seconds", 0), air.get("age_seconds", 0))
+    live_badge = f"DIFFÉRÉ ({stale_age // 60} min)" if weather.get("stale") or air.get("stale") else "LIVE"
+
+    alert_colors = {"Canicule": "#ef4444", "Ensoleillé": "#f59e0b", "Nuageux": "#64748b", "Variable": "#8b5cf6"}
+    bg_color = alert_colors.get(weather.get("status"), "#3b82f6")
+
+    st.markdown(f"""
+    <div class="alert-header" style="background-color: {bg_color}; position: relative; overflow: hidden;">
+        <span style="background: rgba(255,255,255,0.2); padding: 2px 8px; border-radius: 4px; font-size: 0.7em; font-weight: 800; letter-spacing: 1px; border: 1px solid rgba(255,255,255,0.3);">{live_badge}</span>
+        <span>🌡️ Météo : {weather.get("status")} ({weather.get("temperature", 0)}°C)</span>
+        <span>•</span>
+        <span>💨 Qualité Air : {air.get("description")} (Indice {air.get("aqi", 0)})</span>
+        <span style="font-size: 0.7em; opacity: 0.8; margin-left: 10px;">(MàJ: {update_time})</span>
+    </div>
+    """, unsafe_allow_html=True)
 
-    st.markdown("---")
-    st.info("Version 2.1.0 (Live)\nDonnées Temps Réel Connectées")
-
-# --- MAIN CONTENT ---
-
-if not data:
-    st.error("Données indisponibles. Lancez l'actualisation.")
-    st.stop()
-
-# Header Metrics
-weather = data.get("weather", {})
-air = data.get("air_quality", {})
-temp = weather.get("temperature", 0)
-aqi = air.get("aqi", 0)
-metadata = data.get("metadata", {})
-update_time = metadata.get("timestamp", "")[:16].replace("T", " à ")
-
-alert_colors = {"Canicule": "#ef4444", "Ensoleillé": "#f59e0b", "Nuageux": "#64748b", "Variable": "#8b5cf6"}
-bg_color = alert_colors.get(weather.get("status"), "#3b82f6")
-
-st.markdown(f"""
-<div class="alert-header" style="background-color: {bg_color}; position: relative; overflow: hidden;">
-    <span style="background: rgba(255,255,255,0.2); padding: 2px 8px; border-radius: 4px; font-size: 0.7em; font-weight: 800; letter-spacing: 1px; border: 1px solid rgba(255,255,255,0.3);">LIVE</span>
-    <span>🌡️ Météo : {weather.get("status")} ({temp}°C)</span>
-    <span>•</span>
-    <span>💨 Qualité Air : {air.get("description")} (Indice {aqi})</span>
-    <span style="font-size: 0.7em; opacity: 0.8; margin-left: 10px;">(MàJ: {update_time})</span>
-</div>
-""", unsafe_allow_html=True)
-
-# Filter Data
-filtered_spots = [
-    s for s in all_spots 
-    if s["type"] in selected_types 
-    and s.get("comfort_score", 0) >= min_comfort
-]
-
-# Layout: Map (Left 70%) | Stats & List (Right 30%)
-col_map, col_details = st.columns([0.7, 0.3])
-
-with col_map:
-    st.subheader(f"🗺️ Carte Interactive ({len(filtered_spots)} lieux trouvés)")
+@st.fragment
+@timed("map_panel")
+@profiling.profiled("map_panel", enabled=profiling_enabled)
+def map_panel(all_spots, filtered_rows, spot_mask, selection_key, user_location, version, title):
+    """Map and its display options: switching a layer or panning reruns the map only."""
+    st.subheader(title)
+    col_heat, col_field, col_viewport = st.columns([0.25, 0.4, 0.35])
+    show_heatmap = col_heat.checkbox("Afficher Carte de Chaleur", value=True)
+    heat_field = col_field.radio(
+        "Couche de chaleur", list(HEAT_FIELDS), format_func=lambda f: HEAT_FIELDS[f][0], horizontal=True,
+        label_visibility="collapsed"
+    ) if show_heatmap else None
+    viewport_mode = col_viewport.checkbox(
+        "Charger la zone visible uniquement", value=len(all_spots) > VIEWPORT_THRESHOLD,
+        help="Regroupe les lieux côté serveur selon le zoom et n'envoie que ceux de la carte affichée."
+    )
     
-    # Heatmap Legend
-    if show_heatmap:
-        st.markdown("""
+    # Heatmap Legend (same colour stops as the raster)
+    if heat_field:
+        gradient = ", ".join(f"rgb{color}" for _, color in HEAT_FIELDS[heat_field][1])
+        if heat_field == "comfort_score":
+            legend_title, legend_low, legend_high = "Intensité Fraîcheur", "Modérée", "Élevée"
+        else:
+            vmin, vmax = value_range(spot_columns(all_spots)[heat_field][filtered_rows])
+            legend_title, legend_low, legend_high = "Température locale", f"{vmin:.1f}°C", f"{vmax:.1f}°C"
+        st.markdown(f"""
         <div style="background: rgba(255,255,255,0.05); padding: 10px; border-radius: 8px; margin-bottom: 10px; border: 1px solid rgba(255,255,255,0.1); display: flex; align-items: center; justify-content: space-between;">
-            <span style="font-size: 0.8em; font-weight: 600; color: #cbd5e1;">Intensité Fraîcheur :</span>
-            <div style="flex-grow: 1; height: 8px; background: linear-gradient(90deg, lime, yellow, red); margin: 0 15px; border-radius: 4px;"></div>
+            <span style="font-size: 0.8em; font-weight: 600; color: #cbd5e1;">{legend_title} :</span>
+            <div style="flex-grow: 1; height: 8px; background: linear-gradient(90deg, {gradient}); margin: 0 15px; border-radius: 4px;"></div>
             <div style="display: flex; justify-content: space-between; gap: 10px; font-size: 0.7em; color: #94a3b8;">
-                <span>Modérée</span>
-                <span>Élevée</span>
+                <span>{legend_low}</span>
+                <span>{legend_high}</span>
             </div>
         </div>
         """, unsafe_allow_html=True)
     
-    m = folium.Map(location=[45.7772, 3.0870], zoom_start=14, tiles="OpenStreetMap")
-    
-    # Heatmap Layer
-    if show_heatmap:
-        heat_data = [[s["lat"], s["lon"], s["comfort_score"]] for s in filtered_spots]
-        HeatMap(heat_data, radius=18, blur=12, max_zoom=1).add_to(m)
-
-    # Marker Cluster
-    marker_cluster = MarkerCluster().add_to(m)
-    
-    for spot in filtered_spots:
-        # Icon Logic
-        icon_map = {
-            "Parc & Jardin": "tree",
-            "Lieu Culturel": "book",
-            "Lieu de Culte": "university", # FontAwesome name check needed, using 'university' acts as landmark
-            "Passage Ombragé": "road",
-            "Point d'Eau": "tint"
-        }
-        icon_name = icon_map.get(spot["type"], "info-sign")
-        
-        # Color Logic
-        comfort = spot.get("comfort_score", 5)
-        color = "green" if comfort >= 8 else "orange" if comfort >= 5 else "red"
-        
-        # Popup Content
-        amenities_html = "".join([f"<span style='background:linear-gradient(135deg, #3b82f6, #8b5cf6);color:white;padding:3px 8px;border-radius:6px;font-size:0.75em;margin-right:4px;font-weight:500;'>{a}</span>" for a in spot.get("amenities", [])])
-        
-        html = f"""
-        <div style="font-family:'Inter',sans-serif; width:280px; padding:4px;">
-            <h4 style="margin:0 0 4px 0;background:linear-gradient(135deg,#38bdf8,#818cf8);-webkit-background-clip:text;-webkit-text-fill-color:transparent;font-weight:700;font-size:1.1em;">{spot['name']}</h4>
-            <p style="font-size:0.85em;color:#64748b;margin:0 0 10px 0;">{spot['type']}</p>
-            <hr style="margin:8px 0;border:none;border-top:1px solid #e2e8f0;">
-            <div style="display:flex;justify-content:space-between;margin-bottom:8px;align-items:center;">
-                <span style="font-weight:600;color:#1e293b;">Score Confort</span>
-                <span style="background:linear-gradient(135deg,#38bdf8,#818cf8);color:white;padding:4px 10px;border-radius:8px;font-weight:700;">{spot['comfort_score']}/10</span>
-            </div>
-            <div style="display:flex;justify-content:space-between;margin-bottom:8px;">
-                <span style="color:#64748b;">🌡️ Température locale</span>
-                <span style="font-weight:600;color:#0ea5e9;">{spot.get('local_temp')}°C</span>
-            </div>
-            <div style="display:flex;justify-content:space-between;margin-bottom:10px;">
-                <span style="color:#64748b;">👥 Affluence</span>
-                <span style="font-weight:500;color:#1e293b;">{spot.get('crowd_level')}</span>
-            </div>
-            <div style="margin-bottom:10px;display:flex;flex-wrap:wrap;gap:4px;">{amenities_html}</div>
-            <div style="background:#f0fdf4;padding:8px 12px;border-radius:8px;border-left:3px solid #22c55e;">
-                <span style="font-size:0.85em;color:#166534;">❄️ <b>{spot.get('temp_diff')}°C</b> vs extérieur</span>
-            </div>
-        </div>
-        """
-        
-        folium.Marker(
-            location=[spot["lat"], spot["lon"]],
-            popup=folium.Popup(html, max_width=260),
-            tooltip=f"{spot['name']} ({spot['comfort_score']}/10)",
-            icon=folium.Icon(color=color, icon=icon_name, prefix="fa")
-        ).add_to(marker_cluster)
-
-    st_folium(m, width=None, height=600)
+    map_key = selection_key + (heat_field,)
+    if viewport_mode:
+        visible, markers = show_viewport_map(map_key, all_spots, spot_mask, heat_field, user_location, version)
+        st.caption(f"Zone affichée : {visible} lieux · {markers} marqueurs envoyés")
+    else:
+        show_map(map_key, [all_spots[i] for i in filtered_rows.tolist()], heat_field, user_location, version)
 
-with col_details:
+def top_list(top_spots):
     st.subheader("📊 Top Fraîcheur")
-    
-    # Sort by Temp Diff (Lowest first, meaning -10 is better than -2)
-    top_spots = sorted(filtered_spots, key=lambda x: x.get("temp_diff", 0))[:5]
-    
     for i, s in enumerate(top_spots):
         # Medal emoji for top 3
         medal = ["🥇", "🥈", "🥉"][i] if i < 3 else f"{i+1}."
@@ -484,9 +431,233 @@ with col_details:
         </div>
         """, unsafe_allow_html=True)
 
+def nearest_list(nearest_spots):
+    st.markdown("### 📍 Au Plus Près")
+    if not nearest_spots:
+        st.caption("Aucun lieu ne correspond aux filtres.")
+    for s, meters in nearest_spots:
+        distance = f"{meters / 1000:.1f} km" if meters >= 1000 else f"{meters:.0f} m"
+        st.markdown(f"""
+        <div class="top-spot-card">
+            <div class="spot-name">{s['name']}</div>
+            <div class="spot-type">{s['type']}</div>
+            <div class="spot-stats">
+                <span class="temp-badge">🚶 {distance}</span>
+                <span class="comfort-badge">⭐ {s['comfort_score']}/10</span>
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
+
+def stats_panel(stats):
     st.markdown("### 📈 Statistiques")
-    avg_comfort = round(pd.DataFrame(filtered_spots)["comfort_score"].mean(), 1) if filtered_spots else 0
+    avg_comfort = round(stats["mean_comfort"], 1) if stats["count"] else 0
     
     col_a, col_b = st.columns(2)
     col_a.metric("Score Moyen", f"{avg_comfort}/10")
-    col_b.metric("Lieux Ouverts", len(filtered_spots))
+    col_b.metric("Lieux Ouverts", stats["count"])
+    if stats["count"]:
+        st.caption("Affluence : " + " · ".join(f"{label} {count}" for label, count in stats["crowd"].items()))
+
+@st.fragment
+@timed("results")
+@profiling.profiled("results", enabled=profiling_enabled)
+def results(data):
+    """Filters and everything they drive (map, top list, stats): reruns alone on a filter change."""
+    all_spots = data.get("cool_islands", [])
+    forecast = get_forecast(data)
+    forecast_hour = 0
+
+    with st.expander("🎛️ Filtres", expanded=True):
+        # Forecast hour: a row of the snapshot's precomputed matrix, nothing is recomputed
+        if forecast:
+            forecast_hour = st.select_slider(
+                "Heure", options=range(len(forecast) + 1),
+                format_func=lambda h: "Maintenant" if h == 0 else forecast.times[h - 1].strftime("%d/%m %Hh")
+            )
+            if forecast_hour:
+                all_spots = forecast.spots_at(forecast_hour - 1)
+                st.caption(f"Prévision : {forecast.label(forecast_hour - 1)}")
+
+        spot_query = get_query_engine(all_spots)
+        categories = sorted(spot_query.categories())
+
+        col_type, col_comfort, col_amenities, col_crowd = st.columns([0.3, 0.2, 0.3, 0.2])
+        selected_types = col_type.multiselect("Type de Lieu", categories, default=categories)
+        min_comfort = col_comfort.slider("Score Confort Min.", 1, 10, 5)
+        required_amenities = col_amenities.multiselect("Équipements requis", AMENITIES, placeholder="Aucun")
+        selected_crowds = col_crowd.multiselect("Affluence", CROWD_LABELS, default=CROWD_LABELS)
+
+        # User location for "nearest cool islands"
+        col_nearest, col_lat, col_lon, col_count = st.columns([0.3, 0.25, 0.25, 0.2])
+        show_nearest = col_nearest.checkbox("📍 Trouver les lieux les plus proches", value=False)
+        if show_nearest:
+            user_lat = col_lat.number_input("Latitude", -90.0, 90.0, value=CITY_CENTER[0], format="%.5f", step=0.001)
+            user_lon = col_lon.number_input("Longitude", -180.0, 180.0, value=CITY_CENTER[1], format="%.5f", step=0.001)
+            nearest_count = col_count.slider("Nombre de lieux", 1, 10, 3)
+
+    # Filter Data (indexed query engine, rows in snapshot order)
+    filtered_rows = spot_query.select(
+        types=selected_types, amenities=required_amenities, crowds=selected_crowds, min_comfort=min_comfort
+    )
+    # Same selection as a row mask, for the spatial index and the viewport map
+    spot_mask = spot_query.mask(filtered_rows)
+
+    # Nearest matching spots to the user (grid index, geodesic distances)
+    nearest_spots = []
+    if show_nearest:
+        nearest = get_index(all_spots).nearest(user_lat, user_lon, nearest_count, mask=spot_mask)
+        nearest_spots = [(all_spots[i], meters) for i, meters in nearest]
+
+    # Lowest temp_diff first (-10 is better than -2). Type and comfort filters
+    # merge the snapshot's per-category rankings; amenity and crowd filters
+    # are not in the rankings, so rank the filtered spots directly.
+    snapshot_aggregates = get_aggregates(all_spots, None if forecast_hour else data.get("aggregates"))
+    if not required_amenities and set(selected_crowds) >= set(CROWD_LABELS):
+        top_spots = snapshot_aggregates.top_spots(selected_types, min_comfort)
+    else:
+        temp_diff = spot_columns(all_spots)["temp_diff"][filtered_rows]
+        top_spots = [all_spots[i] for i in filtered_rows[np.argsort(temp_diff, kind="stable")[:5]].tolist()]
+    # Sums of the matching per-category cells: cost independent of the spot count
+    stats = snapshot_aggregates.stats(selected_types, min_comfort, required_amenities, selected_crowds)
+
+    # Popup cards are cached per spot and version: forecast hours get their own
+    view_version = (snapshot_version(data), forecast_hour) if forecast_hour else snapshot_version(data)
+    selection_key = (
+        snapshot_version(data), data.get("metadata", {}).get("timestamp"),
+        tuple(sorted(selected_types)), min_comfort, tuple(sorted(required_amenities)), tuple(sorted(selected_crowds)),
+        (user_lat, user_lon) if show_nearest else None, forecast_hour
+    )
+    forecast_title = f" · Prévision {forecast.times[forecast_hour - 1].strftime('%Hh')}" if forecast_hour else ""
+
+    # Layout: Map (Left 70%) | Stats & List (Right 30%)
+    col_map, col_details = st.columns([0.7, 0.3])
+    with col_map:
+        map_panel(
+            all_spots, filtered_rows, spot_mask, selection_key, (user_lat, user_lon) if show_nearest else None,
+            view_version, f"🗺️ Carte Interactive ({len(filtered_rows)} lieux trouvés){forecast_title}"
+        )
+    with col_details:
+        top_list(top_spots)
+        if show_nearest:
+            nearest_list(nearest_spots)
+        stats_panel(stats)
+
+# --- TENDANCES (history store, one row per published snapshot) ---
+def trend_frame(history, metrics, start, end, bucket):
+    columns = {}
+    for label, metric in metrics.items():
+        rows = history.aggregate(metric, start, end, bucket)
+        columns[label] = pd.Series(
+            [mean for _, mean, _, _, _ in rows],
+            index=[datetime.datetime.fromtimestamp(b) for b, _, _, _, _ in rows], dtype=float
+        )
+    return pd.DataFrame(columns)
+
+@st.fragment
+@timed("trends")
+@profiling.profiled("trends", enabled=profiling_enabled)
+def trends(timestamp, temp, comfort, aqi):
+    """History charts: changing the period reruns this section only."""
+    st.markdown("---")
+    st.subheader("📉 Tendances")
+    period = st.radio("Période", list(TREND_PERIODS), horizontal=True, label_visibility="collapsed")
+    days, bucket = TREND_PERIODS[period]
+    history = get_history()
+    now_ts = to_epoch(timestamp) if timestamp else int(datetime.datetime.now().timestamp())
+    start_ts = now_ts - days * 86400
+
+    temps = trend_frame(history, {"Température extérieure": "temperature", "Température moyenne des lieux": "local_temp"}, start_ts, now_ts + 1, bucket)
+    if temps.empty:
+        st.caption("L'historique se remplit à chaque actualisation des données.")
+        return
+
+    # Compared with the closest snapshot 24 h earlier
+    col_t, col_c, col_q = st.columns(3)
+    for col, label, metric, current in (
+        (col_t, "Température", "temperature", temp),
+        (col_c, "Confort moyen", "comfort_score", comfort),
+        (col_q, "Indice Air", "aqi", aqi)
+    ):
+        yesterday = history.latest_before(metric, now_ts - 86400)
+        delta = round(current - yesterday[1], 1) if yesterday and yesterday[1] is not None else None
+        col.metric(f"{label} (vs hier)", current, delta, delta_color="inverse" if metric != "comfort_score" else "normal")
+
+    chart_temp, chart_comfort = st.columns(2)
+    with chart_temp:
+        st.caption("🌡️ Températures (°C)")
+        st.line_chart(temps)
+    with chart_comfort:
+        st.caption("⭐ Confort moyen & 💨 indice de qualité de l'air")
+        st.line_chart(trend_frame(history, {"Confort moyen": "comfort_score", "Indice Air": "aqi"}, start_ts, now_ts + 1, bucket))
+
+# --- PAGE ---
+# Every way out of the script (end, st.stop, st.rerun) closes the profile
+rerun_started = time.perf_counter()
+try:
+    with profiling.profiled("rerun", enabled=profiling_enabled):
+        local_css()
+
+        # Background refresh shared by all sessions (no-op once started)
+        get_refresher().start_scheduler()
+        # Prometheus endpoint of this process (no-op once started)
+        register_collector("snapshot", snapshot_collector(load_data))
+        start_http_server()
+
+        data = load_data()
+
+        # --- SIDEBAR (full reruns only) ---
+        with st.sidebar:
+            st.title("🏙️ Oasis Clermont Pro")
+            st.caption("Outil d'Aide à la Décision - Canicule")
+            st.markdown("---")
+
+            # 1. Controls
+            if st.button("🔄 Actualiser Temps Réel", use_container_width=True):
+                refresh_data()
+                st.rerun()
+
+            st.markdown("---")
+            st.info("Version 2.1.0 (Live)\nDonnées Temps Réel Connectées")
+
+        # --- MAIN CONTENT ---
+
+        if not data:
+            st.error("Données indisponibles. Lancez l'actualisation.")
+            st.stop()
+
+        header(data)
+        results(data)
+        snapshot_spots = data.get("cool_islands", [])
+        trends(
+            data.get("metadata", {}).get("timestamp"),
+            data.get("weather", {}).get("temperature", 0),
+            round(float(spot_columns(snapshot_spots)["comfort_score"].mean()), 1) if len(snapshot_spots) else 0,
+            data.get("air_quality", {}).get("aqi", 0)
+        )
+
+        # Cache hit rates, rendered last so they include this (full) rerun
+        with st.sidebar:
+            with st.expander("⚡ Performances des caches"):
+                for name, cache in CACHES.items():
+                    stats = cache.stats()
+                    st.caption(f"**{name}** : {stats['hit_rate']:.0%} de succès ({stats['hits']}/{stats['hits'] + stats['misses']}) · {stats['size']}/{stats['maxsize']} entrées")
+
+            # Profiles of the previous runs (this one is still being recorded)
+            if profiling_enabled():
+                with st.expander("🔬 Profilage"):
+                    recent = list(profiling.RECENT)[::-1]
+                    if not recent:
+                        st.caption("Aucun profil pour le moment : ils apparaissent à l'exécution suivante.")
+                    else:
+                        chosen = st.selectbox(
+                            "Exécution", range(len(recent)),
+                            format_func=lambda i: f"{recent[i]['name']} · {recent[i]['seconds'] * 1000:.0f} ms · {recent[i]['time']:%H:%M:%S}"
+                        )
+                        st.dataframe(
+                            pd.DataFrame(recent[chosen]["top"], columns=["Fonction", "Appels", "Temps propre (s)", "Temps cumulé (s)"]),
+                            hide_index=True
+                        )
+                        if recent[chosen]["path"]:
+                            st.caption(f"`{recent[chosen]['path']}` (python -m pstats, snakeviz)")
+finally:
+    STAGE_SECONDS.observe(time.perf_counter() - rerun_started, stage="rerun")
@@ -0,0 +1,360 @@
+import argparse
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+from aiohttp import web
+
+import catalog
+import engine
+import fetch_data
+import map_view
+from aggregates import materialize
+from history import HistoryStore
+from http_cache import ResponseCache
+from metrics import logger
+from resilience import CircuitBreaker
+from snapshot import load_snapshot, write_snapshot
+
+# --- BENCHMARK CONFIGURATION ---
+BASELINE_FILE = "benchmark_baseline.json"
+REPEAT = 9                  # Timed runs per case (median reported)
+MIN_REPEAT = 5              # Fewer runs: the median is one or two outliers away from a false regression
+THRESHOLD = float(os.environ.get("BENCH_THRESHOLD") or 0.25)  # Regression: more than 25% slower or bigger...
+NOISE_FACTOR = 3            # ...or than 3x the measured run-to-run spread, if wider...
+MIN_DELTA_SECONDS = 0.002   # ...and by more than this (timer noise on tiny cases)
+MIN_DELTA_MB = 1.0
+SEED = 0
+
+STUB_SCENARIOS = {
+    # name: (latency in seconds, 503 on requests 1, 1 + n, 1 + 2n... of each upstream; 0 = never)
+    "ok": (0.0, 0),
+    "slow": (0.3, 0),          # Under the 2 s attempt timeout
+    "flaky": (0.05, 2),        # First attempt fails, the retry succeeds
+    "down": (0.0, 1)           # Every attempt fails: default fallbacks
+}
+
+class Case:
+    """
+    One benchmark: `run()` is timed, `setup()` (optional) runs untimed
+    before each run and returns its argument.
+    """
+
+    def __init__(self, name, run, setup=None):
+        self.name = name
+        self.run = run
+        self.setup = setup or (lambda: None)
+
+    def measure(self, repeat=REPEAT):
+        """
+        {"seconds": median wall time, "spread": relative spread of the runs
+        (scaled median absolute deviation, ~ stdev / median), "peak_mb": peak
+        traced allocations of one run}.
+        """
+        self.run(self.setup())  # Warm-up: imports, lazy caches, page cache
+        times = []
+        for _ in range(repeat):
+            arg = self.setup()
+            started = time.perf_counter()
+            self.run(arg)
+            times.append(time.perf_counter() - started)
+        # Separate run: tracing slows allocations down too much to time
+        arg = self.setup()
+        tracemalloc.start()
+        try:
+            self.run(arg)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        median = statistics.median(times)
+        mad = statistics.median(abs(t - median) for t in times)
+        return {"seconds": median, "spread": 1.4826 * mad / median if median else 0.0, "peak_mb": peak / 1024 / 1024}
+
+@contextlib.contextmanager
+def patched(target, **attributes):
+    """Temporarily replace module attributes (paths, URLs, factories)."""
+    saved = {name: getattr(target, name) for name in attributes}
+    for name, value in attributes.items():
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(target, name, value)
+
+def make_catalog(size):
+    """The shipped 26-spot catalog, or `size` seeded synthetic spots."""
+    if size == len(catalog.build_default_catalog()):
+        return catalog.build_default_catalog()
+    rng = np.random.default_rng(SEED)
+    return catalog.from_spots(engine.random_spots(size, rng, spread=0.1), rng)
+
+def make_snapshot(spot_catalog):
+    with patched(catalog, load_catalog=lambda path=None: spot_catalog):
+        islands = fetch_data.generate_cool_islands(31.0)
+    return {
+        "metadata": {"timestamp": datetime.datetime(2025, 7, 1, 15).isoformat(), "source": "Benchmark"},
+        "weather": {"temperature": 31.0, "status": "Canicule", "station": "Benchmark"},
+        "air_quality": {"aqi": 2, "description": "Moyen", "source": "Benchmark"},
+        "cool_islands": islands,
+        "aggregates": materialize(islands)
+    }
+
+# --- LOCAL STAND-IN FOR OPEN-METEO / ATMO ---
+def stub_app(state):
+    async def answer(request, body):
+        count = state["requests"][request.path] = state["requests"].get(request.path, 0) + 1
+        latency, fail_every = STUB_SCENARIOS[state["scenario"]]
+        if latency:
+            await asyncio.sleep(latency)
+        if fail_every and (count - 1) % fail_every == 0:
+            return web.Response(status=503)
+        return web.json_response(body)
+
+    start = datetime.datetime(2025, 7, 1, 15)
+    hours = [start + datetime.timedelta(hours=h) for h in range(48)]
+    meteo = {
+        "current": {"temperature_2m": 31.0, "relative_humidity_2m": 35, "weather_code": 1},
+        "hourly": {
+            "time": [h.strftime("%Y-%m-%dT%H:%M") for h in hours],
+            "temperature_2m": [24 + 8 * np.sin(h.hour / 24 * 2 * np.pi) for h in hours],
+            "weather_code": [61 if h.hour in (17, 18) else 1 for h in hours]
+        }
+    }
+    atmo = {"records": [{"record": {"fields": {"code_qual": 3, "lib_qual": "Dégradé", "conc_no2": 20, "conc_o3": 90, "conc_pm10": 15}}}]}
+
+    app = web.Application()
+    app.router.add_get("/meteo", lambda request: answer(request, meteo))
+    app.router.add_get("/atmo", lambda request: answer(request, atmo))
+    return app
+
+def start_stub(state):
+    """Serve the stand-in upstreams from a daemon thread; returns their base URL."""
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(stub_app(state), access_log=None)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    threading.Thread(target=loop.run_forever, name="benchmark-stub", daemon=True).start()
+    port = runner.addresses[0][1]
+    return f"http://127.0.0.1:{port}"
+
+# --- CASES ---
+def generate_cases(sizes):
+    cases = []
+    for size in sizes:
+        spot_catalog = make_catalog(size)
+
+        def run(_, spot_catalog=spot_catalog):
+            with patched(catalog, load_catalog=lambda path=None: spot_catalog):
+                fetch_data.generate_cool_islands(31.0, weather_code=1)
+        cases.append(Case(f"generate[{size}]", run))
+    return cases
+
+def fetch_cases(workdir, scenarios):
+    state = {"scenario": "ok", "requests": {}}
+    base = start_stub(state)
+    spot_catalog = make_catalog(26)
+    history = HistoryStore(os.path.join(workdir, "history.sqlite3"))
+    guards = (fetch_data.WEATHER_GUARD, fetch_data.AIR_GUARD)
+    cases = []
+    for scenario in scenarios:
+        def setup(scenario=scenario):
+            # Every run starts cold: empty response cache, closed breakers, same jitter
+            state.update(scenario=scenario, requests={})
+            for guard in guards:
+                guard.breaker = CircuitBreaker(guard.breaker.failure_threshold, guard.breaker.cooldown)
+            random.seed(SEED)
+            cache_dir = tempfile.mkdtemp(dir=workdir)
+            return ResponseCache(cache_dir)
+
+        def run(cache):
+            with contextlib.redirect_stdout(io.StringIO()), \
+                    patched(fetch_data, OPEN_METEO_URL=base + "/meteo", ATMO_API_URL=base + "/atmo",
+                            OUTPUT_FILE=os.path.join(workdir, "fetch.bin"), JSON_EXPORT_FILE="",
+                            MICROCLIMATE=False, get_response_cache=lambda: cache, get_history=lambda: history), \
+                    patched(catalog, load_catalog=lambda path=None: spot_catalog):
+                asyncio.run(fetch_data.main())
+        cases.append(Case(f"fetch[{scenario}]", run, setup))
+    return cases
+
+def load_cases(workdir, sizes):
+    cases = []
+    for size in sizes:
+        for suffix in (".bin", ".json") if size <= 10000 else (".bin",):
+            path = os.path.join(workdir, f"load-{size}{suffix}")
+            write_snapshot(make_snapshot(make_catalog(size)), path)
+            copies = iter(range(1_000_000))
+
+            def setup(path=path, suffix=suffix):
+                # A fresh file name each run: load_snapshot caches per path
+                copy = f"{path}.{next(copies)}{suffix}"
+                shutil.copyfile(path, copy)
+                return copy
+
+            def run(copy):
+                load_snapshot(copy)
+                os.remove(copy)
+            cases.append(Case(f"load[{size}{suffix}]", run, setup))
+    return cases
+
+def map_cases(sizes):
+    cases = []
+    for size in sizes:
+        spots = make_snapshot(make_catalog(size))["cool_islands"]
+
+        def run(_, spots=spots):
+            map_view.render_payload(map_view.build_map(spots, "comfort_score"))
+            for spot in spots:
+                map_view.popup_html(spot)
+        cases.append(Case(f"map[{size}]", run))
+    return cases
+
+def all_cases(workdir):
+    return (
+        generate_cases([26, 1000, 100000])
+        + fetch_cases(workdir, list(STUB_SCENARIOS))
+        + load_cases(workdir, [1000, 10000, 100000])
+        + map_cases([26, 1000])
+    )
+
+# --- BASELINE ---
+def machine_info():
+    """What the timings depend on, stored with the baseline."""
+    processor = platform.processor()
+    with contextlib.suppress(OSError):
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            processor = next((line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), processor)
+    return {
+        "system": f"{platform.system()} {platform.machine()}",
+        "processor": processor,
+        "cpus": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__
+    }
+
+def tolerance(metric, result, previous, threshold=THRESHOLD):
+    """Relative increase tolerated on `metric`: the threshold, widened for noisy timings."""
+    if metric != "seconds":
+        return threshold  # Peak allocations are deterministic
+    return max(threshold, NOISE_FACTOR * max(result.get("spread", 0.0), previous.get("spread", 0.0)))
+
+def compare(results, baseline, threshold=THRESHOLD, same_machine=True):
+    """
+    [(case, result, baseline result or None, regressions)] for every measured
+    case. Timings measured on another machine are not compared.
+    """
+    rows = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        regressions = []
+        if previous is not None:
+            for metric, min_delta in (("seconds", MIN_DELTA_SECONDS), ("peak_mb", MIN_DELTA_MB)):
+                if metric == "seconds" and not same_machine:
+                    continue
+                before, now = previous[metric], result[metric]
+                if now > before * (1 + tolerance(metric, result, previous, threshold)) and now - before > min_delta:
+                    regressions.append(metric)
+        rows.append((name, result, previous, regressions))
+    return rows
+
+def _describe(machine):
+    if not isinstance(machine, dict):
+        return str(machine)  # Baselines written before machine details were recorded
+    return f"{machine['processor']}, {machine['cpus']} CPU, Python {machine['python']}, NumPy {machine['numpy']}"
+
+def _change(now, before):
+    return f"{(now - before) / before:+.0%}" if before else "n/a"
+
+def report(rows):
+    print(f"{'Cas':22s} {'Temps':>10s} {'±':>5s} {'Réf.':>10s} {'Δ':>6s}   {'Pic Mo':>8s} {'Réf.':>8s} {'Δ':>6s}")
+    for name, result, previous, regressions in rows:
+        seconds, spread, peak = result["seconds"], f"{result['spread']:.0%}", result["peak_mb"]
+        if previous is None:
+            print(f"{name:22s} {seconds * 1000:8.1f}ms {spread:>5s} {'—':>10s} {'':>6s}   {peak:8.1f} {'—':>8s} {'':>6s}   nouveau")
+            continue
+        status = "RÉGRESSION (" + ", ".join(regressions) + ")" if regressions else "ok"
+        print(f"{name:22s} {seconds * 1000:8.1f}ms {spread:>5s} {previous['seconds'] * 1000:8.1f}ms "
+              f"{_change(seconds, previous['seconds']):>6s}   "
+              f"{peak:8.1f} {previous['peak_mb']:8.1f} {_change(peak, previous['peak_mb']):>6s}   {status}")
+
+def load_baseline(path):
+    """The baseline document ({"machine": ..., "cases": ...}), empty if there is none yet."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_baseline(path, results, machine, repeat):
+    """Store `results` as the reference; cases measured on another machine are dropped."""
+    baseline = load_baseline(path)
+    cases = baseline.get("cases", {}) if baseline.get("machine") == machine else {}
+    cases.update({name: {k: round(v, 6) for k, v in result.items()} for name, result in results.items()})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "machine": machine,
+            "repeat": repeat,
+            "cases": dict(sorted(cases.items()))
+        }, f, indent=1, ensure_ascii=False)
+        f.write("\n")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks du pipeline Oasis (actualisation, calcul, chargement, carte).")
+    parser.add_argument("--only", action="append", help="Ne lancer que les cas dont le nom contient ce texte (répétable)")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help=f"Exécutions chronométrées par cas (médiane, au moins {MIN_REPEAT})")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="Régression tolérée (0.25 = +25 %%)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Fichier de référence")
+    parser.add_argument("--update", action="store_true", help="Enregistrer les mesures comme nouvelle référence")
+    args = parser.parse_args(argv)
+    if args.repeat < MIN_REPEAT:
+        parser.error(f"--repeat {args.repeat} : au moins {MIN_REPEAT} exécutions pour une médiane comparable")
+
+    # Fallback warnings of the failure scenarios are expected
+    logger.setLevel(logging.ERROR)
+    workdir = tempfile.mkdtemp(prefix="oasis-bench-")
+    try:
+        results = {}
+        for case in all_cases(workdir):
+            if args.only and not any(part in case.name for part in args.only):
+                continue
+            results[case.name] = case.measure(args.repeat)
+            print(f"  {case.name}: {results[case.name]['seconds'] * 1000:.1f} ms, {results[case.name]['peak_mb']:.1f} Mo", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    machine, baseline = machine_info(), load_baseline(args.baseline)
+    same_machine = baseline.get("machine", machine) == machine
+    if not same_machine:
+        print(f"⚠️ Référence mesurée sur une autre machine ({_describe(baseline.get('machine'))}), "
+              f"ici {_describe(machine)} : les temps ne sont pas comparés, régénérez-la avec --update.")
+    rows = compare(results, baseline.get("cases", {}), args.threshold, same_machine)
+    report(rows)
+    if args.update:
+        save_baseline(args.baseline, results, machine, args.repeat)
+        print(f"Référence mise à jour : {args.baseline}")
+        return 0
+    regressions = [name for name, _, _, found in rows if found]
+    if regressions:
+        print(f"❌ {len(regressions)} régression(s) au-delà de {args.threshold:.0%} : {', '.join(regressions)}")
+        return 1
+    print("✅ Aucune régression.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import threading
+from collections import OrderedDict
+
+# Every LRUCache registers here so the dashboard can report hit rates
+CACHES = {}
+
+class LRUCache:
+    """
+    Thread-safe LRU cache shared by all sessions of the process.
+    Bounded by entry count and, with a `weigher`, by total weight
+    (e.g. bytes of rendered HTML). Keeps hit/miss/eviction counters.
+    """
+
+    def __init__(self, name, maxsize=64, max_weight=None, weigher=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()  # key -> (value, weight)
+        self._lock = threading.RLock()
+        CACHES[name] = self
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value):
+        weight = self.weigher(value) if self.weigher else 0
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.weight -= previous[1]
+            self._data[key] = (value, weight)
+            self.weight += weight
+            self._evict()
+
+    def _evict(self):
+        # Always keep the newest entry, even if it alone exceeds max_weight
+        while len(self._data) > 1 and (
+            len(self._data) > self.maxsize
+            or (self.max_weight is not None and self.weight > self.max_weight)
+        ):
+            _, (_, weight) = self._data.popitem(last=False)
+            self.weight -= weight
+            self.evictions += 1
+
+    def get_or_create(self, key, factory):
+        """Cached value for `key`, computed with `factory()` on a miss."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "weight": self.weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hit_rate, 3)
+        }
+
+_MISSING = object()
+
+def derived(cache, source, build):
+    """
+    Structure derived from `source`, compared by identity (a snapshot's spot
+    table, one of its forecast hours): built with `build()` once while `cache`
+    still holds it. The entry keeps `source` alive, so its id is never reused
+    for another object while cached.
+    """
+    entry = cache.get(id(source))
+    if entry is None or entry[0] is not source:
+        entry = (source, build())
+        cache.put(id(source), entry)
+    return entry[1]
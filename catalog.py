@@ -0,0 +1,134 @@
+import datetime
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import engine
+from snapshot import atomic_write_json, file_key
+
+# Persisted static spot catalog (location, type, amenities, intrinsic temp offset)
+CATALOG_FILE = os.environ.get("CATALOG_FILE") or "spot_catalog.json"
+CATALOG_SEED = 42
+
+# List of Real Locations in Clermont-Ferrand
+LOCATIONS = [
+    {"name": "Jardin Lecoq", "lat": 45.7709, "lon": 3.0885, "type": "Parc & Jardin"},
+    {"name": "Parc de Montjuzet", "lat": 45.7865, "lon": 3.0768, "type": "Parc & Jardin"},
+    {"name": "Square de la Poterne", "lat": 45.7788, "lon": 3.0847, "type": "Parc & Jardin"},
+    {"name": "Jardin Botanique de la Charme", "lat": 45.8033, "lon": 3.1098, "type": "Parc & Jardin"},
+    {"name": "Musée d'Art Roger Quilliot", "lat": 45.7972, "lon": 3.1119, "type": "Lieu Culturel"},
+    {"name": "La Comédie de Clermont", "lat": 45.7790, "lon": 3.0950, "type": "Lieu Culturel"},
+    {"name": "Muséum Henri-Lecoq", "lat": 45.7705, "lon": 3.0890, "type": "Lieu Culturel"},
+    {"name": "Cathédrale Notre-Dame-de-l'Assomption", "lat": 45.7785, "lon": 3.0858, "type": "Lieu de Culte"},
+    {"name": "Basilique Notre-Dame du Port", "lat": 45.7808, "lon": 3.0905, "type": "Lieu de Culte"},
+    {"name": "Fontaines Place de Jaude", "lat": 45.7766, "lon": 3.0822, "type": "Point d'Eau"},
+    {"name": "Fontaine d'Amboise", "lat": 45.7810, "lon": 3.0880, "type": "Point d'Eau"},
+]
+RANDOM_SPOTS = 15
+
+class Catalog:
+    """
+    Column-oriented static spot table, loaded once per process.
+    Everything here is fixed between refreshes; only local_temp, crowd and
+    comfort are recomputed from the weather (see engine.compute_conditions).
+    """
+
+    def __init__(self, frame, metadata=None):
+        self.frame = frame.reset_index(drop=True)
+        self.metadata = metadata or {}
+        self.ids = self.frame["id"].to_numpy(np.int64)
+        self.codes = engine.type_codes(self.frame["type"])
+        self.temp_diff = self.frame["temp_diff"].to_numpy(np.float64)
+        self.amenities = self.frame["amenities"].to_numpy(np.uint8)
+        self._static_records = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.frame)
+
+    def static_records(self):
+        """Static part of every snapshot row, built once and reused by each refresh."""
+        with self._lock:
+            if self._static_records is None:
+                f = self.frame
+                self._static_records = [
+                    {"id": i, "name": name, "lat": lat, "lon": lon, "type": engine.CATEGORIES[code],
+                     "temp_diff": diff, "amenities": engine.AMENITY_LISTS[mask]}
+                    for i, name, lat, lon, code, diff, mask in zip(
+                        self.ids.tolist(), f["name"].tolist(), f["lat"].tolist(), f["lon"].tolist(),
+                        self.codes.tolist(), self.temp_diff.tolist(), self.amenities.tolist()
+                    )
+                ]
+            return self._static_records
+
+    def to_json(self):
+        return {
+            "metadata": self.metadata,
+            "spots": [dict(r, amenities=list(r["amenities"])) for r in self.static_records()]
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        spots = data.get("spots", [])
+        frame = pd.DataFrame({
+            "id": [s["id"] for s in spots],
+            "name": [s["name"] for s in spots],
+            "lat": [s["lat"] for s in spots],
+            "lon": [s["lon"] for s in spots],
+            "type": pd.Categorical([s["type"] for s in spots], categories=engine.CATEGORIES),
+            "temp_diff": [s["temp_diff"] for s in spots],
+            "amenities": [engine.amenity_mask(s.get("amenities", [])) for s in spots]
+        })
+        return cls(frame, data.get("metadata", {}))
+
+def from_spots(spots, rng=None, start_id=0, metadata=None):
+    """Catalog from a name/lat/lon/type frame, drawing the static attributes."""
+    temp_diff, masks = engine.draw_static_attributes(spots, rng)
+    frame = pd.DataFrame({
+        "id": np.arange(start_id, start_id + len(spots)),
+        "name": spots["name"].to_numpy(),
+        "lat": spots["lat"].to_numpy(),
+        "lon": spots["lon"].to_numpy(),
+        "type": pd.Categorical(spots["type"], categories=engine.CATEGORIES),
+        "temp_diff": temp_diff,
+        "amenities": masks
+    })
+    return Catalog(frame, metadata)
+
+def build_default_catalog(seed=CATALOG_SEED):
+    """Real locations + RANDOM_SPOTS seeded synthetic ones: identical on every machine."""
+    rng = np.random.default_rng(seed)
+    spots = pd.concat([pd.DataFrame(LOCATIONS), engine.random_spots(RANDOM_SPOTS, rng)], ignore_index=True)
+    return from_spots(spots, rng, metadata={
+        "seed": seed,
+        "created": datetime.datetime.now().isoformat(),
+        "source": "Lieux réels + Oasis simulées"
+    })
+
+def save_catalog(catalog, path=CATALOG_FILE):
+    data = catalog.to_json()
+    data["metadata"]["count"] = len(catalog)
+    atomic_write_json(path, data, indent=1)
+
+_cache = {}  # path -> (file key, Catalog)
+_cache_lock = threading.Lock()
+
+def load_catalog(path=CATALOG_FILE):
+    """
+    Process-wide Catalog for `path`, rebuilt only when the file changes.
+    A missing catalog is created from the seeded defaults and persisted.
+    """
+    with _cache_lock:
+        if not os.path.exists(path):
+            save_catalog(build_default_catalog(), path)
+        key = file_key(path)
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        with open(path, "r", encoding="utf-8") as f:
+            catalog = Catalog.from_json(json.load(f))
+        _cache[path] = (key, catalog)
+        return catalog
@@ -0,0 +1,120 @@
+import math
+import threading
+
+import numpy as np
+
+from caching import LRUCache, derived
+from columnar import spot_columns
+
+# --- VIEWPORT STREAMING CONFIGURATION ---
+TILE_SIZE = 256          # Web Mercator tile edge (px)
+CLUSTER_CELL_PX = 64     # On-screen size of a cluster cell
+MIN_ZOOM, MAX_ZOOM = 8, 19
+DETAIL_ZOOM = 18         # From this zoom on, every spot is sent individually
+MAX_MARKERS = 300        # ...as are all visible spots when there are fewer than this
+PYRAMID_CACHE_SIZE = 2   # Current and previous snapshot
+
+def world_xy(lats, lons):
+    """Web Mercator coordinates at zoom 0, in pixels ([0, TILE_SIZE))."""
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -85.05112878, 85.05112878)
+    lons = np.asarray(lons, dtype=np.float64)
+    x = (lons + 180.0) / 360.0 * TILE_SIZE
+    siny = np.sin(np.radians(lats))
+    y = (0.5 - np.log((1 + siny) / (1 - siny)) / (4 * math.pi)) * TILE_SIZE
+    return x, y
+
+def _tile_to_lat(ty, zoom):
+    n = math.pi - 2 * math.pi * ty / 2 ** zoom
+    return math.degrees(math.atan(math.sinh(n)))
+
+def _tile_to_lon(tx, zoom):
+    return tx / 2 ** zoom * 360.0 - 180.0
+
+def snap_viewport(bounds, zoom, pad=1):
+    """
+    Align a (south, west, north, east) viewport on the tile grid of `zoom`,
+    padded by `pad` tiles so small pans stay inside the same region.
+    Returns (tile key, snapped bounds): the key is stable while the user
+    pans within a tile, which is what makes the layer cache effective.
+    """
+    south, west, north, east = bounds
+    zoom = int(min(max(zoom, MIN_ZOOM), MAX_ZOOM))
+    xs, ys = world_xy([north, south], [west, east])
+    scale = 2 ** zoom / TILE_SIZE
+    tx0, tx1 = int(xs[0] * scale) - pad, int(xs[1] * scale) + pad
+    ty0, ty1 = int(ys[0] * scale) - pad, int(ys[1] * scale) + pad
+    snapped = (
+        _tile_to_lat(ty1 + 1, zoom), _tile_to_lon(tx0, zoom),
+        _tile_to_lat(ty0, zoom), _tile_to_lon(tx1 + 1, zoom)
+    )
+    return (zoom, tx0, tx1, ty0, ty1), snapped
+
+def default_viewport(center, zoom, width_px=800, height_px=600):
+    """(south, west, north, east) seen at `zoom` by a map of the given size centred on `center`."""
+    scale = 2 ** zoom
+    x, y = world_xy([center[0]], [center[1]])
+    x, y = float(x[0]) * scale, float(y[0]) * scale
+    half_w, half_h = width_px / 2, height_px / 2
+    return (
+        _tile_to_lat((y + half_h) / TILE_SIZE, zoom), _tile_to_lon((x - half_w) / TILE_SIZE, zoom),
+        _tile_to_lat((y - half_h) / TILE_SIZE, zoom), _tile_to_lon((x + half_w) / TILE_SIZE, zoom)
+    )
+
+class ClusterPyramid:
+    """
+    Per-zoom grid assignment of every spot, computed once per snapshot.
+    A viewport query selects the visible (filtered) spots and aggregates
+    them into the precomputed cells of the current zoom with bincounts.
+    """
+
+    def __init__(self, lats, lons):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        x, y = world_xy(self.lats, self.lons)
+        self.cells = {}
+        for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+            scale = 2 ** zoom / CLUSTER_CELL_PX
+            cx = np.floor(x * scale).astype(np.int64)
+            cy = np.floor(y * scale).astype(np.int64)
+            self.cells[zoom] = (cx << 32) | cy
+
+    def visible(self, bounds, mask=None):
+        """Row indices inside (south, west, north, east), optionally filtered."""
+        south, west, north, east = bounds
+        inside = (self.lats >= south) & (self.lats <= north) & (self.lons >= west) & (self.lons <= east)
+        if mask is not None:
+            inside &= mask
+        return np.flatnonzero(inside)
+
+    def aggregate(self, zoom, idx, comfort):
+        """
+        Clusters of the rows `idx` at `zoom`, as parallel arrays:
+        (centroid lats, centroid lons, counts, mean `comfort`, first row).
+        A cluster of one is just its first row.
+        """
+        zoom = int(min(max(zoom, MIN_ZOOM), MAX_ZOOM))
+        if not len(idx):
+            empty = np.empty(0)
+            return empty, empty, empty.astype(np.int64), empty, empty.astype(np.int64)
+        _, first, inverse = np.unique(self.cells[zoom][idx], return_index=True, return_inverse=True)
+        counts = np.bincount(inverse)
+        lats = np.bincount(inverse, weights=self.lats[idx]) / counts
+        lons = np.bincount(inverse, weights=self.lons[idx]) / counts
+        comfort = np.bincount(inverse, weights=comfort[idx]) / counts
+        return lats, lons, counts, comfort, idx[first]
+
+_pyramid_cache = LRUCache("pyramides", maxsize=PYRAMID_CACHE_SIZE)
+_pyramid_lock = threading.Lock()
+
+def get_pyramid(spots):
+    """
+    ClusterPyramid for a snapshot's cool_islands, built once per published
+    snapshot: it only depends on coordinates, so forecast hours share it.
+    """
+    base = getattr(spots, "base", spots)
+    with _pyramid_lock:
+        return derived(_pyramid_cache, base, lambda: ClusterPyramid(*_coordinates(base)))
+
+def _coordinates(spots):
+    columns = spot_columns(spots)
+    return columns["lat"], columns["lon"]
@@ -0,0 +1,239 @@
+import json
+import mmap
+import struct
+from collections.abc import Sequence
+from types import MappingProxyType
+
+import numpy as np
+
+import engine
+
+# --- BINARY SNAPSHOT FORMAT ---
+# magic | header length (uint64 LE) | header (UTF-8 JSON) | 64-byte aligned column buffers
+# The header holds the non-tabular parts of the snapshot (metadata, weather,
+# air_quality) and the dtype/offset/length of every cool_islands column.
+MAGIC = b"OASISNP1"
+ALIGN = 64
+TABLE = "cool_islands"
+
+# Column name -> dtype, in file order. Categorical fields are stored as codes.
+COLUMNS = {
+    "id": "<i8",
+    "lat": "<f8",
+    "lon": "<f8",
+    "type": "i1",            # engine.CATEGORIES index
+    "temp_diff": "<f8",
+    "amenities": "u1",       # engine.AMENITIES bitmask
+    "local_temp": "<f8",
+    "crowd_level": "i1",     # engine.CROWD_LABELS index
+    "comfort_score": "<f8",
+    "name_offsets": "<i8",   # n + 1 offsets into name_data
+    "name_data": "u1"        # UTF-8 names, concatenated
+}
+
+_TYPE_CODES = {name: code for code, name in enumerate(engine.CATEGORIES)}
+_CROWD_CODES = {label: code for code, label in enumerate(engine.CROWD_LABELS)}
+
+def spot_columns(spots):
+    """
+    Numeric columns (every COLUMNS entry but the names) of a cool_islands
+    sequence: the arrays themselves for a SpotTable, extracted from the
+    records otherwise.
+    """
+    if isinstance(spots, SpotTable):
+        return spots.columns
+    return {
+        "id": np.array([s.get("id", i) for i, s in enumerate(spots)], dtype=np.int64),
+        "lat": np.array([s["lat"] for s in spots], dtype=np.float64),
+        "lon": np.array([s["lon"] for s in spots], dtype=np.float64),
+        "type": np.array([_TYPE_CODES[s["type"]] for s in spots], dtype=np.int8),
+        "temp_diff": np.array([s.get("temp_diff", 0.0) for s in spots], dtype=np.float64),
+        "amenities": np.array([engine.amenity_mask(s.get("amenities", [])) for s in spots], dtype=np.uint8),
+        "local_temp": np.array([s.get("local_temp", 0.0) for s in spots], dtype=np.float64),
+        "crowd_level": np.array([_CROWD_CODES[s["crowd_level"]] for s in spots], dtype=np.int8),
+        "comfort_score": np.array([s.get("comfort_score", 0.0) for s in spots], dtype=np.float64)
+    }
+
+def encode_columns(spots):
+    """cool_islands records -> {column: ndarray}."""
+    names = [s["name"].encode("utf-8") for s in spots]
+    offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum([len(n) for n in names], out=offsets[1:])
+    return {
+        **spot_columns(spots),
+        "name_offsets": offsets,
+        "name_data": np.frombuffer(b"".join(names), dtype=np.uint8)
+    }
+
+def _padding(position):
+    return -position % ALIGN
+
+def write_columnar(f, data):
+    """Serialize the snapshot document `data` to the binary file object `f`."""
+    columns = encode_columns(data.get(TABLE, []))
+    document = {k: v for k, v in data.items() if k != TABLE}
+    layout, offset = {}, 0
+    for name, dtype in COLUMNS.items():
+        array = columns[name]
+        layout[name] = {"dtype": dtype, "offset": offset, "length": len(array)}
+        offset += array.nbytes + _padding(array.nbytes)
+    header = json.dumps(
+        {"document": document, "rows": len(columns["id"]), "columns": layout}, ensure_ascii=False
+    ).encode("utf-8")
+    prefix = len(MAGIC) + 8 + len(header)
+    header += b" " * _padding(prefix)  # Column buffers start aligned
+
+    f.write(MAGIC)
+    f.write(struct.pack("<Q", len(header)))
+    f.write(header)
+    for name in COLUMNS:
+        buffer = columns[name].tobytes()
+        f.write(buffer)
+        f.write(b"\0" * _padding(len(buffer)))
+
+def _read_header(buffer):
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a binary Oasis snapshot")
+    (length,) = struct.unpack_from("<Q", buffer, len(MAGIC))
+    start = len(MAGIC) + 8
+    return json.loads(bytes(buffer[start:start + length]).decode("utf-8")), start + length
+
+def read_header(path):
+    """Header of a binary snapshot (metadata etc.) without mapping its columns."""
+    with open(path, "rb") as f:
+        prefix = f.read(len(MAGIC) + 8)
+        if len(prefix) < len(MAGIC) + 8:
+            raise ValueError("Truncated binary Oasis snapshot")
+        (length,) = struct.unpack_from("<Q", prefix, len(MAGIC))
+        return _read_header(prefix + f.read(length))[0]
+
+# Column -> record value, for the fields built from columns
+_DECODERS = {
+    "id": int,
+    "lat": float,
+    "lon": float,
+    "type": lambda code: engine.CATEGORIES[code],
+    "temp_diff": float,
+    "amenities": lambda mask: tuple(engine.AMENITY_LISTS[mask]),
+    "local_temp": float,
+    "crowd_level": lambda code: engine.CROWD_LABELS[code],
+    "comfort_score": float
+}
+_FIELDS = ["id", "name", "lat", "lon", "type", "temp_diff", "amenities", "local_temp", "crowd_level", "comfort_score"]
+
+class SpotTable(Sequence):
+    """
+    cool_islands as a read-only sequence over columns. Whole-table consumers
+    (query engine, aggregates, forecast, spatial index, clusters) read the
+    arrays of `columns` directly; a record is only built for a row actually
+    looked at (cards, markers, API pages), once, as a frozen mapping.
+    Records come from the columns (binary snapshot), from `records` (JSON
+    snapshot), or from `records` with the `derived` columns swapped in
+    (forecast hours, see with_columns).
+    """
+
+    def __init__(self, columns, records=None, derived=None, base=None):
+        self.columns = columns
+        self._records = records
+        self._derived = list(_DECODERS) if records is None else list(derived or ())
+        # Table the coordinates come from: views of it share its spatial structures
+        self.base = self if base is None else base
+        self._size = len(columns["lat"])
+        self._rows = None
+
+    @classmethod
+    def from_records(cls, records):
+        return cls(spot_columns(records), records=records)
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._size))]
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError(i)
+        if self._records is not None and not self._derived:
+            return self._records[i]
+        if self._rows is None:
+            self._rows = [None] * self._size
+        row = self._rows[i]
+        if row is None:
+            row = self._rows[i] = MappingProxyType(self._build(i))
+        return row
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self[i]
+
+    def _build(self, i):
+        values = {name: _DECODERS[name](self.columns[name][i].item()) for name in self._derived}
+        if self._records is not None:
+            return {**self._records[i], **values}
+        offsets = self.columns["name_offsets"]
+        values["name"] = self.columns["name_data"][offsets[i]:offsets[i + 1]].tobytes().decode("utf-8")
+        return {name: values[name] for name in _FIELDS}
+
+    def with_columns(self, **columns):
+        """View of the same spots with some columns replaced (e.g. a forecast hour)."""
+        return SpotTable({**self.columns, **columns}, records=self, derived=list(columns), base=self.base)
+
+class SnapshotTable:
+    """
+    Memory-mapped binary snapshot. Columns are read-only NumPy views on the
+    mapping (no copy, no parsing); records are only materialized on demand.
+    The mapping stays valid after the file is atomically replaced.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header, data_start = _read_header(self._map)
+        self.document = header["document"]
+        self.rows = header["rows"]
+        self.columns = {
+            name: np.frombuffer(self._map, dtype=spec["dtype"], count=spec["length"], offset=data_start + spec["offset"])
+            for name, spec in header["columns"].items()
+        }
+        self._spots = None
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def metadata(self):
+        return self.document.get("metadata", {})
+
+    def names(self):
+        offsets = self.columns["name_offsets"].tolist()
+        blob = self.columns["name_data"].tobytes()
+        return [blob[a:b].decode("utf-8") for a, b in zip(offsets[:-1], offsets[1:])]
+
+    def spots(self):
+        """cool_islands as a SpotTable over the mapped columns (records built on access)."""
+        if self._spots is None:
+            self._spots = SpotTable(self.columns)
+        return self._spots
+
+    def records(self):
+        """cool_islands as written by fetch_data (same keys, same order)."""
+        c = self.columns
+        return [
+            {"id": i, "name": name, "lat": lat, "lon": lon, "type": engine.CATEGORIES[code],
+             "temp_diff": diff, "amenities": list(engine.AMENITY_LISTS[mask]),
+             "local_temp": temp, "crowd_level": engine.CROWD_LABELS[crowd], "comfort_score": comfort}
+            for i, name, lat, lon, code, diff, mask, temp, crowd, comfort in zip(
+                c["id"].tolist(), self.names(), c["lat"].tolist(), c["lon"].tolist(), c["type"].tolist(),
+                c["temp_diff"].tolist(), c["amenities"].tolist(), c["local_temp"].tolist(),
+                c["crowd_level"].tolist(), c["comfort_score"].tolist()
+            )
+        ]
+
+    def to_document(self):
+        """The full snapshot as the JSON export would hold it."""
+        return {**self.document, TABLE: self.records()}
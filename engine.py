@@ -0,0 +1,175 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+# --- SPOT MODEL ---
+CATEGORIES = [
+    "Parc & Jardin",
+    "Lieu Culturel",
+    "Lieu de Culte",
+    "Passage Ombragé",
+    "Point d'Eau"
+]
+AMENITIES = ["Bancs", "Ombre", "Eau Potable", "Toilettes", "Wifi", "Jeu pour enfants", "Climatisation"]
+CROWD_LABELS = ["Faible", "Moyen", "Élevé"]
+
+PARK, CULTURAL, WORSHIP, PASSAGE, WATER = range(len(CATEGORIES))
+AMENITY_BITS = {name: 1 << bit for bit, name in enumerate(AMENITIES)}
+WATER_BIT = 1 << AMENITIES.index("Eau Potable")
+AC_BIT = 1 << AMENITIES.index("Climatisation")
+
+# temp_diff draw range (°C) per category code: indoor / shadow are the coolest
+TEMP_DIFF_RANGES = np.array([
+    [-7.0, -4.0],   # Parc & Jardin
+    [-10.0, -6.0],  # Lieu Culturel
+    [-10.0, -6.0],  # Lieu de Culte
+    [-4.0, -2.0],   # Passage Ombragé
+    [-5.0, -3.0],   # Point d'Eau
+])
+
+# Amenity bitmask -> list of names, precomputed for every combination
+AMENITY_LISTS = [
+    [name for bit, name in enumerate(AMENITIES) if mask >> bit & 1]
+    for mask in range(1 << len(AMENITIES))
+]
+
+CITY_CENTER = (45.7772, 3.0870)
+
+def round1(values):
+    """
+    Round to one decimal exactly like Python's round(): np.round scales by 10
+    first and disagrees on values sitting next to a .x5 tie.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.round(values, 1)
+    scaled = values * 10
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        out[near_tie] = [round(v, 1) for v in values[near_tie].tolist()]
+    return out
+
+def amenity_mask(names):
+    """Amenity names -> bitmask (unknown names are ignored)."""
+    return sum(AMENITY_BITS.get(a, 0) for a in set(names))
+
+def type_codes(types):
+    """Category names -> int8 codes (order of CATEGORIES)."""
+    return pd.Categorical(types, categories=CATEGORIES).codes.astype(np.int8)
+
+def random_spots(n, rng=None, spread=0.02, prefix="Oasis Fraîcheur"):
+    """
+    Synthetic spots scattered around the city centre, as a frame
+    with name / lat / lon / type columns.
+    """
+    rng = rng or np.random.default_rng()
+    return pd.DataFrame({
+        "name": [f"{prefix} #{i+1}" for i in range(n)],
+        "lat": CITY_CENTER[0] + rng.uniform(-spread, spread, n),
+        "lon": CITY_CENTER[1] + rng.uniform(-spread, spread, n),
+        "type": pd.Categorical.from_codes(rng.integers(0, len(CATEGORIES), n), categories=CATEGORIES)
+    })
+
+def draw_static_attributes(spots, rng=None):
+    """
+    Draw the per-spot intrinsic attributes in one batch:
+    temp_diff (per-category range) and an amenities bitmask
+    (1-4 random amenities + the ones implied by the type).
+    """
+    rng = rng or np.random.default_rng()
+    n = len(spots)
+    codes = type_codes(spots["type"])
+
+    low, high = TEMP_DIFF_RANGES[codes, 0], TEMP_DIFF_RANGES[codes, 1]
+    temp_diff = round1(rng.uniform(low, high))
+
+    # Random sample without replacement of k amenities: rank random keys per row
+    k = rng.integers(1, 5, n)
+    ranks = rng.random((n, len(AMENITIES))).argsort(axis=1).argsort(axis=1)
+    picked = ranks < k[:, None]
+    masks = (picked * (1 << np.arange(len(AMENITIES)))).sum(axis=1).astype(np.uint8)
+    masks[codes == WATER] |= WATER_BIT
+    masks[codes == CULTURAL] |= AC_BIT
+
+    return temp_diff, masks
+
+# WMO weather codes with precipitation (drizzle, rain, showers, thunderstorm)
+RAIN_CODES = [51, 53, 55, 56, 57, 61, 63, 65, 66, 67, 80, 81, 82, 95, 96, 99]
+
+def base_crowd_indices(hours):
+    """Time-of-day crowd level, shared by every spot, for an array of hours."""
+    hours = np.asarray(hours)
+    return np.select(
+        [(8 <= hours) & (hours <= 10),   # Faible (Matin)
+         (12 <= hours) & (hours <= 14),  # Élevé (Déjeuner)
+         (14 < hours) & (hours <= 17),   # Moyen (Aprem)
+         (17 < hours) & (hours <= 19)],  # Élevé (Sortie bureau)
+        [0, 2, 1, 2], 0                  # Soir/Nuit
+    ).astype(np.int8)
+
+def base_crowd_index(now):
+    """Time-of-day crowd level, shared by every spot."""
+    return int(base_crowd_indices([now.hour])[0])
+
+def crowd_matrix(codes, base_temps, times, weather_codes):
+    """
+    --- Smart Crowd Logic --- for several hours at once, as an (hours, spots) array.
+    1. Base by time & day, 2. type adjustments, 3. rain: outdoor spots empty
+    and covered ones fill up, 4. heat: AC places fill up.
+    """
+    hours = np.array([t.hour for t in times], dtype=np.int64)
+    weekend_day = np.array([t.weekday() >= 5 for t in times], dtype=bool) & (10 <= hours) & (hours <= 18)
+    rainy = np.isin(np.asarray(weather_codes), RAIN_CODES)
+    hot = np.asarray(base_temps, dtype=np.float64) > 30
+    parks, outdoor = codes == PARK, (codes == PARK) | (codes == WATER)
+    covered = (codes == CULTURAL) | (codes == WORSHIP) | (codes == PASSAGE)
+
+    crowd = np.repeat(base_crowd_indices(hours)[:, None], len(codes), axis=1)
+    crowd += (weekend_day[:, None] & parks[None, :]).astype(np.int8)
+    crowd[rainy[:, None] & outdoor[None, :]] = 0
+    crowd += (rainy[:, None] & covered[None, :]).astype(np.int8)
+    np.minimum(crowd, 2, out=crowd)
+    crowd[:, codes == WORSHIP] -= 1 # Généralement calme
+    np.maximum(crowd, 0, out=crowd)
+    crowd[hot[:, None] & (codes == CULTURAL)[None, :]] = 2
+    return crowd
+
+def crowd_indices(codes, base_temp, now, weather_code=0):
+    """Smart Crowd Logic for a single hour (see crowd_matrix)."""
+    return crowd_matrix(codes, [base_temp], [now], [weather_code])[0]
+
+def comfort_scores(temp_diff, masks, crowd):
+    score = 5 + np.abs(temp_diff) * 0.5
+    score += np.where(masks & WATER_BIT, 1.0, 0.0)
+    score += np.where(masks & AC_BIT, 2.0, 0.0)
+    # High crowd reduces comfort slightly, low crowd improves it
+    score += np.select([crowd == 2, crowd == 0], [-0.5, 0.5], 0.0)
+    return np.clip(round1(score), 1, 10)
+
+def compute_conditions(codes, temp_diff, masks, base_temp, now=None, weather_code=0, grid_temp=None):
+    """
+    Incremental pass: the only per-refresh work over the spot table.
+    Takes the static columns (type codes, temp_diff, amenities bitmask) and
+    returns (local_temp, crowd index, comfort_score) arrays for the current weather.
+    `grid_temp` (per-spot model temperature, NaN where unknown) replaces the
+    city reading as the base of local_temp.
+    """
+    now = now or datetime.datetime.now()
+    crowd = crowd_indices(codes, base_temp, now, weather_code)
+    if grid_temp is not None:
+        base_temp = np.where(np.isnan(grid_temp), base_temp, grid_temp)
+    return round1(base_temp + temp_diff), crowd, comfort_scores(temp_diff, masks, crowd)
+
+def forecast_conditions(codes, temp_diff, masks, base_temps, times, weather_codes):
+    """
+    compute_conditions for every forecast hour in one vectorized pass:
+    (local_temp, crowd index, comfort_score) arrays of shape (hours, spots).
+    """
+    base_temps = np.asarray(base_temps, dtype=np.float64)
+    crowd = crowd_matrix(codes, base_temps, times, weather_codes)
+    local_temp = round1(base_temps[:, None] + temp_diff[None, :])
+    # Comfort only varies with the crowd level: score each level once per spot, then gather
+    shape = (len(CROWD_LABELS), len(codes))
+    levels = np.broadcast_to(np.arange(len(CROWD_LABELS), dtype=np.int8)[:, None], shape)
+    by_level = comfort_scores(np.broadcast_to(temp_diff, shape), np.broadcast_to(masks, shape), levels)
+    return local_temp, crowd, np.take_along_axis(by_level, crowd.astype(np.intp), axis=0)
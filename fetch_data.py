@@ -1,17 +1,51 @@
-import json
-import random
 import datetime
 import asyncio
 import aiohttp
+import logging
+import os
 import sys
+import time
 
-# File paths
-OUTPUT_FILE = "current_status.json"
+import numpy as np
+
+import catalog
+import engine
+import microclimate
+from aggregates import materialize
+from history import get_history
+from http_cache import get_response_cache
+from metrics import FALLBACKS, STAGE_SECONDS, UPSTREAM_SECONDS, log_event, timed
+from profiling import profiled
+from resilience import UpstreamGuard
+from snapshot import write_snapshot
+
+# File paths: binary columnar snapshot read by the dashboard, plus an
+# optional indented JSON export (set JSON_EXPORT_FILE= to disable it)
+OUTPUT_FILE = os.environ.get("SNAPSHOT_FILE") or "current_status.bin"
+JSON_EXPORT_FILE = os.environ.get("JSON_EXPORT_FILE", "current_status.json")
 
 # --- API CONFIGURATION ---
-OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast?latitude=45.7772&longitude=3.0870&current=temperature_2m,relative_humidity_2m,weather_code"
+FORECAST_TIMEZONE = "Europe/Paris"  # Zone of Open-Meteo's (naive) hourly times
+OPEN_METEO_URL = f"https://api.open-meteo.com/v1/forecast?latitude=45.7772&longitude=3.0870&current=temperature_2m,relative_humidity_2m,weather_code&hourly=temperature_2m,weather_code&forecast_hours=48&timezone={FORECAST_TIMEZONE.replace('/', '%2F')}"
 ATMO_API_URL = "https://opendata.clermontmetropole.eu/api/v2/catalog/datasets/atmo-indice-qualite-de-lair/records?limit=1&where=lib_zone='Clermont-Ferrand'&order_by=date_ech%20desc"
 
+# Per-spot microclimate mode (MICROCLIMATE=1): one model reading per grid cell,
+# fetched in multi-coordinate chunks, at most MICROCLIMATE_CONCURRENCY at a time
+MICROCLIMATE = os.environ.get("MICROCLIMATE") == "1"
+MICROCLIMATE_URL = "https://api.open-meteo.com/v1/forecast?current=temperature_2m"
+MICROCLIMATE_CONCURRENCY = 4
+
+# --- RESPONSE CACHE (seconds) ---
+# Open-Meteo "current" is updated every 15 min, the ATMO index once a day
+WEATHER_TTL, WEATHER_STALE_TTL = 900, 3600
+AIR_TTL, AIR_STALE_TTL = 3600, 86400
+
+# --- LATENCY BUDGETS ---
+# Hard per-agent deadline (retries included); breaker state lives for the process
+WEATHER_GUARD = UpstreamGuard("Open-Meteo", deadline=5.0, attempt_timeout=2.0)
+AIR_GUARD = UpstreamGuard("ATMO", deadline=5.0, attempt_timeout=2.0)
+MICROCLIMATE_GUARD = UpstreamGuard("Open-Meteo (microclimat)", deadline=8.0, attempt_timeout=4.0)
+
 # WMO Weather Codes to text
 WEATHER_CODES = {
     0: "Ensoleillé", 1: "Ensoleillé", 2: "Partiellement nuageux", 3: "Nuageux",
@@ -22,217 +56,246 @@ WEATHER_CODES = {
     95: "Orage", 96: "Orage avec grêle", 99: "Orage fort"
 }
 
-async def fetch_weather_real(session):
+def parse_weather(data):
+    current = data.get("current", {})
+    temp = current.get("temperature_2m", 25.0)
+    code = current.get("weather_code", 0)
+    
+    status = WEATHER_CODES.get(code, "Variable")
+    if temp > 30: status = "Canicule"
+    
+    weather = {
+        "temperature": temp, 
+        "status": status, 
+        "station": "Open-Meteo Real-time",
+        "humidity": current.get("relative_humidity_2m", 50),
+        "weather_code": code
+    }
+    hourly = parse_hourly(data.get("hourly"))
+    if hourly:
+        weather["hourly"] = hourly
+    return weather
+
+def parse_hourly(hourly):
+    """Hourly forecast (local ISO times), hours with missing values dropped."""
+    if not hourly:
+        return None
+    rows = [
+        (time, temp, code)
+        for time, temp, code in zip(hourly.get("time", []), hourly.get("temperature_2m", []), hourly.get("weather_code", []))
+        if temp is not None and code is not None
+    ]
+    return {
+        "time": [r[0] for r in rows],
+        "temperature": [r[1] for r in rows],
+        "weather_code": [r[2] for r in rows]
+    } if rows else None
+
+def parse_air_quality(data):
+    records = data.get("records", [])
+    if not records:
+        return None
+    fields = records[0]["record"]["fields"]
+    return {
+        "aqi": fields.get("code_qual", 0),
+        "description": fields.get("lib_qual", "Inconnu"),
+        "pollutants": {
+            "no2": fields.get("conc_no2"),
+            "o3": fields.get("conc_o3"),
+            "pm10": fields.get("conc_pm10")
+        },
+        "source": "Open Data Clermont (ATMO)"
+    }
+
+async def fetch_guarded(session, guard, url, ttl, stale_ttl, parse):
     """
-    Agent 1: Fetch Real-Time Weather from Open-Meteo
+    Fetch and parse `url` within the guard's latency budget.
+    On failure (or open circuit), fall back to the last successful response
+    kept by the response cache, flagged as stale with its age.
+    Returns None when nothing usable was ever fetched.
     """
+    cache = get_response_cache()
+
+    async def attempt():
+        data = await cache.fetch_json(session, url, ttl, stale_ttl)
+        return parse(data) if data is not None else None
+
+    started = time.perf_counter()
     try:
-        async with session.get(OPEN_METEO_URL) as response:
-            if response.status == 200:
-                data = await response.json()
-                current = data.get("current", {})
-                temp = current.get("temperature_2m", 25.0)
-                code = current.get("weather_code", 0)
-                
-                status = WEATHER_CODES.get(code, "Variable")
-                if temp > 30: status = "Canicule"
-                
-                return {
-                    "temperature": temp, 
-                    "status": status, 
-                    "station": "Open-Meteo Real-time",
-                    "humidity": current.get("relative_humidity_2m", 50)
-                }
+        return await guard.call(attempt)
     except Exception as e:
-        print(f"Error fetching weather: {e}")
+        log_event("upstream_error", logging.WARNING, upstream=guard.name, error=repr(e), circuit=guard.breaker.state)
+    finally:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream=guard.name)
+
+    # Last known good
+    entry = cache.get(url)
+    if entry is not None:
+        try:
+            value = parse(entry["body"])
+        except Exception as e:
+            # Corrupt entry: dropped, so it is not parsed again on every failure
+            log_event("fallback_error", logging.WARNING, upstream=guard.name, error=repr(e))
+            cache.discard(url)
+            value = None
+        if value is not None:
+            value["stale"] = True
+            value["age_seconds"] = round(time.time() - entry.get("fetched_at", 0))
+            FALLBACKS.inc(upstream=guard.name, fallback="last_good")
+            log_event("fallback", logging.WARNING, upstream=guard.name, fallback="last_good", age_seconds=value["age_seconds"])
+            return value
+    return None
+
+async def fetch_weather_real(session):
+    """
+    Agent 1: Fetch Real-Time Weather from Open-Meteo
+    """
+    weather = await fetch_guarded(session, WEATHER_GUARD, OPEN_METEO_URL, WEATHER_TTL, WEATHER_STALE_TTL, parse_weather)
+    if weather is not None:
+        return weather
     
     # Fallback
+    FALLBACKS.inc(upstream=WEATHER_GUARD.name, fallback="default")
+    log_event("fallback", logging.WARNING, upstream=WEATHER_GUARD.name, fallback="default")
     return {"temperature": 25.0, "status": "Indisponible", "station": "Simulated Fallback"}
 
 async def fetch_air_quality_real(session):
     """
     Agent 2: Fetch Air Quality from Open Data Clermont (ATMO)
     """
-    try:
-        async with session.get(ATMO_API_URL) as response:
-            if response.status == 200:
-                data = await response.json()
-                records = data.get("records", [])
-                if records:
-                    fields = records[0]["record"]["fields"]
-                    return {
-                        "aqi": fields.get("code_qual", 0),
-                        "description": fields.get("lib_qual", "Inconnu"),
-                        "pollutants": {
-                            "no2": fields.get("conc_no2"),
-                            "o3": fields.get("conc_o3"),
-                            "pm10": fields.get("conc_pm10")
-                        },
-                        "source": "Open Data Clermont (ATMO)"
-                    }
-    except Exception as e:
-        print(f"Error fetching air quality: {e}")
+    air_quality = await fetch_guarded(session, AIR_GUARD, ATMO_API_URL, AIR_TTL, AIR_STALE_TTL, parse_air_quality)
+    if air_quality is not None:
+        return air_quality
         
     # Fallback
+    FALLBACKS.inc(upstream=AIR_GUARD.name, fallback="default")
+    log_event("fallback", logging.WARNING, upstream=AIR_GUARD.name, fallback="default")
     return {"aqi": 2, "description": "Moyen (Simulé)", "source": "Simulated Fallback"}
 
-def generate_cool_islands(base_temp):
+async def fetch_microclimate(session, spot_catalog):
+    """
+    Agent 1b: model temperature at every spot of the catalog.
+    Spots are deduplicated on the model grid, the cells are requested in
+    multi-coordinate chunks (concurrently, within the semaphore) and each
+    spot gets its cell's reading. Returns (temperatures, stats); NaN where a
+    chunk failed, so those spots keep the city reading.
+    """
+    cell_lats, cell_lons, inverse = microclimate.grid_cells(spot_catalog.frame["lat"], spot_catalog.frame["lon"])
+    chunks = microclimate.chunk_urls(MICROCLIMATE_URL, cell_lats, cell_lons)
+    semaphore = asyncio.Semaphore(MICROCLIMATE_CONCURRENCY)
+
+    async def fetch_chunk(url):
+        async with semaphore:
+            return await fetch_guarded(
+                session, MICROCLIMATE_GUARD, url, WEATHER_TTL, WEATHER_STALE_TTL, microclimate.parse_batch
+            )
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(fetch_chunk(url) for _, url in chunks))
+    temperatures = np.full(len(cell_lats), np.nan)
+    failed = 0
+    for (start, _), result in zip(chunks, results):
+        values = (result or {}).get("temperatures") or []
+        if len(values) != min(microclimate.CHUNK_SIZE, len(cell_lats) - start):
+            failed += 1
+            continue
+        temperatures[start:start + len(values)] = values
+    if failed:
+        # Spots of the failed chunks keep the city reading
+        FALLBACKS.inc(failed, upstream=MICROCLIMATE_GUARD.name, fallback="city_reading")
+    stats = {
+        "spots": len(inverse), "cells": len(cell_lats), "requests": len(chunks), "failed": failed,
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+    return temperatures[inverse], stats
+
+def generate_cool_islands(base_temp, spots=None, weather_code=0, grid_temp=None):
     """
     Agent 3: Cool Island Optimization Engine (Local Data)
     Generates a rich dataset of Cool Islands based on current temperature.
+    Static attributes come from the persisted spot catalog; only local_temp,
+    crowd and comfort are recomputed. `spots` (name/lat/lon/type frame)
+    replaces the catalog with freshly drawn attributes.
     """
+    spot_catalog = catalog.from_spots(spots) if spots is not None else catalog.load_catalog()
     
-    # Categories and icons logic
-    categories = [
-        "Parc & Jardin", 
-        "Lieu Culturel", 
-        "Lieu de Culte", 
-        "Passage Ombragé", 
-        "Point d'Eau"
-    ]
+    local_temp, crowd, comfort = engine.compute_conditions(
+        spot_catalog.codes, spot_catalog.temp_diff, spot_catalog.amenities, base_temp,
+        weather_code=weather_code, grid_temp=grid_temp
+    )
     
-    amenities_pool = ["Bancs", "Ombre", "Eau Potable", "Toilettes", "Wifi", "Jeu pour enfants", "Climatisation"]
-    
-    # List of Real Locations in Clermont-Ferrand
-    locations = [
-        {"name": "Jardin Lecoq", "lat": 45.7709, "lon": 3.0885, "type": "Parc & Jardin"},
-        {"name": "Parc de Montjuzet", "lat": 45.7865, "lon": 3.0768, "type": "Parc & Jardin"},
-        {"name": "Square de la Poterne", "lat": 45.7788, "lon": 3.0847, "type": "Parc & Jardin"},
-        {"name": "Jardin Botanique de la Charme", "lat": 45.8033, "lon": 3.1098, "type": "Parc & Jardin"},
-        {"name": "Musée d'Art Roger Quilliot", "lat": 45.7972, "lon": 3.1119, "type": "Lieu Culturel"},
-        {"name": "La Comédie de Clermont", "lat": 45.7790, "lon": 3.0950, "type": "Lieu Culturel"},
-        {"name": "Muséum Henri-Lecoq", "lat": 45.7705, "lon": 3.0890, "type": "Lieu Culturel"},
-        {"name": "Cathédrale Notre-Dame-de-l'Assomption", "lat": 45.7785, "lon": 3.0858, "type": "Lieu de Culte"},
-        {"name": "Basilique Notre-Dame du Port", "lat": 45.7808, "lon": 3.0905, "type": "Lieu de Culte"},
-        {"name": "Fontaines Place de Jaude", "lat": 45.7766, "lon": 3.0822, "type": "Point d'Eau"},
-        {"name": "Fontaine d'Amboise", "lat": 45.7810, "lon": 3.0880, "type": "Point d'Eau"},
+    crowd_labels = engine.CROWD_LABELS
+    return [
+        {**static, "local_temp": temp, "crowd_level": crowd_labels[idx], "comfort_score": score}
+        for static, temp, idx, score in zip(spot_catalog.static_records(), local_temp.tolist(), crowd.tolist(), comfort.tolist())
     ]
-    
-    # Add random spots
-    for i in range(15):
-        lat_offset = random.uniform(-0.02, 0.02)
-        lon_offset = random.uniform(-0.02, 0.02)
-        spot_type = random.choice(categories)
-        locations.append({
-            "name": f"Oasis Fraîcheur #{i+1}",
-            "lat": 45.7772 + lat_offset,
-            "lon": 3.0870 + lon_offset,
-            "type": spot_type
-        })
-
-    enriched_data = []
-    
-    for loc in locations:
-        spot_type = loc["type"]
-        
-        # Determine Temperature Difference logic
-        if spot_type == "Lieu Culturel" or spot_type == "Lieu de Culte": # Indoor / Shadow
-            temp_diff = round(random.uniform(-6.0, -10.0), 1)
-        elif spot_type == "Point d'Eau":
-            temp_diff = round(random.uniform(-3.0, -5.0), 1)
-        elif spot_type == "Parc & Jardin":
-             temp_diff = round(random.uniform(-4.0, -7.0), 1)
-        else:
-             temp_diff = round(random.uniform(-2.0, -4.0), 1)
-             
-        # Calculate local temp based on REAL base_temp
-        local_temp = round(base_temp + temp_diff, 1)
-        
-        # Amenities
-        num_amenities = random.randint(1, 4)
-        my_amenities = random.sample(amenities_pool, num_amenities)
-        
-        # Logic fix
-        if spot_type == "Point d'Eau" and "Eau Potable" not in my_amenities: my_amenities.append("Eau Potable")
-        if (spot_type == "Lieu Culturel") and "Climatisation" not in my_amenities: my_amenities.append("Climatisation")
-
-        # Comfort Score
-        base_score = 5 + abs(temp_diff) * 0.5
-        if "Eau Potable" in my_amenities: base_score += 1
-        if "Climatisation" in my_amenities: base_score += 2
-        
-        # --- Smart Crowd Logic ---
-        # 1. Base by Time & Day
-        now = datetime.datetime.now()
-        hour = now.hour
-        is_weekend = now.weekday() >= 5
-        
-        if 8 <= hour <= 10: crowd_idx = 0 # Faible (Matin)
-        elif 12 <= hour <= 14: crowd_idx = 2 # Élevé (Déjeuner)
-        elif 14 < hour <= 17: crowd_idx = 1 # Moyen (Aprem)
-        elif 17 < hour <= 19: crowd_idx = 2 # Élevé (Sortie bureau)
-        else: crowd_idx = 0 # Soir/Nuit
-        
-        # 2. Type adjustments
-        if spot_type == "Parc & Jardin":
-            if is_weekend and 10 <= hour <= 18: crowd_idx = min(crowd_idx + 1, 2)
-        elif spot_type == "Lieu de Culte":
-            crowd_idx = max(0, crowd_idx - 1) # Généralement calme
-            
-        # 3. Weather impact (Rain = Empty parks)
-        # Weather codes: 51+ is Rain/Drizzle
-        weather_code = 0 # Default good
-        if isinstance(base_temp, float): # base_temp passed is just temp
-             pass 
-             # We need weather code here. For now we infer from temp or pass it.
-             # In this simple implementation, we assume if temp < 15 or bad weather implied
-             pass
-
-        # Since we don't pass weather code to this function yet, let's infer simple logic
-        # If very hot (>30), AC places are crowded, Parks are crowded only if shaded
-        if base_temp > 30 and "Climatisation" in amenities_pool:
-             if spot_type == "Lieu Culturel": crowd_idx = 2
-        
-        # Mapping
-        crowd_labels = ["Faible", "Moyen", "Élevé"]
-        crowd_level = crowd_labels[crowd_idx]
-        
-        # Calculate initial final_score from base_score
-        final_score = base_score
-        
-        # Adjust score based on crowd (High crowd reduces comfort slightly)
-        if crowd_level == "Élevé": final_score -= 0.5
-        elif crowd_level == "Faible": final_score += 0.5
-        
-        final_score = min(max(round(final_score, 1), 1), 10)
-        
-        enriched_data.append({
-            "name": loc["name"],
-            "lat": loc["lat"],
-            "lon": loc["lon"],
-            "type": spot_type,
-            "temp_diff": temp_diff,
-            "local_temp": local_temp,
-            "crowd_level": crowd_level,
-            "comfort_score": final_score,
-            "amenities": my_amenities
-        })
-        
-    return enriched_data
 
-async def main():
+async def collect(session):
+    """
+    Launch the network agents in parallel on an existing session.
+    Returns (weather, air_quality, microclimate); the last one is None
+    unless MICROCLIMATE mode is on.
+    """
+    print("1. Agent Météo (Open-Meteo) >> Recherche des données...")
+    tasks = [fetch_weather_real(session)]
+
+    print("2. Agent ATMO (Open Data) >> Analyse qualité de l'air...")
+    tasks.append(fetch_air_quality_real(session))
+
+    if MICROCLIMATE:
+        print("2b. Agent Microclimat (Open-Meteo) >> Température par lieu...")
+        tasks.append(fetch_microclimate(session, catalog.load_catalog()))
+
+    # Wait for API results
+    weather, air_quality, *spot_weather = await asyncio.gather(*tasks)
+    return weather, air_quality, (spot_weather[0] if spot_weather else None)
+
+async def main(session=None):
+    """
+    Full refresh cycle: fetch, compute, write OUTPUT_FILE.
+    Reuses `session` when given (in-process refresh), otherwise opens a
+    short-lived one (CLI usage). Returns the new snapshot.
+    Profiled (PROFILE_DIR) when PROFILE=1.
+    """
+    with profiled("fetch_data"):
+        return await refresh_cycle(session)
+
+async def refresh_cycle(session=None):
     print("--- 🚀 Lancement Multi-Agents Oasis Clermont ---")
+    started = time.perf_counter()
+    stages = {}
     
-    async with aiohttp.ClientSession() as session:
-        # Launch Parallel Data Collection Agents
-        print("1. Agent Météo (Open-Meteo) >> Recherche des données...")
-        weather_task = fetch_weather_real(session)
-        
-        print("2. Agent ATMO (Open Data) >> Analyse qualité de l'air...")
-        air_task = fetch_air_quality_real(session)
-        
-        # Wait for API results
-        weather, air_quality = await asyncio.gather(weather_task, air_task)
+    with timed("collect", into=stages):
+        if session is None:
+            async with aiohttp.ClientSession() as own_session:
+                weather, air_quality, spot_weather = await collect(own_session)
+                # Background revalidations need the session: let them finish first
+                await get_response_cache().drain()
+        else:
+            weather, air_quality, spot_weather = await collect(session)
         
     print(f"   >>> Météo reçue: {weather['temperature']}°C ({weather['status']})")
     print(f"   >>> Air reçu: Indice {air_quality['aqi']} ({air_quality['description']})")
+    grid_temp = None
+    if spot_weather is not None:
+        grid_temp, weather["microclimate"] = spot_weather
+        stats = weather["microclimate"]
+        print(f"   >>> Microclimat: {stats['spots']} lieux, {stats['cells']} mailles, "
+              f"{stats['requests']} requêtes ({stats['failed']} en échec) en {stats['seconds']}s")
 
     # Launch Calculation Agent
     print("3. Agent Moteur Fraîcheur >> Calcul des îlots...")
-    islands = generate_cool_islands(weather["temperature"])
+    with timed("generate", into=stages):
+        islands = generate_cool_islands(weather["temperature"], weather_code=weather.get("weather_code", 0), grid_temp=grid_temp)
+
+    # Rankings and per-category partials for the dashboard stats, computed once per snapshot
+    print("4. Agent Agrégats >> Classements et statistiques...")
+    with timed("aggregates", into=stages):
+        aggregates = materialize(islands)
     
     # Consolidate
-    timestamp = datetime.datetime.now().isoformat()
+    # With the UTC offset: hourly forecast times are compared with it whatever the server's zone
+    timestamp = datetime.datetime.now().astimezone().isoformat()
     data = {
         "metadata": {
             "timestamp": timestamp,
@@ -241,14 +304,29 @@ async def main():
         },
         "weather": weather,
         "air_quality": air_quality,
-        "cool_islands": islands
+        "cool_islands": islands,
+        "aggregates": aggregates
     }
     
-    # Save
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+    # Save (atomic publish, stamps snapshot_version & content_hash)
+    with timed("write_snapshot", into=stages):
+        version = write_snapshot(data, OUTPUT_FILE, exports=[JSON_EXPORT_FILE] if JSON_EXPORT_FILE else [])
+
+    # Append to the history store; a failure there must not fail the refresh
+    try:
+        with timed("history", into=stages):
+            await asyncio.to_thread(get_history().append, data)
+    except Exception as e:
+        log_event("history_error", logging.WARNING, error=repr(e))
     
-    print(f"✅ Données mises à jour avec succès ! ({len(islands)} lieux générés)")
+    seconds = time.perf_counter() - started
+    STAGE_SECONDS.observe(seconds, stage="refresh")
+    log_event(
+        "refresh", version=version, spots=len(islands), seconds=round(seconds, 4), stages=stages,
+        weather_stale=bool(weather.get("stale")), air_quality_stale=bool(air_quality.get("stale"))
+    )
+    print(f"✅ Données mises à jour avec succès ! ({len(islands)} lieux générés, v{version})")
+    return data
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,89 @@
+import datetime
+import threading
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+import engine
+from caching import LRUCache, derived
+from columnar import SpotTable
+from fetch_data import FORECAST_TIMEZONE, WEATHER_CODES
+
+FORECAST_HOURS = 48
+FORECAST_CACHE_SIZE = 2  # Current and previous snapshot (sessions still on it)
+
+def future_hours(data, hours=FORECAST_HOURS):
+    """
+    Indices and times of the snapshot's hourly forecast after its timestamp
+    (at most `hours`), as aware datetimes in FORECAST_TIMEZONE. Timestamps
+    without an offset (older snapshots) are in the server's local time.
+    """
+    hourly = (data.get("weather") or {}).get("hourly") or {}
+    now = datetime.datetime.fromisoformat(data["metadata"]["timestamp"]).astimezone()
+    zone = ZoneInfo(FORECAST_TIMEZONE)
+    times = [datetime.datetime.fromisoformat(t).replace(tzinfo=zone) for t in hourly.get("time", [])]
+    keep = [i for i, t in enumerate(times) if t > now][:hours]
+    return keep, [times[i] for i in keep]
+
+class ForecastMatrix:
+    """
+    Spot conditions for every forecast hour after a snapshot: (hours, spots)
+    arrays of local_temp, crowd index and comfort_score, computed in one
+    vectorized pass from the snapshot's hourly weather. Picking an hour
+    only slices a row: its spots are a view of the snapshot's SpotTable.
+    """
+
+    def __init__(self, data, hours=FORECAST_HOURS):
+        hourly = (data.get("weather") or {}).get("hourly") or {}
+        keep, self.times = future_hours(data, hours)
+
+        spots = data.get("cool_islands", [])
+        self.spots = spots if isinstance(spots, SpotTable) else SpotTable.from_records(spots)
+        self.temperature = np.array([hourly["temperature"][i] for i in keep], dtype=np.float64)
+        self.weather_code = np.array([hourly["weather_code"][i] for i in keep], dtype=np.int64)
+
+        columns = self.spots.columns
+        codes, temp_diff, masks = columns["type"], columns["temp_diff"], columns["amenities"]
+        self.local_temp, crowd, self.comfort_score = engine.forecast_conditions(
+            codes, temp_diff, masks, self.temperature, self.times, self.weather_code
+        )
+        self.crowd = crowd.astype(columns["crowd_level"].dtype)
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.times)
+
+    def label(self, hour):
+        """Weather summary of forecast hour `hour` (index into times)."""
+        status = WEATHER_CODES.get(int(self.weather_code[hour]), "Variable")
+        return f"{self.temperature[hour]:.1f}°C · {status}"
+
+    def spots_at(self, hour):
+        """
+        cool_islands as they would be at forecast hour `hour`: a view of the
+        snapshot's table with the matrix rows as columns (nothing is copied,
+        records are only built for the rows read). The same view is returned
+        for an hour every time, so the caches keyed on it are shared by every
+        session and request looking at that hour.
+        """
+        with self._lock:
+            spots = self._views.get(hour)
+            if spots is None:
+                spots = self._views[hour] = self.spots.with_columns(
+                    local_temp=self.local_temp[hour], crowd_level=self.crowd[hour],
+                    comfort_score=self.comfort_score[hour]
+                )
+            return spots
+
+_forecast_cache = LRUCache("prévisions", maxsize=FORECAST_CACHE_SIZE)
+_forecast_lock = threading.Lock()
+
+def get_forecast(data):
+    """
+    ForecastMatrix of a snapshot, built once per published snapshot. None
+    without hourly data, or when none of it is after the snapshot (e.g. a
+    last known good weather reading more than 48 h old).
+    """
+    with _forecast_lock:
+        return derived(_forecast_cache, data, lambda: ForecastMatrix(data) if future_hours(data)[0] else None)
@@ -0,0 +1,234 @@
+import datetime
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+import engine
+
+# Append-only history of every published snapshot
+HISTORY_FILE = os.environ.get("HISTORY_FILE") or "history.sqlite3"
+
+BUCKETS = {"hour": 3600, "day": 86400}
+
+# Rows are keyed on Unix milliseconds (schema 2); schema 1 files keyed on
+# seconds, which merged snapshots published within the same second
+SCHEMA_VERSION = 2
+TABLES = ["snapshots", "weather", "air_quality", "spot_conditions", "spot_summary"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    ts INTEGER PRIMARY KEY,         -- Unix milliseconds of metadata.timestamp
+    version INTEGER,
+    content_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS weather (
+    ts INTEGER PRIMARY KEY,
+    temperature REAL,
+    humidity REAL,
+    status TEXT,
+    stale INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS air_quality (
+    ts INTEGER PRIMARY KEY,
+    aqi INTEGER,
+    description TEXT,
+    no2 REAL,
+    o3 REAL,
+    pm10 REAL,
+    stale INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS spot_conditions (
+    spot_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    local_temp REAL,
+    comfort_score REAL,
+    crowd INTEGER,                  -- engine.CROWD_LABELS index
+    PRIMARY KEY (spot_id, ts)
+) WITHOUT ROWID;
+-- City-wide roll-up of spot_conditions, one row per snapshot
+CREATE TABLE IF NOT EXISTS spot_summary (
+    ts INTEGER PRIMARY KEY,
+    spots INTEGER,
+    local_temp_avg REAL,
+    local_temp_min REAL,
+    local_temp_max REAL,
+    comfort_score_avg REAL,
+    comfort_score_min REAL,
+    comfort_score_max REAL
+);
+"""
+
+# Metric name -> (table, column) for range queries and aggregates
+METRICS = {
+    "temperature": ("weather", "temperature"),
+    "humidity": ("weather", "humidity"),
+    "aqi": ("air_quality", "aqi"),
+    "no2": ("air_quality", "no2"),
+    "o3": ("air_quality", "o3"),
+    "pm10": ("air_quality", "pm10"),
+    "local_temp": ("spot_conditions", "local_temp"),
+    "comfort_score": ("spot_conditions", "comfort_score")
+}
+
+def to_epoch(timestamp):
+    """metadata.timestamp (ISO, local time) -> Unix seconds."""
+    return int(datetime.datetime.fromisoformat(timestamp).timestamp())
+
+def to_epoch_ms(timestamp):
+    """metadata.timestamp -> Unix milliseconds, the key of every history row."""
+    return round(datetime.datetime.fromisoformat(timestamp).timestamp() * 1000)
+
+# Row timestamps as returned by the queries: Unix seconds
+SECONDS = "ts / 1000.0"
+
+def _ms(seconds):
+    return round(seconds * 1000)
+
+class HistoryStore:
+    """
+    Time-indexed SQLite tables, one row per snapshot (per spot for conditions,
+    plus a per-snapshot city-wide roll-up), keyed on the snapshot timestamp
+    in milliseconds. Rows are only ever inserted; re-appending a snapshot is
+    a no-op. Range queries (in Unix seconds) are primary-key range scans and
+    aggregates are computed by SQLite over fixed hour/day buckets.
+    """
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        # WAL: the dashboard keeps reading while fetch_data appends
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        with self._conn:
+            if version < 2:
+                # Seconds -> milliseconds (nothing to convert in a new file)
+                for table in TABLES:
+                    self._conn.execute(f"UPDATE {table} SET ts = ts * 1000")
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def append(self, data):
+        """
+        Record a published snapshot. Returns False if it was already stored;
+        raises ValueError if another snapshot holds the same timestamp.
+        """
+        metadata = data.get("metadata", {})
+        ts = to_epoch_ms(metadata["timestamp"])
+        identity = (metadata.get("snapshot_version"), metadata.get("content_hash"))
+        weather = data.get("weather") or {}
+        air = data.get("air_quality") or {}
+        pollutants = air.get("pollutants") or {}
+        crowd_codes = {label: code for code, label in enumerate(engine.CROWD_LABELS)}
+
+        with self._lock, self._conn:
+            stored = self._conn.execute("SELECT version, content_hash FROM snapshots WHERE ts = ?", (ts,)).fetchone()
+            if stored is not None:
+                if tuple(stored) == identity:
+                    return False
+                raise ValueError(
+                    f"History already holds snapshot v{stored[0]} at {metadata['timestamp']}: v{identity[0]} not recorded"
+                )
+            self._conn.execute("INSERT INTO snapshots VALUES (?, ?, ?)", (ts, *identity))
+            self._conn.execute(
+                "INSERT INTO weather VALUES (?, ?, ?, ?, ?)",
+                (ts, weather.get("temperature"), weather.get("humidity"), weather.get("status"), int(bool(weather.get("stale"))))
+            )
+            self._conn.execute(
+                "INSERT INTO air_quality VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (ts, air.get("aqi"), air.get("description"), pollutants.get("no2"), pollutants.get("o3"),
+                 pollutants.get("pm10"), int(bool(air.get("stale"))))
+            )
+            rows = [
+                (s["id"], ts, s.get("local_temp"), s.get("comfort_score"), crowd_codes.get(s.get("crowd_level")))
+                for s in data.get("cool_islands", []) if "id" in s
+            ]
+            self._conn.executemany("INSERT OR IGNORE INTO spot_conditions VALUES (?, ?, ?, ?, ?)", rows)
+            if rows:
+                temps = np.array([r[2] for r in rows], dtype=np.float64)
+                comfort = np.array([r[3] for r in rows], dtype=np.float64)
+                self._conn.execute(
+                    "INSERT INTO spot_summary VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (ts, len(rows), float(np.nanmean(temps)), float(np.nanmin(temps)), float(np.nanmax(temps)),
+                     float(np.nanmean(comfort)), float(np.nanmin(comfort)), float(np.nanmax(comfort)))
+                )
+            return True
+
+    def _query(self, sql, params):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def series(self, metric, start, end, spot_id=None):
+        """
+        Raw [(ts, value)] of `metric` in [start, end) (Unix seconds), oldest
+        first. Spot metrics are the city-wide mean unless `spot_id` is given.
+        """
+        table, column = METRICS[metric]
+        start, end = _ms(start), _ms(end)
+        if table == "spot_conditions":
+            if spot_id is None:
+                return self._query(
+                    f"SELECT {SECONDS}, {column}_avg FROM spot_summary WHERE ts >= ? AND ts < ? ORDER BY ts", (start, end)
+                )
+            return self._query(
+                f"SELECT {SECONDS}, {column} FROM spot_conditions WHERE spot_id = ? AND ts >= ? AND ts < ? ORDER BY ts",
+                (spot_id, start, end)
+            )
+        return self._query(f"SELECT {SECONDS}, {column} FROM {table} WHERE ts >= ? AND ts < ? ORDER BY ts", (start, end))
+
+    def aggregate(self, metric, start, end, bucket="hour", spot_id=None):
+        """
+        [(bucket start, mean, min, max, samples)] of `metric` in [start, end),
+        by hour or day (UTC-aligned). Spot metrics are averaged over all spots
+        unless `spot_id` is given.
+        """
+        table, column = METRICS[metric]
+        width = BUCKETS[bucket]
+        start, end = _ms(start), _ms(end)
+        if table == "spot_conditions" and spot_id is None:
+            # From the per-snapshot roll-up, weighted by spot count
+            return self._query(
+                f"SELECT ts / {width * 1000} * {width} AS bucket, SUM({column}_avg * spots) / SUM(spots), "
+                f"MIN({column}_min), MAX({column}_max), SUM(spots) "
+                f"FROM spot_summary WHERE ts >= ? AND ts < ? GROUP BY bucket ORDER BY bucket",
+                (start, end)
+            )
+        where, params = "ts >= ? AND ts < ?", [start, end]
+        if spot_id is not None:
+            where, params = "spot_id = ? AND " + where, [spot_id] + params
+        return self._query(
+            f"SELECT ts / {width * 1000} * {width} AS bucket, AVG({column}), MIN({column}), MAX({column}), COUNT({column}) "
+            f"FROM {table} WHERE {where} GROUP BY bucket ORDER BY bucket",
+            params
+        )
+
+    def latest_before(self, metric, ts):
+        """Most recent (ts, value) of a city-wide metric at or before `ts`, or None."""
+        table, column = METRICS[metric]
+        if table == "spot_conditions":
+            table, column = "spot_summary", column + "_avg"
+        rows = self._query(f"SELECT {SECONDS}, {column} FROM {table} WHERE ts <= ? ORDER BY ts DESC LIMIT 1", (_ms(ts),))
+        return rows[0] if rows else None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_history = None
+_history_lock = threading.Lock()
+
+def get_history():
+    """Process-wide HistoryStore on HISTORY_FILE."""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = HistoryStore()
+        return _history
@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from metrics import HTTP_CACHE_RESULTS, UPSTREAM_RESPONSES, log_event
+
+# On-disk location of cached upstream responses
+CACHE_DIR = os.environ.get("HTTP_CACHE_DIR") or os.path.join(".cache", "http")
+# Upper bound for a background revalidation nobody is waiting on
+REVALIDATE_TIMEOUT = 10
+
+class ResponseCache:
+    """
+    On-disk JSON response cache for the fetch agents.
+    - fresh (age < ttl): served from cache, no request
+    - stale (age < ttl + stale_ttl): served from cache, revalidated in background
+    - expired / missing: fetched now, with If-None-Match / If-Modified-Since
+      when a previous entry carries an ETag / Last-Modified
+    """
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        self._entries = {}       # url -> entry (memory layer over the files)
+        self._revalidating = {}  # url -> background Task
+        self.stats = {"fresh": 0, "stale": 0, "miss": 0, "not_modified": 0}
+
+    def _path(self, url):
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32] + ".json"
+        return os.path.join(self.directory, name)
+
+    def _count(self, result):
+        self.stats[result] += 1
+        HTTP_CACHE_RESULTS.inc(result=result)
+
+    def get(self, url):
+        entry = self._entries.get(url)
+        if entry is None:
+            try:
+                with open(self._path(url), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._entries[url] = entry
+        return entry
+
+    def put(self, url, entry):
+        self._entries[url] = entry
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(url))
+        except OSError as e:
+            # The memory layer still works; only persistence across restarts is lost
+            log_event("response_cache_error", logging.WARNING, error=repr(e))
+
+    def discard(self, url):
+        """Forget the entry of `url`, in memory and on disk."""
+        self._entries.pop(url, None)
+        try:
+            os.remove(self._path(url))
+        except OSError:
+            pass
+
+    async def _revalidate(self, session, url, entry):
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        host = urlsplit(url).hostname
+        try:
+            response = await session.get(url, headers=headers)
+        except asyncio.CancelledError:
+            # Attempt timeout (the guard's wait_for) before any response
+            UPSTREAM_RESPONSES.inc(host=host, status="timeout")
+            raise
+        except Exception:
+            UPSTREAM_RESPONSES.inc(host=host, status="error")
+            raise
+        UPSTREAM_RESPONSES.inc(host=host, status=response.status)
+        async with response:
+            if response.status == 304 and entry is not None:
+                self._count("not_modified")
+                entry = dict(entry, fetched_at=time.time())
+                self.put(url, entry)
+                return entry["body"]
+            if response.status == 200:
+                body = await response.json()
+                self.put(url, {
+                    "url": url,
+                    "body": body,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "fetched_at": time.time()
+                })
+                return body
+            return None
+
+    async def _revalidate_in_background(self, session, url, entry):
+        try:
+            await asyncio.wait_for(self._revalidate(session, url, entry), REVALIDATE_TIMEOUT)
+        except Exception as e:
+            log_event("revalidation_error", logging.WARNING, url=url, error=repr(e))
+        finally:
+            self._revalidating.pop(url, None)
+
+    async def fetch_json(self, session, url, ttl, stale_ttl=0):
+        """
+        Return the JSON body for `url`, or None when the upstream answered
+        with an unexpected status. Network errors propagate to the caller.
+        """
+        entry = self.get(url)
+        if entry is not None:
+            age = time.time() - entry.get("fetched_at", 0)
+            if age < ttl:
+                self._count("fresh")
+                return entry["body"]
+            if age < ttl + stale_ttl:
+                self._count("stale")
+                if url not in self._revalidating:
+                    self._revalidating[url] = asyncio.get_running_loop().create_task(
+                        self._revalidate_in_background(session, url, entry)
+                    )
+                return entry["body"]
+        self._count("miss")
+        return await self._revalidate(session, url, entry)
+
+    async def drain(self):
+        """Wait for pending background revalidations (before closing a session)."""
+        if self._revalidating:
+            await asyncio.gather(*list(self._revalidating.values()), return_exceptions=True)
+
+_response_cache = None
+
+def get_response_cache():
+    """Process-wide ResponseCache shared by the fetch agents."""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
@@ -0,0 +1,410 @@
+import argparse
+import csv
+import datetime
+import functools
+import io
+import json
+import math
+import os
+import re
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+import catalog
+import engine
+from snapshot import atomic_write
+
+# --- IMPORT CONFIGURATION ---
+READ_CHUNK = 1 << 20   # GeoJSON read size (characters)
+BATCH_SIZE = 10000     # Records per static-attribute draw / catalog write
+DEDUP_RADIUS_M = 15    # Same-type points closer than this are one spot
+REPORT_EVERY = 100000  # Progress line every N source records
+METRES_PER_DEG = math.pi / 180 * 6371008.8
+
+# OSM tag values (amenity, leisure, building, tourism...) -> spot type, matched exactly
+CATEGORY_VALUES = {
+    "fountain": "Point d'Eau", "drinking_water": "Point d'Eau", "water_point": "Point d'Eau",
+    "place_of_worship": "Lieu de Culte", "church": "Lieu de Culte", "cathedral": "Lieu de Culte",
+    "chapel": "Lieu de Culte", "mosque": "Lieu de Culte", "synagogue": "Lieu de Culte", "temple": "Lieu de Culte",
+    "museum": "Lieu Culturel", "library": "Lieu Culturel", "theatre": "Lieu Culturel", "cinema": "Lieu Culturel",
+    "gallery": "Lieu Culturel", "arts_centre": "Lieu Culturel",
+    "arcade": "Passage Ombragé",
+    "park": "Parc & Jardin", "garden": "Parc & Jardin", "wood": "Parc & Jardin", "forest": "Parc & Jardin",
+    "nature_reserve": "Parc & Jardin",
+}
+
+# Words of free-text categories and names -> spot type, first match wins (accent-free,
+# lower case). Matched as whole words, plural allowed: "parc" is not in "parcours".
+CATEGORY_WORDS = [
+    ("Point d'Eau", ["fountain", "fontaine", "drinking water", "point d'eau", "brumisateur", "bassin"]),
+    ("Lieu de Culte", ["church", "eglise", "cathedral", "cathedrale", "basilique", "basilica", "chapel", "chapelle",
+                       "temple", "mosque", "mosquee", "synagogue", "culte"]),
+    ("Lieu Culturel", ["museum", "musee", "library", "bibliotheque", "mediatheque", "theatre", "cinema",
+                       "gallery", "culturel", "cultural"]),
+    ("Passage Ombragé", ["passage", "arcade", "covered", "couvert", "galerie marchande"]),
+    ("Parc & Jardin", ["park", "parc", "garden", "jardin", "square", "wood", "bois", "forest", "foret",
+                       "espace vert", "espaces verts"]),
+]
+
+# Never a cool island, whatever else the record says ("parc de stationnement", amenity=bicycle_parking)
+EXCLUDED_WORDS = ["parking", "car park", "carpark", "stationnement", "parc relais", "parc auto"]
+
+# Candidate source fields, in order of preference (compared in lower case)
+NAME_FIELDS = ["name", "nom", "libelle", "title", "titre", "appellation"]
+CATEGORY_FIELDS = ["type", "category", "categorie", "amenity", "leisure", "tourism", "historic",
+                   "building", "nature", "typologie", "famille"]
+LAT_FIELDS = ["lat", "latitude", "y"]
+LON_FIELDS = ["lon", "lng", "long", "longitude", "x"]
+POINT_FIELDS = ["geo_point_2d", "geopoint", "geo_point"]
+
+def _normalize(text):
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii")
+    return text.lower()
+
+def _words(words):
+    # Letters and digits around a word end it; "_" and "-" separate words ("bicycle_parking")
+    alternatives = "|".join(re.escape(word) for word in words)
+    return re.compile(rf"(?<![a-z0-9])(?:{alternatives})(?:s|x)?(?![a-z0-9])")
+
+_TYPE_NAMES = {_normalize(name): name for name in engine.CATEGORIES}
+_CATEGORY_PATTERNS = [(spot_type, _words(words)) for spot_type, words in CATEGORY_WORDS]
+_EXCLUDED = _words(EXCLUDED_WORDS)
+
+@functools.lru_cache(maxsize=4096)
+def map_category(*values):
+    """
+    Spot type for source category values (or a name), None if nothing
+    matches or if any value names a parking.
+    """
+    texts = [_normalize(v).strip() for v in values if v]
+    if any(_EXCLUDED.search(text) for text in texts):
+        return None
+    for text in texts:
+        spot_type = _TYPE_NAMES.get(text) or CATEGORY_VALUES.get(text)
+        if spot_type:
+            return spot_type
+    for spot_type, pattern in _CATEGORY_PATTERNS:
+        if any(pattern.search(text) for text in texts):
+            return spot_type
+    return None
+
+def _lowered(properties):
+    return {str(k).lower(): v for k, v in properties.items()}
+
+def _fields(lowered, candidates):
+    """Non-empty values of the `candidates` keys of a lower-cased record, as strings."""
+    return [str(lowered[name]) for name in candidates if lowered.get(name) not in (None, "")]
+
+# --- STREAMING READERS: (lower-cased properties, lat, lon) per record, None if unusable ---
+
+class _JSONStream:
+    """
+    Incremental JSON reader over a text file: the buffer holds one read
+    chunk plus the value being decoded, never the whole document.
+    """
+
+    # A chunk boundary cutting a token ("fals", "\u00") fails this close to the end
+    CUT_TAIL = 6
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer, self.pos, self.offset = "", 0, 0
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.offset += self.pos
+        self.buffer, self.pos = self.buffer[self.pos:] + chunk, 0
+        return True
+
+    def malformed(self, message):
+        return ValueError(f"Malformed GeoJSON at character {self.offset + self.pos}: {message}")
+
+    def peek(self, skip=" \t\r\n"):
+        """Next character after `skip` characters ("" at the end of the file)."""
+        while True:
+            buffer, pos = self.buffer, self.pos
+            while pos < len(buffer) and buffer[pos] in skip:
+                pos += 1
+            self.pos = pos
+            if pos < len(buffer) or not self._fill():
+                return buffer[pos:pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise self.malformed(f"expected {char!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next value, reading on while the chunk boundary cuts it."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if e.pos < len(self.buffer) - self.CUT_TAIL and not e.msg.startswith("Unterminated string"):
+                    self.pos = e.pos
+                    raise self.malformed(e.msg) from None
+                if not self._fill():
+                    raise ValueError(f"Truncated GeoJSON at character {self.offset + self.pos}") from None
+                continue
+            # A number or literal ending the buffer may go on in the next chunk
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+def iter_geojson(f, chunk_size=READ_CHUNK):
+    """
+    Features of a GeoJSON FeatureCollection (or of newline-delimited
+    GeoJSON) decoded one at a time: only the current feature and one read
+    chunk are held in memory. The collection's other members ("type",
+    "crs", "name"...) are skipped whatever their order. Raises ValueError
+    on malformed or truncated input, or when there are no features to read.
+    """
+    stream = _JSONStream(f, chunk_size)
+    stream.peek(skip="\ufeff\x1e \t\r\n")
+    stream.expect("{")
+    members = {}
+    while stream.peek() != "}":
+        if members:
+            stream.expect(",")
+        if stream.peek() != '"':
+            raise stream.malformed("expected a member name")
+        key = stream.value()
+        stream.expect(":")
+        if key == "features":
+            yield from _array_items(stream)
+            return
+        members[key] = stream.value()
+    stream.expect("}")
+
+    if members.get("type") != "Feature":
+        raise ValueError(f"GeoJSON without features (type {members.get('type')!r})")
+    # GeoJSON sequence: features at the top level
+    yield members
+    while stream.peek(skip="\x1e \t\r\n"):
+        if stream.peek() != "{":
+            raise stream.malformed("expected a feature")
+        yield stream.value()
+
+def _array_items(stream):
+    stream.expect("[")
+    if stream.peek() == "]":
+        return
+    while True:
+        yield stream.value()
+        char = stream.peek()
+        if char == "]":
+            return
+        if char != ",":
+            raise stream.malformed("expected ',' or ']'")
+        stream.pos += 1
+
+def centroid(geometry):
+    """(lat, lon) of a Point, or the vertex mean of a line / polygon (first part, outer ring)."""
+    kind, coords = (geometry or {}).get("type"), (geometry or {}).get("coordinates")
+    if not coords:
+        return None
+    if kind == "Point":
+        return coords[1], coords[0]
+    while isinstance(coords[0][0], list):
+        coords = coords[0]
+    return sum(c[1] for c in coords) / len(coords), sum(c[0] for c in coords) / len(coords)
+
+def geojson_records(f):
+    for feature in iter_geojson(f):
+        location = centroid(feature.get("geometry"))
+        yield (_lowered(feature.get("properties") or {}), location[0], location[1]) if location else None
+
+def csv_records(f):
+    """Rows of a comma / semicolon CSV with lat + lon columns or a "lat, lon" point column."""
+    header = f.readline()
+    delimiter = ";" if header.count(";") > header.count(",") else ","
+    fieldnames = next(csv.reader([header], delimiter=delimiter))
+    for row in csv.DictReader(f, fieldnames=fieldnames, delimiter=delimiter):
+        row = _lowered(row)
+        lat, lon, point = _fields(row, LAT_FIELDS)[:1], _fields(row, LON_FIELDS)[:1], _fields(row, POINT_FIELDS)[:1]
+        try:
+            if lat and lon:
+                yield row, float(lat[0].replace(",", ".")), float(lon[0].replace(",", "."))
+            elif point:
+                point_lat, point_lon = point[0].strip("[]() ").split(",")[:2]
+                yield row, float(point_lat), float(point_lon)
+            else:
+                yield None
+        except ValueError:
+            yield None
+
+READERS = {".geojson": geojson_records, ".json": geojson_records, ".geojsonl": geojson_records,
+           ".csv": csv_records}
+
+# --- SPATIAL DEDUPLICATION ---
+
+class SpatialDeduplicator:
+    """
+    Grid hash of the kept points (cells of `radius_m`, per type): a point is
+    a duplicate when a kept point of the same type lies within `radius_m`.
+    Only the neighbouring cells are checked, so each test is O(1). Keys and
+    positions are packed in plain ints (about 100 bytes per kept spot).
+    """
+
+    def __init__(self, radius_m=DEDUP_RADIUS_M):
+        self.radius_m = radius_m
+        self.cell_deg = radius_m / METRES_PER_DEG
+        self.cells = {}  # packed (row, col, type) -> packed position, or a list of them
+        self.types = {name: code for code, name in enumerate(engine.CATEGORIES)}
+
+    def add(self, lat, lon, spot_type):
+        """Record the point unless it duplicates one already kept. Returns True if kept."""
+        code, types = self.types[spot_type], len(self.types)
+        row, col = int(lat // self.cell_deg), int(lon // self.cell_deg)
+        scale = math.cos(math.radians(lat))
+        reach = int(math.ceil(1 / max(scale, 0.01)))  # Longitude cells shrink in metres away from the equator
+        limit = (self.radius_m / METRES_PER_DEG * 1e7) ** 2
+        cells = self.cells
+        for r in (row - 1, row, row + 1):
+            base = r << 32
+            for c in range(col - reach, col + reach + 1):
+                kept = cells.get((base + (c & 0xFFFFFFFF)) * types + code)
+                if kept is None:
+                    continue
+                for packed in (kept if isinstance(kept, list) else (kept,)):
+                    dy = lat * 1e7 - ((packed >> 32) - (1 << 31))
+                    dx = (lon * 1e7 - ((packed & 0xFFFFFFFF) - (1 << 31))) * scale
+                    if dx * dx + dy * dy <= limit:
+                        return False
+        packed = (int(round(lat * 1e7)) + (1 << 31)) << 32 | (int(round(lon * 1e7)) + (1 << 31))
+        key = ((row << 32) + (col & 0xFFFFFFFF)) * types + code
+        kept = cells.get(key)
+        if kept is None:
+            cells[key] = packed
+        elif isinstance(kept, list):
+            kept.append(packed)
+        else:
+            cells[key] = [kept, packed]
+        return True
+
+# --- IMPORT ---
+
+def spots_from_files(paths, stats, dedup, force_type=None, bbox=None):
+    """(name, lat, lon, type) of every new spot in `paths`, streamed."""
+    started = time.perf_counter()
+    for path in paths:
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise ValueError(f"Unsupported file type: {path}")
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            for record in reader(f):
+                stats["read"] += 1
+                if stats["read"] % REPORT_EVERY == 0:
+                    rate = stats["read"] / (time.perf_counter() - started)
+                    print(f"   ... {stats['read']} enregistrements lus ({rate:,.0f}/s), {stats['kept']} lieux retenus")
+                if record is None:
+                    stats["invalid"] += 1
+                    continue
+                properties, lat, lon = record
+                if not (-90 <= lat <= 90 and -180 <= lon <= 180) or (
+                    bbox and not (bbox[0] <= lat <= bbox[2] and bbox[1] <= lon <= bbox[3])
+                ):
+                    stats["invalid"] += 1
+                    continue
+                names = _fields(properties, NAME_FIELDS)
+                spot_type = force_type or map_category(*_fields(properties, CATEGORY_FIELDS)) or map_category(*names[:1])
+                if spot_type is None:
+                    stats["unmapped"] += 1
+                    continue
+                if not dedup.add(lat, lon, spot_type):
+                    stats["duplicates"] += 1
+                    continue
+                stats["kept"] += 1
+                yield names[0] if names else f"{spot_type} #{stats['kept']}", lat, lon, spot_type
+
+def import_files(paths, path=catalog.CATALOG_FILE, append=False, force_type=None, bbox=None,
+                 radius_m=DEDUP_RADIUS_M, seed=None):
+    """
+    Stream GeoJSON / CSV exports into the spot catalog at `path`.
+    Records are parsed one at a time and written in batches of BATCH_SIZE
+    (static attributes drawn per batch), so memory does not grow with the
+    input; only the deduplication grid grows, with the spots kept.
+    With `append`, the current catalog is kept and new spots are added;
+    without it, an import that keeps no spot raises ValueError instead of
+    replacing the catalog with an empty one. Returns the import stats.
+    """
+    stats = {"read": 0, "kept": 0, "duplicates": 0, "unmapped": 0, "invalid": 0}
+    dedup = SpatialDeduplicator(radius_m)
+    rng = np.random.default_rng(seed)
+    existing = catalog.load_catalog(path).to_json()["spots"] if append and os.path.exists(path) else []
+    for spot in existing:
+        dedup.add(spot["lat"], spot["lon"], spot["type"])
+    next_id = max((s["id"] for s in existing), default=-1) + 1
+
+    def write(f):
+        nonlocal next_id
+        text = io.TextIOWrapper(f, encoding="utf-8")
+        separator = "\n"
+
+        def emit(spots):
+            nonlocal separator
+            for spot in spots:
+                text.write(separator + json.dumps(spot, ensure_ascii=False))
+                separator = ",\n"
+
+        text.write('{"spots": [')
+        emit(existing)
+        batch = []
+        for spot in spots_from_files(paths, stats, dedup, force_type, bbox):
+            batch.append(spot)
+            if len(batch) == BATCH_SIZE:
+                emit(catalog.from_spots(pd.DataFrame(batch, columns=["name", "lat", "lon", "type"]), rng, next_id).to_json()["spots"])
+                next_id += len(batch)
+                batch = []
+        if batch:
+            emit(catalog.from_spots(pd.DataFrame(batch, columns=["name", "lat", "lon", "type"]), rng, next_id).to_json()["spots"])
+        if not stats["kept"] and not append:
+            # Nothing usable (wrong file, unmapped categories, bbox elsewhere): keep the current catalog
+            raise ValueError(f"No spot imported from {stats['read']} records: catalog {path} left unchanged")
+        metadata = {
+            "created": datetime.datetime.now().isoformat(),
+            "source": "Import " + ", ".join(os.path.basename(p) for p in paths),
+            "count": len(existing) + stats["kept"]
+        }
+        text.write("\n], \"metadata\": " + json.dumps(metadata, ensure_ascii=False) + "}\n")
+        text.flush()
+        text.detach()
+
+    started = time.perf_counter()
+    atomic_write(path, write)
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["records_per_second"] = round(stats["read"] / stats["seconds"]) if stats["seconds"] else 0
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importe des lieux (GeoJSON / CSV) dans le catalogue Oasis.")
+    parser.add_argument("files", nargs="+", help="Exports GeoJSON (.geojson, .json, .geojsonl) ou CSV")
+    parser.add_argument("--catalog", default=catalog.CATALOG_FILE, help="Catalogue à écrire")
+    parser.add_argument("--append", action="store_true", help="Ajouter au catalogue existant au lieu de le remplacer")
+    parser.add_argument("--type", choices=engine.CATEGORIES, help="Type imposé à tous les lieux des fichiers")
+    parser.add_argument("--bbox", help="Emprise sud,ouest,nord,est (degrés)")
+    parser.add_argument("--dedup-m", type=float, default=DEDUP_RADIUS_M, help="Rayon de déduplication (m)")
+    parser.add_argument("--seed", type=int, help="Graine des attributs tirés (équipements, écart de température)")
+    args = parser.parse_args(argv)
+
+    bbox = [float(v) for v in args.bbox.split(",")] if args.bbox else None
+    try:
+        stats = import_files(args.files, args.catalog, args.append, args.type, bbox, args.dedup_m, args.seed)
+    except ValueError as e:
+        parser.exit(1, f"❌ {e}\n")
+    print(f"✅ {stats['kept']} lieux importés ({stats['duplicates']} doublons, {stats['unmapped']} non classés, "
+          f"{stats['invalid']} invalides) sur {stats['read']} enregistrements en {stats['seconds']}s "
+          f"({stats['records_per_second']:,}/s)")
+    return stats
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+import folium
+import jinja2
+import numpy as np
+import streamlit as st
+from folium.plugins import MarkerCluster
+from folium.raster_layers import ImageOverlay
+from streamlit_folium import st_folium
+
+import clusters
+import raster
+from caching import LRUCache
+from columnar import spot_columns
+from engine import CITY_CENTER
+from metrics import timed
+from spatial import get_index
+
+try:
+    # Internals used by st_folium itself: lets us render a map once and
+    # replay the payload (st_folium mutates the map while rendering it)
+    from streamlit_folium import (
+        _component_func, _get_feature_group_string, _get_header, _get_html, _get_map_string,
+        generate_js_hash, get_full_id
+    )
+except ImportError:  # Other streamlit-folium layout: no payload cache
+    _component_func = None
+
+MAP_HEIGHT = 600
+MAP_CACHE_SIZE = 32                       # Distinct (snapshot, filters) views kept
+MAP_CACHE_MAX_BYTES = 64 * 1024 * 1024    # Bound on cached rendered HTML/JS
+LAYER_CACHE_SIZE = 256                    # Distinct (view, viewport tiles) marker layers kept
+LAYER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+POPUP_CACHE_SIZE = 1024                   # Rendered spot cards kept
+RASTER_CACHE_SIZE = 64                    # Heat overlays kept (view x zoom level)
+RASTER_CACHE_MAX_BYTES = 32 * 1024 * 1024
+MAP_START_ZOOM = 14
+MAP_KEY = "oasis-map"                     # Widget keys when streamlit-folium internals are unavailable
+VIEWPORT_KEY = "oasis-viewport-map"
+
+# Icon Logic
+ICONS = {
+    "Parc & Jardin": "tree",
+    "Lieu Culturel": "book",
+    "Lieu de Culte": "university", # FontAwesome name check needed, using 'university' acts as landmark
+    "Passage Ombragé": "road",
+    "Point d'Eau": "tint"
+}
+
+def comfort_color(comfort):
+    return "green" if comfort >= 8 else "orange" if comfort >= 5 else "red"
+
+# Compiled once; a card is only rendered when its marker is clicked
+POPUP_TEMPLATE = jinja2.Environment(autoescape=True).from_string("""
+    <div style="font-family:'Inter',sans-serif; width:280px; padding:4px;">
+        <h4 style="margin:0 0 4px 0;background:linear-gradient(135deg,#38bdf8,#818cf8);-webkit-background-clip:text;-webkit-text-fill-color:transparent;font-weight:700;font-size:1.1em;">{{ spot.name }}</h4>
+        <p style="font-size:0.85em;color:#64748b;margin:0 0 10px 0;">{{ spot.type }}</p>
+        <hr style="margin:8px 0;border:none;border-top:1px solid #e2e8f0;">
+        <div style="display:flex;justify-content:space-between;margin-bottom:8px;align-items:center;">
+            <span style="font-weight:600;color:#1e293b;">Score Confort</span>
+            <span style="background:linear-gradient(135deg,#38bdf8,#818cf8);color:white;padding:4px 10px;border-radius:8px;font-weight:700;">{{ spot.comfort_score }}/10</span>
+        </div>
+        <div style="display:flex;justify-content:space-between;margin-bottom:8px;">
+            <span style="color:#64748b;">🌡️ Température locale</span>
+            <span style="font-weight:600;color:#0ea5e9;">{{ spot.local_temp }}°C</span>
+        </div>
+        <div style="display:flex;justify-content:space-between;margin-bottom:10px;">
+            <span style="color:#64748b;">👥 Affluence</span>
+            <span style="font-weight:500;color:#1e293b;">{{ spot.crowd_level }}</span>
+        </div>
+        <div style="margin-bottom:10px;display:flex;flex-wrap:wrap;gap:4px;">
+            {%- for a in spot.amenities -%}
+            <span style='background:linear-gradient(135deg, #3b82f6, #8b5cf6);color:white;padding:3px 8px;border-radius:6px;font-size:0.75em;margin-right:4px;font-weight:500;'>{{ a }}</span>
+            {%- endfor -%}
+        </div>
+        <div style="background:#f0fdf4;padding:8px 12px;border-radius:8px;border-left:3px solid #22c55e;">
+            <span style="font-size:0.85em;color:#166534;">❄️ <b>{{ spot.temp_diff }}°C</b> vs extérieur</span>
+        </div>
+    </div>
+    """)
+
+def popup_html(spot):
+    return POPUP_TEMPLATE.render(spot=spot)
+
+POPUP_CACHE = LRUCache("fiches", maxsize=POPUP_CACHE_SIZE)
+
+def cached_popup_html(spot, version):
+    """Card for `spot`, rendered once per (spot id, snapshot version)."""
+    return POPUP_CACHE.get_or_create((spot.get("id", spot["name"]), version), lambda: popup_html(spot))
+
+def clicked_latlng(value, seen_key):
+    """
+    Position of the marker clicked since the last rerun, if any. The click
+    counter is remembered per map so the card opens once, not on every pan.
+    """
+    value = value or {}
+    count = value.get("last_object_clicked_count") or 0
+    clicked = value.get("last_object_clicked")
+    if not clicked or st.session_state.get(seen_key) == count:
+        return None
+    st.session_state[seen_key] = count
+    return clicked["lat"], clicked["lng"]
+
+def popup_layer(spot, version):
+    """Opened card for the clicked `spot`, as a feature group over the map."""
+    fg = folium.FeatureGroup(name="Fiche")
+    folium.CircleMarker(
+        location=[spot["lat"], spot["lon"]], radius=1, opacity=0, fill_opacity=0,
+        popup=folium.Popup(cached_popup_html(spot, version), max_width=260, show=True)
+    ).add_to(fg)
+    return fg
+
+def comfort_css(comfort):
+    return "#22c55e" if comfort >= 8 else "#f59e0b" if comfort >= 5 else "#ef4444"
+
+def spot_marker(spot):
+    # No popup: the card is rendered server-side when the marker is clicked
+    return folium.Marker(
+        location=[spot["lat"], spot["lon"]],
+        tooltip=f"{spot['name']} ({spot['comfort_score']}/10)",
+        icon=folium.Icon(color=comfort_color(spot.get("comfort_score", 5)), icon=ICONS.get(spot["type"], "info-sign"), prefix="fa")
+    )
+
+def cluster_marker(lat, lon, count, comfort):
+    size = int(28 + 8 * min(len(str(count)), 5))
+    return folium.Marker(
+        location=[lat, lon],
+        tooltip=f"{count} lieux (confort moyen {comfort:.1f}/10)",
+        icon=folium.DivIcon(
+            html=f"<div style=\"width:{size}px;height:{size}px;line-height:{size}px;border-radius:50%;text-align:center;"
+                 f"background:{comfort_css(comfort)};color:white;font-weight:700;font-family:'Inter',sans-serif;"
+                 f"border:3px solid rgba(255,255,255,0.7);box-shadow:0 2px 8px rgba(0,0,0,0.3);\">{count}</div>",
+            icon_size=(size, size),
+            icon_anchor=(size // 2, size // 2)
+        )
+    )
+
+def heat_overlay(spots, heat_field, zoom, rows=slice(None)):
+    """Precomputed raster of `heat_field` (see raster.py) over `rows` of `spots`, as an image overlay."""
+    columns = spot_columns(spots)
+    url, bounds, _ = raster.overlay(
+        columns["lat"][rows], columns["lon"][rows], columns[heat_field][rows], heat_field, zoom
+    )
+    return ImageOverlay(url, bounds=bounds, pixelated=False, name=raster.FIELDS[heat_field][0])
+
+@timed("map_build")
+def build_map(spots, heat_field=None, user_location=None):
+    m = folium.Map(location=list(CITY_CENTER), zoom_start=MAP_START_ZOOM, tiles="OpenStreetMap")
+
+    # Heat Layer
+    if heat_field:
+        heat_overlay(spots, heat_field, MAP_START_ZOOM).add_to(m)
+
+    # Marker Cluster
+    marker_cluster = MarkerCluster().add_to(m)
+
+    for spot in spots:
+        spot_marker(spot).add_to(marker_cluster)
+
+    add_user_marker(m, user_location)
+    return m
+
+def add_user_marker(m, user_location):
+    if user_location is not None:
+        folium.Marker(
+            location=list(user_location),
+            tooltip="Vous êtes ici",
+            icon=folium.Icon(color="blue", icon="user", prefix="fa")
+        ).add_to(m)
+
+def build_layer(spots, pyramid, zoom, idx):
+    """
+    Marker layer for the visible rows `idx`: the spots themselves once zoomed
+    in (or when few enough are visible), otherwise the pyramid's clusters,
+    isolated spots being drawn as themselves. Returns (FeatureGroup, markers drawn).
+    """
+    fg = folium.FeatureGroup(name="Lieux visibles")
+    if zoom >= clusters.DETAIL_ZOOM or len(idx) <= clusters.MAX_MARKERS:
+        visible = [spots[i] for i in idx.tolist()]
+        for spot in visible:
+            spot_marker(spot).add_to(fg)
+        return fg, len(visible)
+
+    lats, lons, counts, comfort, first = pyramid.aggregate(zoom, idx, spot_columns(spots)["comfort_score"])
+    for lat, lon, count, mean, row in zip(lats.tolist(), lons.tolist(), counts.tolist(), comfort.tolist(), first.tolist()):
+        marker = spot_marker(spots[row]) if count == 1 else cluster_marker(lat, lon, count, mean)
+        marker.add_to(fg)
+    return fg, len(counts)
+
+def _walk(element):
+    if isinstance(element, folium.elements.JSCSSMixin):
+        yield element
+    for child in getattr(element, "_children", {}).values():
+        yield from _walk(child)
+
+@timed("map_render")
+def render_payload(m):
+    """
+    Everything st_folium computes from a map before handing it to the
+    frontend component, as plain strings that can be cached and replayed.
+    """
+    m.get_root().render()
+    m.render()
+    html = _get_html(m)
+    header = _get_header(m)
+    script = _get_map_string(m)
+    css_links, js_links = [], []
+    for element in _walk(m):
+        css_links.extend(href for _, href in getattr(element, "default_css", []))
+        js_links.extend(src for _, src in getattr(element, "default_js", []))
+    return {
+        "script": script,
+        "header": header,
+        "html": html,
+        "id": get_full_id(m),
+        "key": generate_js_hash(script, None, False),
+        "css_links": list(dict.fromkeys(css_links)),
+        "js_links": list(dict.fromkeys(js_links))
+    }
+
+def _payload_size(payload):
+    return len(payload["script"]) + len(payload["header"]) + len(payload["html"])
+
+MAP_CACHE = LRUCache("cartes", maxsize=MAP_CACHE_SIZE, max_weight=MAP_CACHE_MAX_BYTES, weigher=_payload_size)
+
+def _spot_at(spots, latlng):
+    if latlng is None:
+        return None
+    return next((s for s in spots if s["lat"] == latlng[0] and s["lon"] == latlng[1]), None)
+
+def show_map(cache_key, spots, heat_field=None, user_location=None, version=None, height=MAP_HEIGHT):
+    """
+    Display the map for `spots`. The rendered payload is memoized on
+    `cache_key` (snapshot version + view state) and shared by every session;
+    the card of a clicked marker is added on top as a feature group.
+    """
+    if _component_func is None:
+        spot = _spot_at(spots, clicked_latlng(st.session_state.get(MAP_KEY), MAP_KEY + "-clic"))
+        m = build_map(spots, heat_field, user_location)
+        with timed("st_folium"):
+            return st_folium(
+                m, width=None, height=height, key=MAP_KEY,
+                feature_group_to_add=popup_layer(spot, version) if spot else None,
+                returned_objects=["last_object_clicked", "last_object_clicked_count"]
+            )
+
+    payload = MAP_CACHE.get_or_create(
+        cache_key, lambda: render_payload(build_map(spots, heat_field, user_location))
+    )
+    spot = _spot_at(spots, clicked_latlng(st.session_state.get(payload["key"]), payload["key"] + "-clic"))
+    with timed("st_folium"):
+        return _component_func(
+            script=payload["script"],
+            header=payload["header"],
+            html=payload["html"],
+            id=payload["id"],
+            key=payload["key"],
+            height=height,
+            width=None,
+            returned_objects=["last_object_clicked", "last_object_clicked_count"],
+            default={"last_object_clicked": None, "last_object_clicked_count": 0},
+            zoom=None,
+            center=None,
+            feature_group=_get_feature_group_string(popup_layer(spot, version), folium.Map(), 0) if spot else None,
+            return_on_hover=False,
+            layer_control=None,
+            pixelated=False,
+            css_links=payload["css_links"],
+            js_links=payload["js_links"],
+            wrap_longitude=False
+        )
+
+def _layer_size(layer):
+    return len(layer["script"])
+
+LAYER_CACHE = LRUCache("couches", maxsize=LAYER_CACHE_SIZE, max_weight=LAYER_CACHE_MAX_BYTES, weigher=_layer_size)
+
+def _viewport(value):
+    """(bounds, zoom) reported by the map frontend, or the initial city view."""
+    bounds, zoom = (value or {}).get("bounds"), (value or {}).get("zoom")
+    if not bounds or zoom is None:
+        return clusters.default_viewport(CITY_CENTER, MAP_START_ZOOM), MAP_START_ZOOM
+    south_west, north_east = bounds["_southWest"], bounds["_northEast"]
+    return (south_west["lat"], south_west["lng"], north_east["lat"], north_east["lng"]), zoom
+
+@timed("map_layer")
+def render_layer(spots, pyramid, zoom, idx):
+    fg, markers = build_layer(spots, pyramid, zoom, idx)
+    return {
+        "script": _get_feature_group_string(fg, folium.Map(), 0),
+        "markers": markers,
+        "visible": len(idx)
+    }
+
+RASTER_CACHE = LRUCache("rasters", maxsize=RASTER_CACHE_SIZE, max_weight=RASTER_CACHE_MAX_BYTES, weigher=len)
+
+@timed("heat_overlay")
+def heat_group(spots, mask, heat_field, zoom):
+    fg = folium.FeatureGroup(name="Chaleur")
+    heat_overlay(spots, heat_field, zoom, np.flatnonzero(mask)).add_to(fg)
+    return fg
+
+def _nearest_spot(spots, mask, latlng):
+    if latlng is None:
+        return None
+    nearest = get_index(spots).nearest(latlng[0], latlng[1], 1, mask=mask)
+    # Marker clicks report the marker's own position; anything else is a cluster
+    return spots[nearest[0][0]] if nearest and nearest[0][1] < 1 else None
+
+def show_viewport_map(cache_key, spots, mask, heat_field=None, user_location=None, version=None, height=MAP_HEIGHT):
+    """
+    Display the map with only the spots of the current viewport.
+    The frontend reports its bounds and zoom; the viewport is snapped on the
+    tile grid and the matching marker layer (clusters or spots) is memoized
+    on (`cache_key`, tiles), the heat overlay on (`cache_key`, raster size).
+    The base map is rendered once and never reloaded.
+    Returns (visible spots, markers drawn).
+    """
+    pyramid = clusters.get_pyramid(spots)
+
+    def layer_for(value):
+        bounds, zoom = _viewport(value)
+        tiles, snapped = clusters.snap_viewport(bounds, zoom)
+        return LAYER_CACHE.get_or_create(
+            (cache_key, tiles),
+            lambda: render_layer(spots, pyramid, tiles[0], pyramid.visible(snapped, mask))
+        )
+
+    def heat_for(value):
+        zoom = _viewport(value)[1]
+        return RASTER_CACHE.get_or_create(
+            (cache_key, raster.grid_size(zoom)),
+            lambda: _get_feature_group_string(heat_group(spots, mask, heat_field, zoom), folium.Map(), 1)
+        )
+
+    returned = ["bounds", "zoom", "last_object_clicked", "last_object_clicked_count"]
+
+    if _component_func is None:
+        value = st.session_state.get(VIEWPORT_KEY)
+        bounds, zoom = _viewport(value)
+        tiles, snapped = clusters.snap_viewport(bounds, zoom)
+        idx = pyramid.visible(snapped, mask)
+        fg, markers = build_layer(spots, pyramid, tiles[0], idx)
+        layers = [fg]
+        if heat_field:
+            layers.append(heat_group(spots, mask, heat_field, zoom))
+        spot = _nearest_spot(spots, mask, clicked_latlng(value, VIEWPORT_KEY + "-clic"))
+        if spot:
+            layers.append(popup_layer(spot, version))
+        base = folium.Map(location=list(CITY_CENTER), zoom_start=MAP_START_ZOOM, tiles="OpenStreetMap")
+        add_user_marker(base, user_location)
+        with timed("st_folium"):
+            st_folium(base, feature_group_to_add=layers, returned_objects=returned, key=VIEWPORT_KEY, width=None, height=height)
+        return len(idx), markers
+
+    def render_base():
+        base = folium.Map(location=list(CITY_CENTER), zoom_start=MAP_START_ZOOM, tiles="OpenStreetMap")
+        add_user_marker(base, user_location)
+        return render_payload(base)
+
+    payload = MAP_CACHE.get_or_create(("viewport", user_location), render_base)
+    value = st.session_state.get(payload["key"])
+    layer = layer_for(value)
+    script = layer["script"]
+    if heat_field:
+        script += heat_for(value)
+    spot = _nearest_spot(spots, mask, clicked_latlng(value, payload["key"] + "-clic"))
+    if spot:
+        script += _get_feature_group_string(popup_layer(spot, version), folium.Map(), 2)
+    with timed("st_folium"):
+        _component_func(
+            script=payload["script"],
+            header=payload["header"],
+            html=payload["html"],
+            id=payload["id"],
+            key=payload["key"],
+            height=height,
+            width=None,
+            returned_objects=returned,
+            default={"bounds": None, "zoom": None, "last_object_clicked": None, "last_object_clicked_count": 0},
+            zoom=None,
+            center=None,
+            feature_group=script,
+            return_on_hover=False,
+            layer_control=None,
+            pixelated=False,
+            css_links=payload["css_links"],
+            js_links=payload["js_links"],
+            wrap_longitude=False
+        )
+    return layer["visible"], layer["markers"]
@@ -0,0 +1,251 @@
+import bisect
+import datetime
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from caching import CACHES
+
+# --- METRICS CONFIGURATION ---
+# Local Prometheus endpoint of the dashboard process (0 disables it; the API serves /metrics itself)
+METRICS_HOST = os.environ.get("METRICS_HOST") or "127.0.0.1"
+METRICS_PORT = int(os.environ.get("METRICS_PORT") or 9108)
+LOG_LEVEL = (os.environ.get("LOG_LEVEL") or "INFO").upper()
+
+# Histogram buckets (seconds): cache lookups and reruns up to slow upstream fetches
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Every metric registers here; collectors add samples computed at scrape time
+REGISTRY = {}
+COLLECTORS = {}
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """Metric family: one value (or histogram) per combination of label values."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self):
+        with self._lock:
+            return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in self._values.items()]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[slot] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+# --- METRICS ---
+STAGE_SECONDS = Histogram("oasis_stage_seconds", "Duration of a refresh, compute, write or render stage.", ["stage"])
+UPSTREAM_SECONDS = Histogram("oasis_upstream_seconds", "Guarded upstream call duration, retries and cache included.", ["upstream"])
+UPSTREAM_RESPONSES = Counter("oasis_upstream_responses_total", "Upstream HTTP responses by status (error: no response).", ["host", "status"])
+HTTP_CACHE_RESULTS = Counter("oasis_http_cache_total", "Upstream response cache lookups (fresh, stale, miss, not_modified).", ["result"])
+FALLBACKS = Counter("oasis_fallbacks_total", "Fallback activations (last_good, default, city_reading).", ["upstream", "fallback"])
+REFRESHES = Counter("oasis_refreshes_total", "Completed refresh cycles by result.", ["result"])
+API_REQUESTS = Counter("oasis_api_requests_total", "JSON API requests by route and status.", ["route", "status"])
+
+def register_collector(name, collect):
+    """
+    Add samples computed at scrape time: `collect()` returns
+    [(metric name, kind, help, [(labels dict, value)])]. Re-registering a
+    name replaces the previous collector.
+    """
+    COLLECTORS[name] = collect
+
+def cache_collector():
+    stats = {name: cache.stats() for name, cache in list(CACHES.items())}
+    return [
+        ("oasis_cache_hits_total", "counter", "LRU cache hits.", [({"cache": n}, s["hits"]) for n, s in stats.items()]),
+        ("oasis_cache_misses_total", "counter", "LRU cache misses.", [({"cache": n}, s["misses"]) for n, s in stats.items()]),
+        ("oasis_cache_evictions_total", "counter", "LRU cache evictions.", [({"cache": n}, s["evictions"]) for n, s in stats.items()]),
+        ("oasis_cache_entries", "gauge", "LRU cache entries.", [({"cache": n}, s["size"]) for n, s in stats.items()])
+    ]
+
+def snapshot_collector(load):
+    """Collector of the age and version of the snapshot returned by `load()`."""
+    def collect():
+        data = load()
+        if not data:
+            return []
+        metadata = data.get("metadata", {})
+        samples = [("oasis_snapshot_version", "gauge", "Version of the published snapshot.", [({}, metadata.get("snapshot_version", 0))])]
+        if metadata.get("timestamp"):
+            age = time.time() - datetime.datetime.fromisoformat(metadata["timestamp"]).timestamp()
+            samples.append(("oasis_snapshot_age_seconds", "gauge", "Seconds since the published snapshot was computed.", [({}, round(age, 3))]))
+        degraded = [
+            ({"source": name}, int(bool(block.get("stale")) or block.get("source", block.get("station")) == "Simulated Fallback"))
+            for name, block in ((name, data.get(name) or {}) for name in ("weather", "air_quality"))
+        ]
+        samples.append(("oasis_snapshot_degraded", "gauge", "1 when a source of the snapshot is a last known good reading or the simulated fallback.", degraded))
+        return samples
+    return collect
+
+register_collector("caches", cache_collector)
+
+def render():
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in list(REGISTRY.values()):
+        samples = metric.samples()
+        if samples:
+            lines += metric.header() + samples
+    for collect in list(COLLECTORS.values()):
+        try:
+            families = collect()
+        except Exception as e:
+            log_event("collector_error", logging.WARNING, error=repr(e))
+            continue
+        for name, kind, documentation, samples in families:
+            lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{_labels(labels, labels.values())} {_number(value)}" for labels, value in samples]
+    return "\n".join(lines) + "\n"
+
+# --- STRUCTURED LOGS ---
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, event and its fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "event": record.getMessage()
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+logger = logging.getLogger("oasis")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(JsonFormatter())
+    logger.addHandler(_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+def log_event(event, level=logging.INFO, **fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+@contextmanager
+def timed(stage, into=None, **fields):
+    """
+    Time a block (or, as a decorator, each call) into STAGE_SECONDS and a
+    debug "stage" log line. `into` (dict) also receives the duration.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        if into is not None:
+            into[stage] = round(seconds, 4)
+        log_event("stage", logging.DEBUG, stage=stage, seconds=round(seconds, 6), **fields)
+
+# --- LOCAL ENDPOINT ---
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes are not worth a log line each
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_http_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serve /metrics from a daemon thread (idempotent; port 0 disables it)."""
+    global _server
+    with _server_lock:
+        if _server is not None or not port:
+            return _server or None
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            # Another process (second dashboard worker) already serves this port
+            log_event("metrics_unavailable", logging.WARNING, host=host, port=port, error=repr(e))
+            _server = False
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="oasis-metrics", daemon=True).start()
+        log_event("metrics_listening", host=host, port=port)
+        return _server
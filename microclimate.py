@@ -0,0 +1,39 @@
+import numpy as np
+
+# --- MICROCLIMATE BATCHING ---
+GRID_DEG = 0.01    # Model grid step (~1 km, AROME/ICON-D2 scale): one request location per cell
+CHUNK_SIZE = 100   # Locations per multi-coordinate request (keeps URLs around 2 kB)
+
+def grid_cells(lats, lons, grid=GRID_DEG):
+    """
+    Snap spots to the model grid. Returns the distinct cell centres
+    (latitudes, longitudes, in a stable order) and, for every spot, the
+    index of its cell.
+    """
+    keys = np.column_stack([
+        np.round(np.asarray(lats, dtype=np.float64) / grid),
+        np.round(np.asarray(lons, dtype=np.float64) / grid)
+    ]).astype(np.int64)
+    cells, inverse = np.unique(keys, axis=0, return_inverse=True)
+    return cells[:, 0] * grid, cells[:, 1] * grid, inverse.reshape(-1)
+
+def chunk_urls(base_url, cell_lats, cell_lons, chunk_size=CHUNK_SIZE):
+    """[(first cell index, url)] of the multi-coordinate requests covering every cell."""
+    separator = "&" if "?" in base_url else "?"
+    chunks = []
+    for start in range(0, len(cell_lats), chunk_size):
+        lats = ",".join(f"{lat:.4f}" for lat in cell_lats[start:start + chunk_size].tolist())
+        lons = ",".join(f"{lon:.4f}" for lon in cell_lons[start:start + chunk_size].tolist())
+        chunks.append((start, f"{base_url}{separator}latitude={lats}&longitude={lons}"))
+    return chunks
+
+def parse_batch(data):
+    """
+    Current temperatures of a multi-coordinate response, in request order.
+    Open-Meteo answers with a list of locations (a single object for one).
+    """
+    locations = data if isinstance(data, list) else [data]
+    temperatures = [(location.get("current") or {}).get("temperature_2m") for location in locations]
+    if not temperatures or any(t is None for t in temperatures):
+        return None
+    return {"temperatures": temperatures}
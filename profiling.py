@@ -0,0 +1,109 @@
+import cProfile
+import collections
+import datetime
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import log_event
+
+# --- PROFILING CONFIGURATION ---
+# PROFILE=1 profiles every dashboard rerun and refresh; ?profile=1 does it for one dashboard session
+PROFILE = os.environ.get("PROFILE") == "1"
+PROFILE_DIR = os.environ.get("PROFILE_DIR") or os.path.join(".cache", "profiles")
+PROFILE_KEEP = 200   # Newest .pstats files kept on disk
+RECENT_SIZE = 20     # Profile summaries kept in memory for the dashboard panel
+TOP_N = 15           # Hot functions listed per profile
+
+# Summaries of the latest profiled runs, newest last (all sessions of the process)
+RECENT = collections.deque(maxlen=RECENT_SIZE)
+
+_local = threading.local()  # Profile of the run in progress on this thread
+
+def function_label(key):
+    filename, line, name = key
+    if filename == "~":  # Built-ins: "<built-in method ...>"
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+def hot_functions(stats, n=TOP_N):
+    """[(function, calls, own seconds, cumulative seconds)] by decreasing own time."""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:n]
+    return [(function_label(key), calls, own, cumulative) for key, (_, calls, own, cumulative, _) in rows]
+
+def _prune(directory, keep=PROFILE_KEEP):
+    files = sorted(f for f in os.listdir(directory) if f.endswith(".pstats"))
+    for name in files[:-keep]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+def start(name):
+    """
+    Start profiling the current thread's run `name`. A run left open on this
+    thread (script stopped by st.stop / st.rerun) is discarded first.
+    Returns False when another profiler is active (Python 3.12+ allows only one).
+    """
+    _discard()
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return False
+    _local.run = (name, profiler, time.perf_counter())
+    return True
+
+def _discard():
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run[1].disable()
+        _local.run = None
+
+def stop():
+    """
+    Stop the run started on this thread, save its profile (pstats format)
+    under PROFILE_DIR and add its summary to RECENT. Returns the summary,
+    or None when nothing was being profiled.
+    """
+    run = getattr(_local, "run", None)
+    if run is None:
+        return None
+    name, profiler, started = run
+    profiler.disable()
+    _local.run = None
+    seconds = time.perf_counter() - started
+
+    now = datetime.datetime.now()
+    summary = {"name": name, "time": now, "seconds": seconds, "path": None}
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{now:%Y%m%d-%H%M%S-%f}-{name}-{os.getpid()}.pstats")
+        profiler.dump_stats(path)
+        _prune(PROFILE_DIR)
+        summary["path"] = path
+    except OSError as e:
+        log_event("profile_error", logging.WARNING, name=name, error=repr(e))
+    summary["top"] = hot_functions(pstats.Stats(profiler))
+    RECENT.append(summary)
+    log_event("profile", name=name, seconds=round(seconds, 4), path=summary["path"])
+    return summary
+
+@contextmanager
+def profiled(name, enabled=None):
+    """
+    Profile a block (or, as a decorator, each call) when `enabled` (a bool or
+    a callable evaluated per run; default PROFILE) is true. Nested inside an
+    already profiled run, the block is part of that run's profile.
+    """
+    on = enabled() if callable(enabled) else (PROFILE if enabled is None else enabled)
+    if not on or getattr(_local, "run", None) is not None or not start(name):
+        yield
+        return
+    try:
+        yield
+    finally:
+        stop()
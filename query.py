@@ -0,0 +1,103 @@
+import threading
+
+import numpy as np
+
+import engine
+from caching import LRUCache, derived
+from columnar import spot_columns
+
+ENGINE_CACHE_SIZE = 8  # Spot sequences with a query engine kept
+CATEGORY_CODES = {name: code for code, name in enumerate(engine.CATEGORIES)}
+CROWD_CODES = {label: code for code, label in enumerate(engine.CROWD_LABELS)}
+
+class SpotQueryEngine:
+    """
+    Column store over a snapshot's cool_islands with secondary indices:
+    row lists per type and per crowd level, and sorted orders on
+    comfort_score and local_temp. A query starts from the most selective
+    indexed predicate and checks the others on that candidate set only.
+    Amenities are a bitmask (see engine.AMENITIES), so "has water AND AC"
+    is a single vectorized AND.
+    """
+
+    def __init__(self, spots):
+        columns = spot_columns(spots)
+        self.size = len(spots)
+        self.codes = columns["type"]
+        self.amenities = columns["amenities"]
+        self.crowd = columns["crowd_level"]
+        self.comfort = columns["comfort_score"]
+        self.local_temp = columns["local_temp"]
+
+        self.by_type = [np.flatnonzero(self.codes == code) for code in range(len(engine.CATEGORIES))]
+        self.by_crowd = [np.flatnonzero(self.crowd == code) for code in range(len(engine.CROWD_LABELS))]
+        self.comfort_order = np.argsort(self.comfort, kind="stable")
+        self.comfort_sorted = self.comfort[self.comfort_order]
+        self.temp_order = np.argsort(self.local_temp, kind="stable")
+        self.temp_sorted = self.local_temp[self.temp_order]
+
+    def __len__(self):
+        return self.size
+
+    def categories(self):
+        """Category names present in the snapshot."""
+        return [engine.CATEGORIES[code] for code, rows in enumerate(self.by_type) if len(rows)]
+
+    def _candidates(self, type_codes, crowd_codes, min_comfort, max_local_temp):
+        # (size, rows thunk) of each indexed predicate; sizes are O(1)/O(log n)
+        options = []
+        if type_codes is not None:
+            options.append((sum(len(self.by_type[c]) for c in type_codes),
+                            lambda: np.concatenate([self.by_type[c] for c in type_codes] or [np.empty(0, np.int64)])))
+        if crowd_codes is not None:
+            options.append((sum(len(self.by_crowd[c]) for c in crowd_codes),
+                            lambda: np.concatenate([self.by_crowd[c] for c in crowd_codes] or [np.empty(0, np.int64)])))
+        if min_comfort is not None:
+            start = np.searchsorted(self.comfort_sorted, min_comfort, side="left")
+            options.append((self.size - start, lambda: self.comfort_order[start:]))
+        if max_local_temp is not None:
+            stop = np.searchsorted(self.temp_sorted, max_local_temp, side="right")
+            options.append((stop, lambda: self.temp_order[:stop]))
+        if not options:
+            return np.arange(self.size)
+        return min(options, key=lambda option: option[0])[1]()
+
+    def select(self, types=None, amenities=(), crowds=None, min_comfort=None, max_local_temp=None):
+        """
+        Row indices (ascending) of the spots matching every given criterion:
+        type in `types`, all `amenities` present, crowd level in `crowds`,
+        comfort_score >= `min_comfort`, local_temp <= `max_local_temp`.
+        None (or an empty amenity list) means no constraint.
+        """
+        type_codes = None if types is None else sorted({CATEGORY_CODES[t] for t in types if t in CATEGORY_CODES})
+        crowd_codes = None if crowds is None else sorted({CROWD_CODES[c] for c in crowds if c in CROWD_CODES})
+        required = np.uint8(engine.amenity_mask(amenities))
+
+        rows = self._candidates(type_codes, crowd_codes, min_comfort, max_local_temp)
+        keep = np.ones(len(rows), dtype=bool)
+        if type_codes is not None:
+            keep &= np.isin(self.codes[rows], type_codes)
+        if crowd_codes is not None:
+            keep &= np.isin(self.crowd[rows], crowd_codes)
+        if required:
+            keep &= (self.amenities[rows] & required) == required
+        if min_comfort is not None:
+            keep &= self.comfort[rows] >= min_comfort
+        if max_local_temp is not None:
+            keep &= self.local_temp[rows] <= max_local_temp
+        return np.sort(rows[keep])
+
+    def mask(self, rows):
+        """Boolean row mask from `select` results (for the spatial index and map)."""
+        mask = np.zeros(self.size, dtype=bool)
+        mask[rows] = True
+        return mask
+
+# Current snapshot, its predecessor and the forecast hours sessions are looking at
+_engine_cache = LRUCache("moteurs de requête", maxsize=ENGINE_CACHE_SIZE)
+_engine_lock = threading.Lock()
+
+def get_query_engine(spots):
+    """SpotQueryEngine for a cool_islands sequence (snapshot or forecast hour), built once per sequence."""
+    with _engine_lock:
+        return derived(_engine_cache, spots, lambda: SpotQueryEngine(spots))
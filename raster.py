@@ -0,0 +1,96 @@
+import math
+
+import numpy as np
+from folium.utilities import image_to_url
+
+from clusters import world_xy, _tile_to_lat, _tile_to_lon, TILE_SIZE
+
+# --- RASTER CONFIGURATION ---
+AREA = (45.70, 2.98, 45.86, 3.20)  # (south, west, north, east) covered by the overlay
+KERNEL_M = 250                     # Gaussian kernel radius (sigma), fixed in metres
+MAX_ALPHA = 0.65                   # Overlay opacity where spots are dense
+MIN_SIZE, MAX_SIZE = 128, 512      # Raster width in pixels, by zoom level
+
+# Heat fields: label, legend colour stops (low -> high), fixed range or None for the data range
+FIELDS = {
+    "comfort_score": ("Confort", [(0.0, (0, 255, 0)), (0.5, (255, 255, 0)), (1.0, (255, 0, 0))], (1.0, 10.0)),
+    "local_temp": ("Température", [(0.0, (59, 130, 246)), (0.5, (250, 204, 21)), (1.0, (239, 68, 68))], None)
+}
+
+def grid_size(zoom):
+    """Raster width for `zoom`: about one pixel per screen pixel, within bounds."""
+    return int(min(max(2 ** (int(zoom) - 6), MIN_SIZE), MAX_SIZE))
+
+def _mercator_grid(size, area=AREA):
+    """Cell centres of a `size`-wide grid, rows evenly spaced in Web Mercator."""
+    south, west, north, east = area
+    (x0, x1), (y1, y0) = world_xy([south, north], [west, east])
+    height = max(1, int(round(size * (y1 - y0) / (x1 - x0))))
+    ys = y0 + (np.arange(height) + 0.5) * (y1 - y0) / height
+    xs = x0 + (np.arange(size) + 0.5) * (x1 - x0) / size
+    lats = np.array([_tile_to_lat(y / TILE_SIZE, 0) for y in ys.tolist()])
+    lons = np.array([_tile_to_lon(x / TILE_SIZE, 0) for x in xs.tolist()])
+    return lats, lons
+
+def _gaussian_matrix(centres_m, sigma_m):
+    d = (centres_m[:, None] - centres_m[None, :]) / sigma_m
+    return np.exp(-0.5 * d * d)
+
+def smooth_field(lats, lons, values, size, area=AREA, sigma_m=KERNEL_M):
+    """
+    Kernel-weighted mean of `values` and kernel density on the overlay grid
+    (rows north to south). Spots are binned on the grid, then blurred with a
+    separable Gaussian (two matrix products), so the cost depends on the
+    grid, not on the number of spots.
+    """
+    grid_lats, grid_lons = _mercator_grid(size, area)
+    height, width = len(grid_lats), len(grid_lons)
+    lats, lons = np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    south, west, north, east = area
+    inside = (lats >= south) & (lats <= north) & (lons >= west) & (lons <= east)
+    lats, lons, values = lats[inside], lons[inside], values[inside]
+
+    # Nearest grid cell of every spot (rows are descending latitudes)
+    rows = np.clip(np.searchsorted(-grid_lats, -lats), 0, height - 1)
+    cols = np.clip(np.searchsorted(grid_lons, lons), 0, width - 1)
+    cells = rows * width + cols
+    counts = np.bincount(cells, minlength=height * width).reshape(height, width).astype(np.float64)
+    sums = np.bincount(cells, weights=values, minlength=height * width).reshape(height, width)
+
+    metres_per_deg = math.pi / 180 * 6371008.8
+    ky = _gaussian_matrix(grid_lats * metres_per_deg, sigma_m)
+    kx = _gaussian_matrix(grid_lons * metres_per_deg * math.cos(math.radians((south + north) / 2)), sigma_m)
+    density = ky @ counts @ kx.T
+    weighted = ky @ sums @ kx.T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(density > 1e-6, weighted / density, np.nan)
+    return mean, density
+
+def colorize(mean, density, stops, vmin, vmax):
+    """RGBA image: colour from the mean along `stops`, opacity from the density."""
+    t = np.clip((np.nan_to_num(mean, nan=vmin) - vmin) / ((vmax - vmin) or 1.0), 0.0, 1.0)
+    positions = [p for p, _ in stops]
+    rgba = np.empty(mean.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        rgba[..., channel] = np.interp(t, positions, [c[channel] for _, c in stops]).round()
+    rgba[..., 3] = (np.clip(density, 0.0, 1.0) * MAX_ALPHA * 255).round()
+    return rgba
+
+def value_range(values):
+    """Colour scale of a field without a fixed range: the spots' own min and max."""
+    values = np.asarray(values, dtype=np.float64)
+    return (float(values.min()), float(values.max())) if values.size else (0.0, 1.0)
+
+def overlay(lats, lons, values, field, zoom):
+    """
+    Heat overlay of `field` for a zoom level, as (PNG data URL, bounds,
+    value range): the browser only stretches an image, whatever the spot count.
+    """
+    _, stops, fixed = FIELDS[field]
+    values = np.asarray(values, dtype=np.float64)
+    mean, density = smooth_field(lats, lons, values, grid_size(zoom))
+    vmin, vmax = fixed or value_range(values)
+    url = image_to_url(colorize(mean, density, stops, vmin, vmax), origin="upper")
+    south, west, north, east = AREA
+    return url, [[south, west], [north, east]], (vmin, vmax)
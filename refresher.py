@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import aiohttp
+
+import fetch_data
+from metrics import REFRESHES, log_event
+from snapshot import load_snapshot
+
+# --- CONNECTION POOL CONFIGURATION ---
+POOL_LIMIT = 20            # Max simultaneous connections for the shared session
+DNS_CACHE_TTL = 300        # Seconds a resolved upstream host stays cached
+KEEPALIVE_TIMEOUT = 60     # Seconds an idle upstream connection is kept open
+
+# --- SCHEDULER CONFIGURATION ---
+# Background refresh period (0 disables the scheduler)
+REFRESH_INTERVAL = float(os.environ.get("REFRESH_INTERVAL") or 900)
+# Snapshots younger than this are served as-is instead of refetched
+REFRESH_MIN_AGE = float(os.environ.get("REFRESH_MIN_AGE") or 60)
+
+class Refresher:
+    """
+    In-process refresh service.
+    Owns a long-lived event loop (daemon thread) and a pooled aiohttp
+    ClientSession, so each refresh reuses open connections instead of
+    spawning a new interpreter running fetch_data.py.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._session = None
+        self._inflight = None       # Task shared by concurrent refresh callers
+        self._scheduler = None      # Periodic refresh task
+        self._last_data = None
+        self._last_refresh = None   # time.time() of the last completed refresh
+        self._thread = threading.Thread(target=self._run_loop, name="oasis-refresher", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    async def _get_session(self):
+        # Created lazily, inside the loop that will use it
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=POOL_LIMIT,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def _fetch(self):
+        session = await self._get_session()
+        try:
+            data = await fetch_data.main(session)
+        except Exception:
+            REFRESHES.inc(result="error")
+            raise
+        REFRESHES.inc(result="ok")
+        self._last_data = data
+        self._last_refresh = time.time()
+        return data
+
+    def _fresh_snapshot(self, min_age):
+        """Return the current snapshot if younger than `min_age`, else None."""
+        if min_age <= 0:
+            return None
+        if self._last_refresh is None:
+            # Nothing fetched by this process yet: fall back on the file
+            # written by a previous run (CLI, another worker)
+            try:
+                mtime = os.path.getmtime(fetch_data.OUTPUT_FILE)
+                if time.time() - mtime >= min_age:
+                    return None
+                self._last_data = load_snapshot(fetch_data.OUTPUT_FILE)
+                self._last_refresh = mtime
+            except (OSError, ValueError):
+                return None
+        if time.time() - self._last_refresh < min_age:
+            return self._last_data
+        return None
+
+    async def _refresh(self, min_age):
+        fresh = self._fresh_snapshot(min_age)
+        if fresh is not None:
+            return fresh
+        # Single-flight: every caller arriving during a fetch awaits the same task
+        if self._inflight is None or self._inflight.done():
+            self._inflight = self._loop.create_task(self._fetch())
+        return await asyncio.shield(self._inflight)
+
+    def submit(self, coro):
+        """Schedule a coroutine on the refresher loop (thread-safe)."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def refresh(self, timeout=None, min_age=REFRESH_MIN_AGE):
+        """
+        Return an up-to-date snapshot, running at most one
+        fetch/compute/write cycle however many callers ask at once.
+        """
+        return self.submit(self._refresh(min_age)).result(timeout)
+
+    async def _run_schedule(self, interval):
+        while True:
+            try:
+                # Half an interval of slack so a manual refresh just before
+                # the tick is not immediately repeated
+                await self._refresh(interval / 2)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_event("scheduled_refresh_error", logging.ERROR, error=repr(e))
+            await asyncio.sleep(interval)
+
+    def _start_schedule(self, interval):
+        if self._scheduler is None or self._scheduler.done():
+            self._scheduler = self._loop.create_task(self._run_schedule(interval))
+
+    def start_scheduler(self, interval=REFRESH_INTERVAL):
+        """Keep the snapshot refreshed every `interval` seconds (idempotent)."""
+        if interval > 0:
+            self._loop.call_soon_threadsafe(self._start_schedule, interval)
+
+    def _stop_schedule(self):
+        if self._scheduler is not None:
+            self._scheduler.cancel()
+            self._scheduler = None
+
+    def stop_scheduler(self):
+        self._loop.call_soon_threadsafe(self._stop_schedule)
+
+    async def _close_session(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def close(self):
+        """Close the shared session and stop the loop."""
+        if self._loop.is_closed():
+            return
+        self.stop_scheduler()
+        self.submit(self._close_session()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+def get_refresher():
+    """Process-wide Refresher, shared by every dashboard session."""
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            _refresher = Refresher()
+        return _refresher
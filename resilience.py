@@ -0,0 +1,111 @@
+import asyncio
+import random
+import time
+
+import aiohttp
+
+# Errors worth retrying: transport failures, timeouts, malformed bodies
+RETRYABLE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ValueError)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker.
+    closed: calls go through; `failure_threshold` consecutive failures open it.
+    open: calls are refused until `cooldown` seconds have passed.
+    half-open: one trial call; success closes, failure re-opens.
+    """
+
+    def __init__(self, failure_threshold=3, cooldown=60.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def release(self):
+        """End a call without a verdict (cancelled): frees the half-open trial slot."""
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+class UpstreamGuard:
+    """
+    Latency budget for one upstream agent: bounded retries with jittered
+    exponential backoff, all inside a hard `deadline`, behind a CircuitBreaker.
+    """
+
+    def __init__(self, name, deadline=5.0, attempt_timeout=2.0, attempts=3,
+                 backoff=0.2, max_backoff=1.5, failure_threshold=3, cooldown=60.0):
+        self.name = name
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+
+    async def _attempt_loop(self, call):
+        last_error = None
+        for attempt in range(self.attempts):
+            try:
+                result = await asyncio.wait_for(call(), self.attempt_timeout)
+                if result is not None:
+                    return result
+                last_error = ValueError(f"{self.name}: unexpected response")
+            except RETRYABLE_ERRORS as e:
+                last_error = e
+            if attempt < self.attempts - 1:
+                # Full jitter: spread retries of concurrent refreshes apart
+                cap = min(self.max_backoff, self.backoff * 2 ** attempt)
+                await asyncio.sleep(random.uniform(0, cap))
+        raise last_error
+
+    async def call(self, call):
+        """
+        Run `call()` (a coroutine factory) under the guard.
+        A None result counts as a failure. Raises CircuitOpenError while the
+        breaker is open, otherwise the last error once the budget is spent.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name}: circuit open")
+        try:
+            result = await asyncio.wait_for(self._attempt_loop(call), self.deadline)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled (e.g. a shielded refresh torn down): says nothing about the
+            # upstream, but a half-open trial left running would keep the circuit open
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+        return result
@@ -0,0 +1,197 @@
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+from types import MappingProxyType
+
+import columnar
+
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process lock, rename stays atomic
+    fcntl = None
+
+# Snapshots whose name ends with this are binary columnar files (see columnar.py)
+BINARY_SUFFIX = ".bin"
+
+# Process-wide caches: path -> (file key, frozen snapshot / SnapshotTable)
+_cache = {}
+_table_cache = {}
+_cache_lock = threading.RLock()  # load_snapshot -> load_table for binary files
+
+def is_binary(path):
+    return path.endswith(BINARY_SUFFIX)
+
+def freeze(obj):
+    """
+    Recursively convert a parsed JSON document into a read-only structure
+    (dicts -> MappingProxyType, lists -> tuples) safe to share between sessions.
+    """
+    if isinstance(obj, dict):
+        return MappingProxyType({k: freeze(v) for k, v in obj.items()})
+    if isinstance(obj, list):
+        return tuple(freeze(v) for v in obj)
+    return obj
+
+def file_key(path):
+    # A rewrite changes at least one of these (inode on rename, mtime on write)
+    st = os.stat(path)
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def _cached(cache, path, load):
+    try:
+        key = file_key(path)
+    except FileNotFoundError:
+        return None
+
+    cached = cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with _cache_lock:
+        # Another thread may have parsed it while we waited
+        cached = cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        value = load(path)
+        cache[path] = (key, value)
+        return value
+
+def with_spot_table(frozen, spots=None):
+    """
+    Frozen snapshot whose cool_islands is a columnar.SpotTable: `spots` (the
+    mapped columns of a binary file) or the snapshot's own records.
+    """
+    if spots is None:
+        if columnar.TABLE not in frozen:
+            return frozen
+        spots = columnar.SpotTable.from_records(frozen[columnar.TABLE])
+    return MappingProxyType({**frozen, columnar.TABLE: spots})
+
+def _parse(path):
+    if is_binary(path):
+        # Columns stay memory-mapped; records are only built for the rows read
+        table = load_table(path)
+        return with_spot_table(freeze(table.document), table.spots())
+    with open(path, "r", encoding="utf-8") as f:
+        return with_spot_table(freeze(json.load(f)))
+
+def load_snapshot(path):
+    """
+    Return the parsed snapshot at `path` (JSON or binary), shared read-only
+    by every caller. The file is re-parsed only when its inode/mtime/size
+    changed. Returns None if the file does not exist.
+    """
+    return _cached(_cache, path, _parse)
+
+def load_table(path):
+    """
+    Memory-mapped columns of the binary snapshot at `path`, remapped only
+    when the file changes. Returns None if the file does not exist.
+    """
+    return _cached(_table_cache, path, columnar.SnapshotTable)
+
+def snapshot_version(data):
+    """Monotonic version stamped by write_snapshot (0 for legacy files)."""
+    if not data:
+        return 0
+    return data.get("metadata", {}).get("snapshot_version", 0)
+
+def content_hash(data):
+    """SHA-256 of everything but the metadata block, independent of key order."""
+    content = {k: v for k, v in data.items() if k != "metadata"}
+    payload = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return "sha256:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+JSON_HEAD_SIZE = 64 * 1024  # write_snapshot puts metadata first: the version is in the head of the file
+_VERSION_PATTERN = re.compile(rb'"snapshot_version":\s*(\d+)')
+
+def _previous_version(path):
+    """Version of the snapshot at `path`, read from its header: never a full parse."""
+    try:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == file_key(path):
+            return snapshot_version(cached[1])
+        if is_binary(path):
+            return columnar.read_header(path)["document"].get("metadata", {}).get("snapshot_version", 0)
+        with open(path, "rb") as f:
+            match = _VERSION_PATTERN.search(f.read(JSON_HEAD_SIZE))
+        # No version in the head: legacy file (numbering starts over)
+        return int(match.group(1)) if match else 0
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError):
+        # Unreadable previous file: restart numbering rather than fail the write
+        return 0
+
+def _fsync_dir(directory):
+    if os.name != "posix":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def atomic_write_json(path, data, indent=None):
+    """Write JSON via temp file + fsync + rename: readers never see a partial file."""
+    def dump(f):
+        text = io.TextIOWrapper(f, encoding="utf-8")
+        json.dump(data, text, indent=indent, ensure_ascii=False)
+        text.flush()
+        text.detach()
+    atomic_write(path, dump)
+
+def atomic_write(path, write):
+    """Call `write(f)` on a binary temp file, then fsync + rename it to `path`."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)  # mkstemp creates 0600; readers may run as another user
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _fsync_dir(directory)
+
+def write_snapshot(data, path, exports=()):
+    """
+    Publish `data` atomically: temp file in the same directory, fsync, rename.
+    Readers see either the previous snapshot or the new one, never a partial file.
+    The format follows the file name (binary for BINARY_SUFFIX, JSON otherwise);
+    each path in `exports` gets a copy of the same version.
+    Stamps metadata.snapshot_version (previous + 1) and metadata.content_hash.
+    Returns the version written.
+    """
+    lock_fd = os.open(path + ".lock", os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        # Serialize writers so two processes never publish the same version
+        if fcntl is not None:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+
+        metadata = data.setdefault("metadata", {})
+        metadata["snapshot_version"] = max(_previous_version(p) for p in (path, *exports)) + 1
+        metadata["content_hash"] = content_hash(data)
+
+        for target in (path, *exports):
+            if is_binary(target):
+                atomic_write(target, lambda f: columnar.write_columnar(f, data))
+            else:
+                # Metadata first, so that the next write finds the version in the head of the file
+                atomic_write_json(target, {"metadata": metadata, **data}, indent=4)
+
+        # Prime the reader cache: this process never needs to re-parse its own write
+        # (a binary file is just mapped, cheaper than freezing the records)
+        with _cache_lock:
+            _cache[path] = (file_key(path), _parse(path) if is_binary(path) else with_spot_table(freeze(data)))
+        return metadata["snapshot_version"]
+    finally:
+        os.close(lock_fd)
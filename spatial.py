@@ -0,0 +1,205 @@
+import math
+import threading
+
+import numpy as np
+# geopy's geodesic backend, called directly to skip its per-call object overhead
+from geographiclib.geodesic import Geodesic
+
+from caching import LRUCache, derived
+from columnar import spot_columns
+
+EARTH_RADIUS_M = 6371008.8
+CELL_SIZE_M = 250  # Grid bucket edge; a city-scale query touches a handful of cells
+PLANAR_SLACK = 0.02     # Projection error tolerated when deciding the ring walk is done
+ELLIPSOID_SLACK = 0.01  # Sphere vs WGS84: candidates this close to the k-th are re-ranked geodesically
+NEAR_TIES = 64          # ...at most this many beyond k
+RADIUS_SLACK = 0.01     # Planar distances this close to a radius are checked geodesically
+INDEX_CACHE_SIZE = 2    # Current and previous snapshot (sessions still on it)
+
+class SpotIndex:
+    """
+    Grid bucket index over spot coordinates.
+    Points are projected once (equirectangular around the mean latitude,
+    accurate to well under 0.1% at city scale) and sorted by cell, so a query
+    only looks at the cells around it. Final distances are geodesic (WGS84).
+    """
+
+    def __init__(self, lats, lons, cell_size=CELL_SIZE_M):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.cell_size = cell_size
+        self._lat0 = math.radians(float(self.lats.mean())) if len(self.lats) else 0.0
+        self.x, self.y = self._project(self.lats, self.lons)
+
+        cx = np.floor(self.x / cell_size).astype(np.int64)
+        cy = np.floor(self.y / cell_size).astype(np.int64)
+        self.order = np.lexsort((cy, cx))
+        self._cells = {}
+        if len(self.order):
+            keys = np.stack([cx[self.order], cy[self.order]], axis=1)
+            starts = np.flatnonzero(np.any(np.diff(keys, axis=0) != 0, axis=1)) + 1
+            bounds = np.concatenate([[0], starts, [len(self.order)]])
+            for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+                self._cells[(int(keys[start, 0]), int(keys[start, 1]))] = (start, end)
+            self._extent = (int(cx.min()), int(cx.max()), int(cy.min()), int(cy.max()))
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _project(self, lats, lons):
+        x = EARTH_RADIUS_M * np.radians(lons) * math.cos(self._lat0)
+        y = EARTH_RADIUS_M * np.radians(lats)
+        return x, y
+
+    def _cell_of(self, lat, lon):
+        x, y = self._project(np.float64(lat), np.float64(lon))
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size)), float(x), float(y)
+
+    def _gather(self, cells):
+        chunks = [self.order[s:e] for s, e in (self._cells[c] for c in cells if c in self._cells)]
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(chunks)
+
+    def _ring(self, cx, cy, r):
+        """Cells at Chebyshev distance `r` from (cx, cy), clipped to the occupied extent."""
+        x0, x1, y0, y1 = self._extent
+        if r == 0:
+            return [(cx, cy)]
+        ring = []
+        xs = range(max(cx - r, x0), min(cx + r, x1) + 1)
+        for y in (cy - r, cy + r):
+            if y0 <= y <= y1:
+                ring += [(x, y) for x in xs]
+        ys = range(max(cy - r + 1, y0), min(cy + r - 1, y1) + 1)
+        for x in (cx - r, cx + r):
+            if x0 <= x <= x1:
+                ring += [(x, y) for y in ys]
+        return ring
+
+    def _max_ring(self, cx, cy):
+        x0, x1, y0, y1 = self._extent
+        return max(abs(cx - x0), abs(cx - x1), abs(cy - y0), abs(cy - y1))
+
+    def _inside(self, cx, cy):
+        x0, x1, y0, y1 = self._extent
+        return x0 <= cx <= x1 and y0 <= cy <= y1
+
+    def _sphere_distances(self, lat, lon, idx):
+        # Haversine: unlike the projection, valid at any distance from the spots
+        lat1, lon1 = math.radians(lat), math.radians(lon)
+        lat2, lon2 = np.radians(self.lats[idx]), np.radians(self.lons[idx])
+        a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def _with_geodesic(self, lat, lon, idx):
+        inverse = Geodesic.WGS84.Inverse
+        distances = [
+            inverse(lat, lon, a, b, Geodesic.DISTANCE)["s12"]
+            for a, b in zip(self.lats[idx].tolist(), self.lons[idx].tolist())
+        ]
+        pairs = sorted(zip(distances, idx.tolist()))
+        return [(i, d) for d, i in pairs]
+
+    def _walk(self, cx, cy, x, y, k, mask):
+        """Rows of the rings around (cx, cy) up to the one that holds the k nearest."""
+        found = []
+        max_ring = self._max_ring(cx, cy)
+        r = 0
+        while r <= max_ring:
+            idx = self._gather(self._ring(cx, cy, r))
+            if mask is not None and len(idx):
+                idx = idx[mask[idx]]
+            found.append(idx)
+            # Every point within r cells of the query cell has been seen
+            covered = r * self.cell_size
+            candidates = np.concatenate(found)
+            if len(candidates) >= k:
+                d = np.hypot(self.x[candidates] - x, self.y[candidates] - y)
+                if np.partition(d, k - 1)[k - 1] * (1 + PLANAR_SLACK) <= covered:
+                    break
+            r += 1
+        return np.concatenate(found)
+
+    def nearest(self, lat, lon, k=5, mask=None):
+        """
+        The `k` closest spots as [(row index, geodesic metres)], nearest first.
+        `mask` (bool array) restricts the search to matching rows.
+        """
+        if not self._cells or k <= 0:
+            return []
+        cx, cy, x, y = self._cell_of(lat, lon)
+        if self._inside(cx, cy):
+            candidates = self._walk(cx, cy, x, y, k, mask)
+        else:
+            # Far from the spots, every ring up to them is empty (O(distance²) cells):
+            # one vectorized pass over the rows is cheaper
+            candidates = np.flatnonzero(mask) if mask is not None else np.arange(len(self))
+        if not len(candidates):
+            return []
+        d = self._sphere_distances(lat, lon, candidates)
+        top = min(len(d), k + NEAR_TIES)
+        order = np.argpartition(d, top - 1)[:top]
+        order = order[np.argsort(d[order], kind="stable")]
+        # Sphere ranking picks the k and their near ties; geodesic only for those
+        kth = d[order[min(k, top) - 1]]
+        near = candidates[order[d[order] <= kth * (1 + ELLIPSOID_SLACK)]]
+        return self._with_geodesic(lat, lon, near)[:k]
+
+    def within(self, lat, lon, radius_m, mask=None, limit=50):
+        """
+        Spots within `radius_m` metres as [(row index, geodesic metres)],
+        nearest first, at most `limit` of them.
+        """
+        idx, d = self._in_radius(lat, lon, radius_m, mask)
+        near = idx[np.argsort(d, kind="stable")[:limit + NEAR_TIES]]
+        return self._with_geodesic(lat, lon, near)[:limit]
+
+    def count_within(self, lat, lon, radius_m, mask=None):
+        """Number of spots within `radius_m` metres (what within() pages through)."""
+        return len(self._in_radius(lat, lon, radius_m, mask)[0])
+
+    def _in_radius(self, lat, lon, radius_m, mask):
+        """
+        (rows, planar metres) of the spots within `radius_m`: the projection
+        decides away from the circle, geodesic distances within 1% of it.
+        """
+        empty = np.empty(0, dtype=np.int64), np.empty(0)
+        if not self._cells:
+            return empty
+        cx, cy, x, y = self._cell_of(lat, lon)
+        reach = int(math.ceil(radius_m / self.cell_size))
+        x0, x1, y0, y1 = self._extent
+        cells = [
+            (x, y)
+            for x in range(max(cx - reach, x0), min(cx + reach, x1) + 1)
+            for y in range(max(cy - reach, y0), min(cy + reach, y1) + 1)
+        ]
+        idx = self._gather(cells)
+        if mask is not None and len(idx):
+            idx = idx[mask[idx]]
+        if not len(idx):
+            return empty
+        d = np.hypot(self.x[idx] - x, self.y[idx] - y)
+        keep = d <= radius_m * (1 - RADIUS_SLACK)
+        band = np.flatnonzero(~keep & (d <= radius_m * (1 + RADIUS_SLACK)))
+        if len(band):
+            geodesic = dict(self._with_geodesic(lat, lon, idx[band]))
+            keep[band] = [geodesic[i] <= radius_m for i in idx[band].tolist()]
+        return idx[keep], d[keep]
+
+_index_cache = LRUCache("index spatiaux", maxsize=INDEX_CACHE_SIZE)
+_index_lock = threading.Lock()
+
+def get_index(spots):
+    """
+    SpotIndex for a snapshot's cool_islands, built once per published snapshot:
+    forecast hours of a snapshot (SpotTable views) share its coordinates and index.
+    """
+    base = getattr(spots, "base", spots)
+    with _index_lock:
+        return derived(_index_cache, base, lambda: SpotIndex(*_coordinates(base)))
+
+def _coordinates(spots):
+    columns = spot_columns(spots)
+    return columns["lat"], columns["lon"]
@@ -0,0 +1,43 @@
+import math
+
+import numpy as np
+
+import engine
+import fetch_data
+from aggregates import SnapshotAggregates, materialize
+
+SPOTS = fetch_data.generate_cool_islands(31.0, spots=engine.random_spots(2000, np.random.default_rng(11)))
+
+def subset(rng, values):
+    return [value for value in values if rng.random() < 0.5]
+
+def brute_force(types, min_comfort, amenities=(), crowds=None):
+    return [
+        (row, spot) for row, spot in enumerate(SPOTS)
+        if spot["type"] in types and spot["comfort_score"] >= min_comfort
+        and set(amenities) <= set(spot["amenities"]) and (crowds is None or spot["crowd_level"] in crowds)
+    ]
+
+def test_stats_and_top_spots_match_a_brute_force_filter():
+    aggregates = SnapshotAggregates(materialize(SPOTS), SPOTS)
+    rng = np.random.default_rng(5)
+    for _ in range(300):
+        types = subset(rng, engine.CATEGORIES)
+        min_comfort = int(rng.integers(0, 11))
+        amenities = subset(rng, engine.AMENITIES[:3])
+        crowds = subset(rng, engine.CROWD_LABELS) if rng.random() < 0.5 else None
+
+        matches = [spot for _, spot in brute_force(types, min_comfort, amenities, crowds)]
+        stats = aggregates.stats(types, min_comfort, amenities, crowds)
+        assert stats["count"] == len(matches)
+        for field, key in (("mean_comfort", "comfort_score"), ("mean_temp_diff", "temp_diff"), ("mean_local_temp", "local_temp")):
+            expected = sum(spot[key] for spot in matches) / len(matches) if matches else 0.0
+            assert math.isclose(stats[field], expected, abs_tol=1e-9)
+        assert stats["crowd"] == {label: sum(spot["crowd_level"] == label for spot in matches) for label in engine.CROWD_LABELS}
+
+        selected = brute_force(types, min_comfort)
+        k = int(rng.integers(1, 6))
+        coolest = sorted(selected, key=lambda item: (item[1]["temp_diff"], item[0]))[:k]
+        comfortable = sorted(selected, key=lambda item: (-item[1]["comfort_score"], item[0]))[:k]
+        assert aggregates.top_spots(types, min_comfort, k=k) == [spot for _, spot in coolest]
+        assert aggregates.top_spots(types, min_comfort, by="comfort", k=k) == [spot for _, spot in comfortable]
@@ -0,0 +1,120 @@
+import asyncio
+import datetime
+
+import numpy as np
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from geographiclib.geodesic import Geodesic
+
+import api
+import engine
+import fetch_data
+from snapshot import write_snapshot
+
+CENTER = engine.CITY_CENTER
+
+@pytest.fixture
+def snapshot_file(tmp_path, monkeypatch):
+    rng = np.random.default_rng(7)
+    islands = fetch_data.generate_cool_islands(31.0, spots=engine.random_spots(60, rng, spread=0.03))
+    data = {
+        "metadata": {"timestamp": datetime.datetime(2025, 7, 1, 15).astimezone().isoformat(), "source": "Test"},
+        "weather": {"temperature": 31.0, "status": "Canicule"},
+        "air_quality": {"aqi": 2, "description": "Moyen"},
+        "cool_islands": islands
+    }
+    path = str(tmp_path / "status.bin")
+    write_snapshot(data, path)
+    monkeypatch.setattr(api, "OUTPUT_FILE", path)
+    monkeypatch.setattr(api, "JSON_EXPORT_FILE", "")
+    api.RESPONSE_CACHE.clear()
+    return islands
+
+def run(scenario):
+    async def main():
+        async with TestClient(TestServer(api.create_app())) as client:
+            return await scenario(client)
+    return asyncio.run(main())
+
+async def walk(client, query):
+    """Every page of /spots for `query`: (spots, totals reported by each page)."""
+    spots, totals, cursor = [], [], None
+    while True:
+        response = await client.get("/spots", params={**query, **({"cursor": cursor} if cursor else {})})
+        assert response.status == 200
+        page = await response.json()
+        spots += page["spots"]
+        totals.append(page["total"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return spots, totals
+
+def test_etag_revalidation(snapshot_file):
+    async def scenario(client):
+        first = await client.get("/weather")
+        etag = first.headers["ETag"]
+        revalidated = await client.get("/weather", headers={"If-None-Match": etag})
+        strong = await client.get("/weather", headers={"If-None-Match": etag[2:]})  # Weak comparison
+        other = await client.get("/weather", headers={"If-None-Match": 'W/"999"'})
+        return first.status, (await first.json())["weather"], revalidated.status, strong.status, other.status
+
+    status, weather, revalidated, strong, other = run(scenario)
+    assert status == 200 and weather["temperature"] == 31.0
+    assert (revalidated, strong, other) == (304, 304, 200)
+
+def test_cursor_pages_through_every_match(snapshot_file):
+    async def scenario(client):
+        return await walk(client, {"limit": "7"}), await walk(client, {"limit": "7", "min_comfort": "6"})
+
+    (spots, totals), (comfortable, comfortable_totals) = run(scenario)
+    assert [s["id"] for s in spots] == [s["id"] for s in snapshot_file]
+    assert set(totals) == {len(snapshot_file)}
+    expected = [s["id"] for s in snapshot_file if s["comfort_score"] >= 6]
+    assert [s["id"] for s in comfortable] == expected and set(comfortable_totals) == {len(expected)}
+
+def test_radius_total_counts_the_circle_only(snapshot_file):
+    radius = 1500
+    inside = sorted(
+        (Geodesic.WGS84.Inverse(CENTER[0], CENTER[1], s["lat"], s["lon"])["s12"], s["id"]) for s in snapshot_file
+    )
+    inside = [spot_id for meters, spot_id in inside if meters <= radius]
+
+    async def scenario(client):
+        return await walk(client, {"lat": str(CENTER[0]), "lon": str(CENTER[1]), "radius": str(radius), "limit": "3"})
+
+    spots, totals = run(scenario)
+    assert 0 < len(inside) < len(snapshot_file)
+    assert [s["id"] for s in spots] == inside
+    assert set(totals) == {len(inside)}
+    assert all(s["distance_m"] <= radius for s in spots)
+
+def test_gzip_negotiation(snapshot_file):
+    async def scenario(client):
+        gzipped = await client.get("/spots", headers={"Accept-Encoding": "gzip"})
+        plain = await client.get("/spots", headers={"Accept-Encoding": "identity"})
+        refused = await client.get("/spots", headers={"Accept-Encoding": "gzip;q=0"})
+        return (
+            gzipped.headers.get("Content-Encoding"), (await gzipped.json())["count"],
+            plain.headers.get("Content-Encoding"), refused.headers.get("Content-Encoding"), gzipped.headers["Vary"]
+        )
+
+    gzipped, count, plain, refused, vary = run(scenario)
+    assert gzipped == "gzip" and count == api.PAGE_SIZE
+    assert plain is None and refused is None
+    assert vary == "Accept-Encoding"
+
+def test_invalid_parameters_are_rejected(snapshot_file):
+    queries = [
+        {"type": "Piscine"}, {"crowd": "Bondé"}, {"min_comfort": "11"}, {"limit": "0"},
+        {"limit": str(api.MAX_PAGE_SIZE + 1)}, {"limit": "dix"}, {"lat": "45.7"}, {"radius": "500"},
+        {"lat": "91", "lon": "3"}, {"hour": "1"}, {"cursor": "%%%"}
+    ]
+
+    async def scenario(client):
+        statuses = [(await client.get("/spots", params=query)).status for query in queries]
+        stale = await client.get("/spots", params={"cursor": api.encode_cursor("0", 7)})
+        return statuses, stale.status, (await stale.json())["error"]
+
+    statuses, stale, message = run(scenario)
+    assert statuses == [400] * len(queries)
+    assert stale == 410 and "cursor" in message
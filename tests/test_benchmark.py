@@ -0,0 +1,22 @@
+import benchmark
+
+def result(seconds, spread=0.0, peak_mb=10.0):
+    return {"seconds": seconds, "spread": spread, "peak_mb": peak_mb}
+
+def regressions(now, before, same_machine=True):
+    return benchmark.compare({"case": now}, {"case": before}, 0.25, same_machine)[0][3]
+
+def test_slower_than_threshold_is_a_regression():
+    assert regressions(result(1.4), result(1.0)) == ["seconds"]
+    assert regressions(result(1.2), result(1.0)) == []
+
+def test_noisy_timings_widen_the_threshold():
+    # 20% run-to-run spread: +40% is within noise, +70% is not
+    assert regressions(result(1.4, spread=0.2), result(1.0)) == []
+    assert regressions(result(1.7, spread=0.05), result(1.0, spread=0.2)) == ["seconds"]
+
+def test_other_machine_compares_memory_only():
+    assert regressions(result(3.0, peak_mb=20.0), result(1.0), same_machine=False) == ["peak_mb"]
+
+def test_baselines_without_spread_still_compare():
+    assert regressions(result(1.4), {"seconds": 1.0, "peak_mb": 10.0}) == ["seconds"]
@@ -0,0 +1,78 @@
+import datetime
+import math
+
+import numpy as np
+
+import engine
+
+# Friday 00:00 to Sunday 23:00: every time-of-day band, weekdays and weekend
+TIMES = [datetime.datetime(2025, 7, 4) + datetime.timedelta(hours=h) for h in range(72)]
+
+def make_catalog(n=300, seed=3):
+    rng = np.random.default_rng(seed)
+    spots = engine.random_spots(n, rng)
+    temp_diff, masks = engine.draw_static_attributes(spots, rng)
+    # Two-decimal model readings: local_temp often sits on a .x5 rounding tie
+    grid_temp = np.where(rng.random(n) < 0.3, np.nan, rng.uniform(24, 34, n).round(2))
+    return list(spots["type"]), engine.type_codes(spots["type"]), temp_diff, masks, grid_temp
+
+def reference(spot_type, temp_diff, amenities, base_temp, now, weather_code=0, grid_temp=math.nan):
+    """One spot at a time, rule by rule: (local_temp, crowd index, comfort_score)."""
+    hour = now.hour
+    if 8 <= hour <= 10: crowd = 0
+    elif 12 <= hour <= 14: crowd = 2
+    elif 14 < hour <= 17: crowd = 1
+    elif 17 < hour <= 19: crowd = 2
+    else: crowd = 0
+
+    if spot_type == "Parc & Jardin" and now.weekday() >= 5 and 10 <= hour <= 18:
+        crowd = min(crowd + 1, 2)
+    if weather_code in engine.RAIN_CODES:
+        if spot_type in ("Parc & Jardin", "Point d'Eau"):
+            crowd = 0
+        else:
+            crowd = min(crowd + 1, 2)
+    if spot_type == "Lieu de Culte":
+        crowd = max(0, crowd - 1)
+    if base_temp > 30 and spot_type == "Lieu Culturel":
+        crowd = 2
+
+    score = 5 + abs(temp_diff) * 0.5
+    if "Eau Potable" in amenities: score += 1
+    if "Climatisation" in amenities: score += 2
+    if crowd == 2: score -= 0.5
+    elif crowd == 0: score += 0.5
+    local_temp = round((base_temp if math.isnan(grid_temp) else grid_temp) + temp_diff, 1)
+    return local_temp, crowd, min(max(round(score, 1), 1), 10)
+
+def test_vectorized_conditions_match_the_per_spot_rules():
+    types, codes, temp_diff, masks, grid_temp = make_catalog()
+    amenities = [engine.AMENITY_LISTS[mask] for mask in masks.tolist()]
+    for now in TIMES[::5]:
+        for base_temp in (24.0, 31.5):
+            for weather_code in (0, 63):
+                for grid in (None, grid_temp):
+                    local_temp, crowd, comfort = engine.compute_conditions(
+                        codes, temp_diff, masks, base_temp, now, weather_code, grid_temp=grid
+                    )
+                    expected = [
+                        reference(t, d, a, base_temp, now, weather_code, math.nan if grid is None else g)
+                        for t, d, a, g in zip(types, temp_diff.tolist(), amenities, grid_temp.tolist())
+                    ]
+                    assert list(zip(local_temp.tolist(), crowd.tolist(), comfort.tolist())) == expected
+
+def test_forecast_matrix_matches_the_per_spot_rules():
+    types, codes, temp_diff, masks, _ = make_catalog(n=120)
+    amenities = [engine.AMENITY_LISTS[mask] for mask in masks.tolist()]
+    rng = np.random.default_rng(4)
+    base_temps = rng.uniform(18, 36, len(TIMES)).round(1)
+    weather_codes = rng.choice([0, 3, 61, 80, 95], len(TIMES))
+
+    crowd = engine.crowd_matrix(codes, base_temps, TIMES, weather_codes)
+    local_temp, forecast_crowd, comfort = engine.forecast_conditions(codes, temp_diff, masks, base_temps, TIMES, weather_codes)
+    assert np.array_equal(crowd, forecast_crowd)
+    for hour, (now, base_temp, weather_code) in enumerate(zip(TIMES, base_temps.tolist(), weather_codes.tolist())):
+        expected = [reference(t, d, a, base_temp, now, weather_code) for t, d, a in zip(types, temp_diff.tolist(), amenities)]
+        assert list(zip(local_temp[hour].tolist(), crowd[hour].tolist(), comfort[hour].tolist())) == expected
+    # comfort_scores on its own, for the crowd levels of the matrix
+    assert np.array_equal(engine.comfort_scores(np.broadcast_to(temp_diff, crowd.shape), np.broadcast_to(masks, crowd.shape), crowd), comfort)
@@ -0,0 +1,86 @@
+import datetime
+import time
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pytest
+
+import engine
+from clusters import get_pyramid
+from forecast import ForecastMatrix, get_forecast
+from query import get_query_engine
+from spatial import get_index
+
+SPOTS = [
+    {"id": 0, "name": "Jardin Lecoq", "lat": 45.7719, "lon": 3.0895, "type": "Parc & Jardin", "temp_diff": -4.5,
+     "amenities": ["Bancs", "Ombre"], "local_temp": 27.5, "crowd_level": "Moyen", "comfort_score": 8.0},
+    {"id": 1, "name": "Musée Bargoin", "lat": 45.7745, "lon": 3.0867, "type": "Lieu Culturel", "temp_diff": -6.0,
+     "amenities": ["Climatisation"], "local_temp": 26.0, "crowd_level": "Faible", "comfort_score": 9.5}
+]
+
+PARIS = ZoneInfo("Europe/Paris")
+
+def make_data(first_hour, hours=48, timestamp=None):
+    start = datetime.datetime(2025, 7, 5, 12)  # A Saturday, Paris time (as Open-Meteo sends it)
+    times = [start + datetime.timedelta(hours=first_hour + h) for h in range(hours)]
+    return {
+        "metadata": {"timestamp": timestamp or start.replace(tzinfo=PARIS).isoformat()},
+        "weather": {"temperature": 31.0, "hourly": {
+            "time": [t.isoformat(timespec="minutes") for t in times],
+            "temperature": [31.0 + h % 3 for h in range(hours)],
+            "weather_code": [61 if h == 2 else 1 for h in range(hours)]
+        }},
+        "cool_islands": [dict(s) for s in SPOTS]
+    }
+
+def test_no_forecast_when_every_hour_is_past():
+    # Last known good weather more than 48 h old: its hourly block ends before the snapshot
+    assert get_forecast(make_data(first_hour=-60)) is None
+
+def test_no_forecast_without_hourly_data():
+    data = make_data(first_hour=1)
+    del data["weather"]["hourly"]
+    assert get_forecast(data) is None
+
+def test_crowd_matrix_accepts_no_hours():
+    codes = engine.type_codes([s["type"] for s in SPOTS])
+    assert engine.crowd_matrix(codes, [], [], []).shape == (0, len(SPOTS))
+
+def test_forecast_keeps_future_hours_only():
+    matrix = get_forecast(make_data(first_hour=-3))
+    assert len(matrix) == 44
+    assert matrix.times[0] == datetime.datetime(2025, 7, 5, 13, tzinfo=PARIS)
+    hot = ForecastMatrix(make_data(first_hour=1))
+    # Same rows as the single-hour engine pass
+    assert np.array_equal(hot.local_temp[0], [26.5, 25.0])
+    assert hot.spots_at(0)[1]["crowd_level"] == engine.CROWD_LABELS[2]  # Heat: air-conditioned places fill up
+
+def test_forecast_hours_keep_their_derived_structures():
+    matrix = get_forecast(make_data(first_hour=1))
+    first, second = matrix.spots_at(0), matrix.spots_at(1)
+    assert matrix.spots_at(0) is first
+    assert first[0]["name"] == SPOTS[0]["name"] and first[0]["local_temp"] == matrix.local_temp[0][0]
+    engine_first = get_query_engine(first)
+    get_query_engine(second)
+    # Going back to an hour reuses its engine; coordinates-only structures are per snapshot
+    assert get_query_engine(first) is engine_first
+    assert get_index(first) is get_index(second) is get_index(matrix.spots)
+    assert get_pyramid(first) is get_pyramid(second)
+
+@pytest.fixture
+def utc_clock(monkeypatch):
+    """Server clock in UTC, as in the Docker image (no TZ set)."""
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def test_past_hours_are_not_forecast_on_a_utc_server(utc_clock):
+    # Snapshot published at 12:00 UTC = 14:00 in Paris, naive as older snapshots stored it
+    matrix = get_forecast(make_data(first_hour=0, timestamp="2025-07-05T12:00:00"))
+    assert matrix.times[0] == datetime.datetime(2025, 7, 5, 15, tzinfo=PARIS)
+    assert len(matrix) == 45
+    # Same instant with its offset
+    aware = get_forecast(make_data(first_hour=0, timestamp="2025-07-05T12:00:00+00:00"))
+    assert aware.times == matrix.times
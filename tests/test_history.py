@@ -0,0 +1,101 @@
+import datetime
+import sqlite3
+
+import pytest
+
+import history
+from history import HistoryStore
+
+UTC = datetime.timezone.utc
+DAY = datetime.datetime(2025, 7, 1, tzinfo=UTC)
+
+def snapshot(when, version, temperature, spots=(), content_hash=None):
+    return {
+        "metadata": {"timestamp": when.isoformat(), "snapshot_version": version, "content_hash": content_hash or f"h{version}"},
+        "weather": {"temperature": temperature, "humidity": 40.0, "status": "Chaud"},
+        "air_quality": {"aqi": 2, "description": "Moyen", "pollutants": {"no2": 12.0, "o3": 80.0, "pm10": 15.0}},
+        "cool_islands": [
+            {"id": spot_id, "local_temp": temp, "comfort_score": comfort, "crowd_level": "Calme"}
+            for spot_id, temp, comfort in spots
+        ]
+    }
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"))
+    yield store
+    store.close()
+
+def test_append_is_idempotent(store):
+    data = snapshot(DAY, 1, 25.0, [(1, 24.0, 6.0)])
+    assert store.append(data)
+    assert not store.append(data)
+    assert store.series("temperature", 0, 2 ** 40) == [(DAY.timestamp(), 25.0)]
+
+def test_snapshots_within_the_same_second_are_all_kept(store):
+    first = DAY.replace(hour=12, microsecond=100000)
+    assert store.append(snapshot(first, 1, 25.0))
+    assert store.append(snapshot(first.replace(microsecond=600000), 2, 26.0))
+    assert [value for _, value in store.series("temperature", 0, 2 ** 40)] == [25.0, 26.0]
+
+    # Another snapshot claiming a timestamp already taken is an error, not a silent drop
+    with pytest.raises(ValueError, match="v1"):
+        store.append(snapshot(first, 3, 27.0))
+    assert len(store.series("temperature", 0, 2 ** 40)) == 2
+
+def test_range_queries(store):
+    hours = [DAY + datetime.timedelta(hours=h) for h in range(6)]
+    for version, when in enumerate(hours):
+        store.append(snapshot(when, version, 20.0 + version, [(1, 18.0 + version, 5.0), (2, 22.0 + version, 7.0)]))
+    start, end = hours[1].timestamp(), hours[4].timestamp()
+
+    assert store.series("temperature", start, end) == [(hours[h].timestamp(), 20.0 + h) for h in (1, 2, 3)]
+    assert store.series("local_temp", start, end, spot_id=2) == [(hours[h].timestamp(), 22.0 + h) for h in (1, 2, 3)]
+    assert store.series("local_temp", start, end) == [(hours[h].timestamp(), 20.0 + h) for h in (1, 2, 3)]
+    assert store.latest_before("temperature", hours[3].timestamp() + 1800) == (hours[3].timestamp(), 23.0)
+    assert store.latest_before("comfort_score", hours[0].timestamp()) == (hours[0].timestamp(), 6.0)
+    assert store.latest_before("temperature", hours[0].timestamp() - 1) is None
+
+def test_daily_aggregates(store):
+    temperatures = {0: [18.0, 24.0, 30.0], 1: [20.0, 26.0]}
+    version = 0
+    for day, values in temperatures.items():
+        for i, value in enumerate(values):
+            when = DAY + datetime.timedelta(days=day, hours=6 * i, seconds=0.25)
+            version += 1
+            store.append(snapshot(when, version, value, [(1, value - 2, 4.0), (2, value + 2, 8.0), (3, value, 6.0)]))
+    start, end = DAY.timestamp(), (DAY + datetime.timedelta(days=2)).timestamp()
+    days = [int(DAY.timestamp()) + day * 86400 for day in temperatures]
+
+    assert store.aggregate("temperature", start, end, "day") == [
+        (days[0], 24.0, 18.0, 30.0, 3), (days[1], 23.0, 20.0, 26.0, 2)
+    ]
+    # City-wide spot metrics: every spot of every snapshot of the day
+    assert store.aggregate("local_temp", start, end, "day") == [
+        (days[0], 24.0, 16.0, 32.0, 9), (days[1], 23.0, 18.0, 28.0, 6)
+    ]
+    assert store.aggregate("comfort_score", start, end, "day", spot_id=2) == [
+        (days[0], 8.0, 8.0, 8.0, 3), (days[1], 8.0, 8.0, 8.0, 2)
+    ]
+    assert len(store.aggregate("temperature", start, end, "hour")) == 5
+
+def test_second_keyed_history_is_migrated(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.executescript(history.SCHEMA)
+    ts = int(DAY.timestamp())
+    with conn:
+        conn.execute("INSERT INTO snapshots VALUES (?, 1, 'h1')", (ts,))
+        conn.execute("INSERT INTO weather VALUES (?, 25.0, 40.0, 'Chaud', 0)", (ts,))
+        conn.execute("INSERT INTO spot_conditions VALUES (1, ?, 24.0, 6.0, 0)", (ts,))
+    conn.close()
+
+    store = HistoryStore(path)
+    assert store.series("temperature", ts, ts + 1) == [(ts, 25.0)]
+    assert store.series("local_temp", ts, ts + 1, spot_id=1) == [(ts, 24.0)]
+    assert not store.append(snapshot(DAY, 1, 25.0))
+    store.close()
+    # Only once
+    store = HistoryStore(path)
+    assert store.series("temperature", ts, ts + 1) == [(ts, 25.0)]
+    store.close()
@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+import aiohttp
+from aiohttp import web
+
+import fetch_data
+from http_cache import ResponseCache
+from resilience import UpstreamGuard
+from upstream_stub import serve
+
+class Upstream:
+    """Versioned JSON resource answering conditional requests with 304."""
+
+    def __init__(self):
+        self.version = 1
+        self.status = 200
+        self.requests = []
+
+    async def handle(self, request):
+        self.requests.append(dict(request.headers))
+        if self.status != 200:
+            return web.Response(status=self.status)
+        etag = f'"v{self.version}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.json_response({"version": self.version}, headers={"ETag": etag})
+
+def run(scenario, upstream):
+    async def main():
+        async with serve({"/data": upstream.handle}) as base:
+            async with aiohttp.ClientSession() as session:
+                return await scenario(session, base + "/data")
+    return asyncio.run(main())
+
+def test_fresh_entry_is_served_without_request(tmp_path):
+    upstream, cache = Upstream(), ResponseCache(str(tmp_path))
+
+    async def scenario(session, url):
+        first = await cache.fetch_json(session, url, ttl=60)
+        second = await cache.fetch_json(session, url, ttl=60)
+        return first, second
+
+    assert run(scenario, upstream) == ({"version": 1}, {"version": 1})
+    assert len(upstream.requests) == 1
+    assert cache.stats["miss"] == 1 and cache.stats["fresh"] == 1
+
+def test_expired_entry_is_revalidated_with_etag(tmp_path):
+    upstream, cache = Upstream(), ResponseCache(str(tmp_path))
+
+    async def scenario(session, url):
+        await cache.fetch_json(session, url, ttl=0)
+        fetched_at = cache.get(url)["fetched_at"]
+        body = await cache.fetch_json(session, url, ttl=0)
+        return body, fetched_at, cache.get(url)["fetched_at"]
+
+    body, before, after = run(scenario, upstream)
+    assert body == {"version": 1}
+    assert upstream.requests[1].get("If-None-Match") == '"v1"'
+    assert cache.stats["not_modified"] == 1
+    assert after >= before  # A 304 renews the entry
+
+def test_stale_entry_is_served_then_revalidated_in_background(tmp_path):
+    upstream, cache = Upstream(), ResponseCache(str(tmp_path))
+
+    async def scenario(session, url):
+        await cache.fetch_json(session, url, ttl=0, stale_ttl=60)
+        upstream.version = 2
+        served = await cache.fetch_json(session, url, ttl=0, stale_ttl=60)
+        await cache.drain()
+        return served, cache.get(url)["body"]
+
+    served, stored = run(scenario, upstream)
+    assert served == {"version": 1}   # Answered from cache, without waiting
+    assert stored == {"version": 2}   # Replaced by the background revalidation
+    assert cache.stats["stale"] == 1
+    assert len(upstream.requests) == 2
+
+def test_entries_survive_a_restart(tmp_path):
+    upstream = Upstream()
+
+    async def scenario(session, url):
+        await ResponseCache(str(tmp_path)).fetch_json(session, url, ttl=60)
+        return await ResponseCache(str(tmp_path)).fetch_json(session, url, ttl=60)
+
+    assert run(scenario, upstream) == {"version": 1}
+    assert len(upstream.requests) == 1
+
+def test_unexpected_status_returns_none(tmp_path):
+    upstream, cache = Upstream(), ResponseCache(str(tmp_path))
+    upstream.status = 503
+
+    async def scenario(session, url):
+        return await cache.fetch_json(session, url, ttl=60), cache.get(url)
+
+    body, entry = run(scenario, upstream)
+    assert body is None
+    assert entry is None  # Error responses are never cached
+
+def test_failed_upstream_falls_back_to_last_good_response(tmp_path, monkeypatch):
+    upstream, cache = Upstream(), ResponseCache(str(tmp_path))
+    monkeypatch.setattr(fetch_data, "get_response_cache", lambda: cache)
+    guard = UpstreamGuard("stub", deadline=2.0, attempt_timeout=1.0, attempts=1)
+
+    async def scenario(session, url):
+        fresh = await fetch_data.fetch_guarded(session, guard, url, 0, 0, dict)
+        # Last successful response two minutes old, upstream now failing
+        cache.put(url, dict(cache.get(url), fetched_at=time.time() - 120))
+        upstream.status = 503
+        fallback = await fetch_data.fetch_guarded(session, guard, url, 0, 0, dict)
+        return fresh, fallback
+
+    fresh, fallback = run(scenario, upstream)
+    assert "stale" not in fresh
+    assert fallback["version"] == 1
+    assert fallback["stale"] is True
+    assert 119 <= fallback["age_seconds"] <= 125
+
+def test_corrupt_fallback_entry_is_dropped(tmp_path, monkeypatch):
+    upstream, cache = Upstream(), ResponseCache(str(tmp_path))
+    monkeypatch.setattr(fetch_data, "get_response_cache", lambda: cache)
+    guard = UpstreamGuard("stub", deadline=2.0, attempt_timeout=1.0, attempts=1)
+    upstream.status = 503
+
+    async def scenario(session, url):
+        cache.put(url, {"body": ["pas", "un", "objet"], "fetched_at": time.time() - 120})
+        fallback = await fetch_data.fetch_guarded(session, guard, url, 0, 0, fetch_data.parse_weather)
+        return fallback, cache.get(url)
+
+    fallback, entry = run(scenario, upstream)
+    assert fallback is None  # Callers then use their default reading
+    assert entry is None and list(tmp_path.iterdir()) == []
@@ -0,0 +1,114 @@
+import io
+import json
+import math
+
+import pytest
+
+import catalog
+import importer
+
+FEATURES = [
+    {"type": "Feature", "properties": {"nom": f"Fontaine {i}", "type": "fontaine", "debit": -1.5e-3, "eau": i % 2 == 0},
+     "geometry": {"type": "Point", "coordinates": [3.08 + i * 0.001, 45.77 + i * 0.001]}}
+    for i in range(12)
+]
+
+class CountingReader(io.StringIO):
+    """Text file recording how many characters were read."""
+
+    def __init__(self, text):
+        super().__init__(text)
+        self.consumed = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.consumed += len(chunk)
+        return chunk
+
+def read_all(text, chunk_size):
+    return list(importer.iter_geojson(io.StringIO(text), chunk_size))
+
+def test_features_are_found_whatever_the_member_order():
+    header = {"name": "x" * 5000, "crs": {"type": "name", "properties": {"name": "urn:ogc:def:crs:OGC:1.3:CRS84"}}}
+    documents = [
+        {"type": "FeatureCollection", "features": FEATURES},
+        {**header, "features": FEATURES, "type": "FeatureCollection"},
+        {"features": FEATURES, **header}
+    ]
+    for document in documents:
+        text = json.dumps(document, ensure_ascii=False)
+        for chunk_size in (1, 7, 64, 1 << 20):
+            assert read_all(text, chunk_size) == FEATURES
+
+def test_geojson_sequences():
+    lines = "\n".join(json.dumps(feature) for feature in FEATURES) + "\n"
+    assert read_all(lines, 13) == FEATURES
+    assert read_all("".join("\x1e" + json.dumps(feature) + "\n" for feature in FEATURES), 13) == FEATURES
+
+def test_malformed_feature_fails_without_reading_on():
+    text = json.dumps({"type": "FeatureCollection", "features": FEATURES})
+    broken = text.replace('"eau": false', '"eau": flase', 1)
+    f = CountingReader(broken + " " * 100000)
+    with pytest.raises(ValueError, match="Malformed"):
+        list(importer.iter_geojson(f, 256))
+    assert f.consumed < 2048
+
+def test_truncated_or_featureless_input_fails():
+    text = json.dumps({"type": "FeatureCollection", "features": FEATURES})
+    with pytest.raises(ValueError, match="Truncated"):
+        read_all(text[:len(text) // 2], 64)
+    with pytest.raises(ValueError, match="without features"):
+        read_all(json.dumps({"type": "FeatureCollection", "name": "vide"}), 64)
+
+def write_geojson(path, features):
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}), encoding="utf-8")
+    return str(path)
+
+def test_empty_import_keeps_the_catalog(tmp_path):
+    catalog_path = str(tmp_path / "catalog.json")
+    stats = importer.import_files([write_geojson(tmp_path / "fontaines.geojson", FEATURES)], catalog_path, seed=1)
+    assert stats["kept"] == len(FEATURES)
+    before = open(catalog_path, encoding="utf-8").read()
+
+    # Every point outside the bounding box: nothing to import
+    empty = write_geojson(tmp_path / "ailleurs.geojson", FEATURES)
+    with pytest.raises(ValueError, match="left unchanged"):
+        importer.import_files([empty], catalog_path, bbox=[0, 0, 1, 1])
+    assert open(catalog_path, encoding="utf-8").read() == before
+    assert [name for name in tmp_path.iterdir() if name.suffix == ".tmp"] == []
+
+    stats = importer.import_files([empty], catalog_path, append=True, bbox=[0, 0, 1, 1])
+    assert stats["kept"] == 0
+    assert len(catalog.load_catalog(catalog_path).to_json()["spots"]) == len(FEATURES)
+
+def test_categories_match_tag_values_and_whole_words():
+    assert importer.map_category("park") == "Parc & Jardin"
+    assert importer.map_category("place_of_worship") == "Lieu de Culte"
+    assert importer.map_category("Espace vert de proximité") == "Parc & Jardin"
+    assert importer.map_category("Jardins du Palais") == "Parc & Jardin"
+    assert importer.map_category("Église Saint-Pierre") == "Lieu de Culte"
+    assert importer.map_category("Lieu Culturel") == "Lieu Culturel"
+    for value in ("Parcours sportif", "Hollywood", "parkway", "Boisson"):
+        assert importer.map_category(value) is None
+
+def test_parkings_are_never_spots():
+    for value in ("parking", "bicycle_parking", "Parking Jaude", "Parc de stationnement", "parc relais"):
+        assert importer.map_category(value) is None
+    # Even next to a value that would map
+    assert importer.map_category("parking", "park") is None
+
+def offset(lat, lon, north_m=0.0, east_m=0.0):
+    return lat + north_m / importer.METRES_PER_DEG, lon + east_m / (importer.METRES_PER_DEG * math.cos(math.radians(lat)))
+
+def test_deduplicator_merges_same_type_within_radius():
+    dedup = importer.SpatialDeduplicator(radius_m=15)
+    lat, lon = 45.7772, 3.0870
+    assert dedup.add(lat, lon, "Point d'Eau")
+    assert not dedup.add(*offset(lat, lon, north_m=3, east_m=4), "Point d'Eau")  # 5 m: same fountain
+    assert dedup.add(*offset(lat, lon, east_m=20), "Point d'Eau")               # 20 m: another one
+    assert dedup.add(*offset(lat, lon, north_m=3, east_m=4), "Lieu de Culte")   # 5 m, other type
+    # Across a grid cell boundary
+    cell = dedup.cell_deg
+    edge = (math.floor(lat / cell) + 1) * cell
+    assert dedup.add(edge - 1e-7, lon, "Parc & Jardin")
+    assert not dedup.add(*offset(edge - 1e-7, lon, north_m=5), "Parc & Jardin")
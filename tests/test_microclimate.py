@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+import fetch_data
+import microclimate
+from http_cache import ResponseCache
+from resilience import UpstreamGuard
+from upstream_stub import serve
+
+CELLS = 250  # Three chunks: 100, 100 and 50 cells
+
+def cell_temperature(lat, lon):
+    """Distinct reading per grid cell, so a spot given another cell's value shows."""
+    return round(lat * 1000 + lon, 4)
+
+def make_catalog():
+    # Two spots per cell, a few metres apart
+    rows, cols = np.divmod(np.arange(CELLS), 20)
+    lats = np.repeat(45.7 + rows * microclimate.GRID_DEG, 2) + np.tile([0.001, -0.002], CELLS)
+    lons = np.repeat(3.0 + cols * microclimate.GRID_DEG, 2) + np.tile([-0.001, 0.002], CELLS)
+    return SimpleNamespace(frame={"lat": lats, "lon": lons})
+
+class Model:
+    """Multi-coordinate forecast endpoint; chunks starting at a `failing` latitude answer 503."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.requests = []
+
+    async def handle(self, request):
+        lats = [float(v) for v in request.query["latitude"].split(",")]
+        lons = [float(v) for v in request.query["longitude"].split(",")]
+        self.requests.append(len(lats))
+        if f"{lats[0]:.4f}" in self.failing:
+            return web.Response(status=503)
+        locations = [{"current": {"temperature_2m": cell_temperature(lat, lon)}} for lat, lon in zip(lats, lons)]
+        return web.json_response(locations if len(locations) > 1 else locations[0])
+
+def run(model, spot_catalog, tmp_path, monkeypatch):
+    monkeypatch.setattr(fetch_data, "get_response_cache", lambda: ResponseCache(str(tmp_path)))
+    monkeypatch.setattr(fetch_data, "MICROCLIMATE_GUARD", UpstreamGuard("stub", deadline=2.0, attempt_timeout=1.0, attempts=1))
+
+    async def main():
+        async with serve({"/v1/forecast": model.handle}) as base:
+            monkeypatch.setattr(fetch_data, "MICROCLIMATE_URL", base + "/v1/forecast?current=temperature_2m")
+            async with aiohttp.ClientSession() as session:
+                return await fetch_data.fetch_microclimate(session, spot_catalog)
+    return asyncio.run(main())
+
+def test_cells_are_split_in_chunks():
+    cell_lats, cell_lons, _ = microclimate.grid_cells(*make_catalog().frame.values())
+    chunks = microclimate.chunk_urls("http://model/v1/forecast?current=temperature_2m", cell_lats, cell_lons)
+    assert [start for start, _ in chunks] == [0, 100, 200]
+    assert chunks[0][1].startswith("http://model/v1/forecast?current=temperature_2m&latitude=")
+    assert [url.split("latitude=")[1].split("&")[0].count(",") + 1 for _, url in chunks] == [100, 100, 50]
+
+def test_parse_batch_needs_every_location():
+    assert microclimate.parse_batch({"current": {"temperature_2m": 21.5}}) == {"temperatures": [21.5]}
+    assert microclimate.parse_batch([{"current": {"temperature_2m": 21.5}}, {"current": {}}]) is None
+
+def test_spots_get_their_cell_reading(tmp_path, monkeypatch):
+    spot_catalog, model = make_catalog(), Model()
+    temperatures, stats = run(model, spot_catalog, tmp_path, monkeypatch)
+
+    assert sorted(model.requests) == [50, 100, 100]
+    assert stats["spots"] == 2 * CELLS and stats["cells"] == CELLS and stats["requests"] == 3 and stats["failed"] == 0
+    cells = np.round(np.column_stack(list(spot_catalog.frame.values())) / microclimate.GRID_DEG) * microclimate.GRID_DEG
+    expected = [cell_temperature(lat, lon) for lat, lon in cells.tolist()]
+    assert np.allclose(temperatures, expected, rtol=0, atol=1e-3)
+
+def test_failed_chunk_keeps_the_other_readings(tmp_path, monkeypatch):
+    spot_catalog = make_catalog()
+    cell_lats, cell_lons, inverse = microclimate.grid_cells(*spot_catalog.frame.values())
+    model = Model(failing={f"{cell_lats[100]:.4f}"})  # Second chunk
+    temperatures, stats = run(model, spot_catalog, tmp_path, monkeypatch)
+
+    assert stats["failed"] == 1
+    in_failed_chunk = (inverse >= 100) & (inverse < 200)
+    # Those spots keep the city reading; the others have their cell's value
+    assert np.isnan(temperatures[in_failed_chunk]).all()
+    expected = [cell_temperature(lat, lon) for lat, lon in zip(cell_lats[inverse].tolist(), cell_lons[inverse].tolist())]
+    assert np.allclose(temperatures[~in_failed_chunk], np.asarray(expected)[~in_failed_chunk], rtol=0, atol=1e-3)
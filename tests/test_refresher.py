@@ -0,0 +1,71 @@
+import asyncio
+import datetime
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import fetch_data
+from refresher import Refresher
+from snapshot import write_snapshot
+
+class Upstream:
+    """Stands in for fetch_data.main: counts fetch cycles, each taking `delay` seconds."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def main(self, session):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"metadata": {"snapshot_version": self.calls}}
+
+@pytest.fixture
+def upstream(tmp_path, monkeypatch):
+    upstream = Upstream()
+    monkeypatch.setattr(fetch_data, "main", upstream.main)
+    monkeypatch.setattr(fetch_data, "OUTPUT_FILE", str(tmp_path / "status.bin"))
+    return upstream
+
+@pytest.fixture
+def refresher():
+    refresher = Refresher()
+    yield refresher
+    refresher.close()
+
+def test_concurrent_refreshes_share_one_fetch(upstream, refresher):
+    upstream.delay = 0.3
+    with ThreadPoolExecutor(16) as pool:
+        results = list(pool.map(lambda _: refresher.refresh(timeout=5, min_age=0), range(16)))
+    assert upstream.calls == 1
+    assert all(result is results[0] for result in results)
+
+    # The next cycle is a new fetch
+    assert refresher.refresh(timeout=5, min_age=0)["metadata"]["snapshot_version"] == 2
+
+def test_fresh_snapshot_skips_the_fetch(upstream, refresher):
+    first = refresher.refresh(timeout=5, min_age=60)
+    assert refresher.refresh(timeout=5, min_age=60) is first
+    assert upstream.calls == 1
+    # Older than min_age: fetched again
+    refresher._last_refresh = time.time() - 61
+    assert refresher.refresh(timeout=5, min_age=60) is not first
+    assert upstream.calls == 2
+
+def test_fresh_snapshot_file_skips_the_first_fetch(upstream, refresher):
+    data = {"metadata": {"timestamp": datetime.datetime.now().astimezone().isoformat()}, "weather": {"temperature": 33.0}}
+    write_snapshot(data, fetch_data.OUTPUT_FILE)  # By a previous run
+    assert refresher.refresh(timeout=5, min_age=60)["weather"]["temperature"] == 33.0
+    assert upstream.calls == 0
+
+    # Written longer than min_age ago: fetched
+    old = time.time() - 120
+    os.utime(fetch_data.OUTPUT_FILE, (old, old))
+    other = Refresher()
+    try:
+        assert "weather" not in other.refresh(timeout=5, min_age=60)
+    finally:
+        other.close()
+    assert upstream.calls == 1
@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from resilience import CircuitOpenError, UpstreamGuard
+
+def test_cancelled_half_open_trial_frees_the_circuit():
+    guard = UpstreamGuard("stub", deadline=5.0, attempt_timeout=5.0, attempts=1, failure_threshold=1, cooldown=0.0)
+
+    async def failing():
+        raise ValueError("down")
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await guard.call(failing)
+        assert guard.breaker.state == "half-open"  # cooldown=0: next call is the trial
+
+        trial = asyncio.ensure_future(guard.call(lambda: asyncio.sleep(10, result="late")))
+        await asyncio.sleep(0.01)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+        # The next call gets its own trial instead of CircuitOpenError forever
+        return await guard.call(lambda: asyncio.sleep(0, result="ok"))
+
+    assert asyncio.run(scenario()) == "ok"
+    assert guard.breaker.state == "closed"
+
+def test_open_circuit_refuses_calls():
+    guard = UpstreamGuard("stub", attempts=1, failure_threshold=1, cooldown=60.0)
+
+    async def failing():
+        raise ValueError("down")
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await guard.call(failing)
+        with pytest.raises(CircuitOpenError):
+            await guard.call(failing)
+
+    asyncio.run(scenario())
@@ -0,0 +1,58 @@
+import json
+
+import numpy as np
+
+import columnar
+import snapshot
+from aggregates import materialize
+from query import SpotQueryEngine
+
+SPOTS = [
+    {"id": 0, "name": "Jardin Lecoq", "lat": 45.7719, "lon": 3.0895, "type": "Parc & Jardin", "temp_diff": -4.5,
+     "amenities": ["Bancs", "Ombre"], "local_temp": 27.5, "crowd_level": "Moyen", "comfort_score": 8.0},
+    {"id": 1, "name": "Cathédrale", "lat": 45.7787, "lon": 3.0863, "type": "Lieu de Culte", "temp_diff": -6.0,
+     "amenities": [], "local_temp": 26.0, "crowd_level": "Faible", "comfort_score": 9.5},
+    {"id": 2, "name": "Fontaine d'Amboise", "lat": 45.7770, "lon": 3.0840, "type": "Point d'Eau", "temp_diff": -2.0,
+     "amenities": ["Eau Potable"], "local_temp": 30.0, "crowd_level": "Élevé", "comfort_score": 6.5}
+]
+
+def make_data():
+    return {"metadata": {"timestamp": "2025-07-01T15:00:00"}, "weather": {"temperature": 32.0},
+            "cool_islands": [dict(s) for s in SPOTS], "aggregates": materialize(SPOTS)}
+
+def test_binary_and_json_snapshots_read_the_same(tmp_path):
+    binary, export = str(tmp_path / "s.bin"), str(tmp_path / "s.json")
+    snapshot.write_snapshot(make_data(), binary, exports=[export])
+    snapshot._cache.clear()
+
+    from_binary, from_json = snapshot.load_snapshot(binary), snapshot.load_snapshot(export)
+    for data in (from_binary, from_json):
+        spots = data["cool_islands"]
+        assert isinstance(spots, columnar.SpotTable)
+        assert [dict(s) for s in spots] == [dict(from_json["cool_islands"][i]) for i in range(len(SPOTS))]
+        assert spots[-1]["name"] == "Fontaine d'Amboise"
+        assert spots[0]["amenities"] == ("Bancs", "Ombre")
+    # Whole-table consumers read the mapped columns themselves
+    engine = SpotQueryEngine(from_binary["cool_islands"])
+    assert engine.select(min_comfort=8).tolist() == [0, 1]
+    assert np.shares_memory(engine.comfort, snapshot.load_table(binary)["comfort_score"])
+
+def test_forecast_view_swaps_columns_only():
+    spots = columnar.SpotTable.from_records(snapshot.freeze(SPOTS))
+    view = spots.with_columns(comfort_score=np.array([1.0, 2.0, 3.0]), crowd_level=np.array([2, 2, 0], dtype=np.int8))
+    assert view.base is spots
+    assert view[1]["comfort_score"] == 2.0 and view[1]["crowd_level"] == "Élevé"
+    assert view[1]["name"] == "Cathédrale" and view[1]["local_temp"] == 26.0
+    assert spots[1]["comfort_score"] == 9.5
+
+def test_previous_version_reads_only_the_head_of_the_export(tmp_path, monkeypatch):
+    path, export = str(tmp_path / "s.bin"), str(tmp_path / "s.json")
+    assert snapshot.write_snapshot(make_data(), path, exports=[export]) == 1
+    with open(export, encoding="utf-8") as f:
+        assert next(iter(json.load(f))) == "metadata"
+    snapshot._cache.clear()
+
+    def no_parse(*args, **kwargs):
+        raise AssertionError("full parse of a previous snapshot")
+    monkeypatch.setattr(snapshot.json, "load", no_parse)
+    assert snapshot.write_snapshot(make_data(), path, exports=[export]) == 2
@@ -0,0 +1,49 @@
+import time
+
+import numpy as np
+import pytest
+from geographiclib.geodesic import Geodesic
+
+import engine
+from spatial import SpotIndex
+
+@pytest.fixture(scope="module")
+def spots():
+    return engine.random_spots(1000, np.random.default_rng(0), spread=0.05)
+
+def brute_force(spots, lat, lon, k, mask=None):
+    rows = [i for i in range(len(spots)) if mask is None or mask[i]]
+    distances = [
+        (Geodesic.WGS84.Inverse(lat, lon, spots["lat"].iat[i], spots["lon"].iat[i], Geodesic.DISTANCE)["s12"], i)
+        for i in rows
+    ]
+    return [i for _, i in sorted(distances)[:k]]
+
+@pytest.mark.parametrize("lat, lon", [
+    engine.CITY_CENTER,
+    (45.70, 3.20),      # Edge of the spots
+    (46.50, 3.09),      # ~80 km north, outside the extent
+    (45.00, 2.20),      # ~110 km south-west
+    (43.30, 5.37)       # ~300 km away
+])
+def test_nearest_matches_brute_force(spots, lat, lon):
+    index = SpotIndex(spots["lat"], spots["lon"])
+    mask = np.arange(len(spots)) % 3 == 0
+    assert [i for i, _ in index.nearest(lat, lon, 5)] == brute_force(spots, lat, lon, 5)
+    assert [i for i, _ in index.nearest(lat, lon, 5, mask=mask)] == brute_force(spots, lat, lon, 5, mask)
+
+def test_far_query_does_not_walk_empty_rings(spots):
+    index = SpotIndex(spots["lat"], spots["lon"])
+    started = time.perf_counter()
+    for lat, lon in ((-33.87, 151.21), (64.15, -21.94), (0.0, 0.0)):
+        assert len(index.nearest(lat, lon, 3)) == 3
+        assert index.within(lat, lon, 50000) == []
+    assert time.perf_counter() - started < 1.0
+
+def test_within_matches_brute_force(spots):
+    index = SpotIndex(spots["lat"], spots["lon"])
+    lat, lon = engine.CITY_CENTER
+    found = index.within(lat, lon, 800, limit=10000)
+    expected = [i for i in brute_force(spots, lat, lon, len(spots))
+                if Geodesic.WGS84.Inverse(lat, lon, spots["lat"].iat[i], spots["lon"].iat[i])["s12"] <= 800]
+    assert [i for i, _ in found] == expected
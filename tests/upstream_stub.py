@@ -0,0 +1,21 @@
+import contextlib
+
+from aiohttp import web
+
+@contextlib.asynccontextmanager
+async def serve(routes):
+    """
+    Local stand-in for an upstream API: `routes` maps a path to an aiohttp
+    handler. Yields the base URL of the server, listening on a free port.
+    """
+    app = web.Application()
+    for path, handler in routes.items():
+        app.router.add_get(path, handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    try:
+        yield f"http://127.0.0.1:{runner.addresses[0][1]}"
+    finally:
+        await runner.cleanup()